@@ -0,0 +1,310 @@
+"""
+Runs every agent against the in-process MockBackend and reports cost and load metrics.
+
+Usage (with PYTHONPATH=src):
+    python benchmarks/bench_agents.py --sizes 10 100 1000
+    python benchmarks/bench_agents.py --agents filter sort --sizes 100000 \
+        --output after.json
+    python benchmarks/bench_agents.py --compare before.json --output after.json
+
+Each (agent, size) case runs in a fresh subprocess so its peak RSS is its
+own. Size is the list length for list agents, the corpus size for the
+grounded answer agent (answered through a BM25 index), and the number of
+concurrent calls for single-shot agents. The mock replies instantly unless
+--latency-median is set, so by default the suite measures the library's own
+overhead: scheduling, prompt building, parsing, caching and bookkeeping.
+
+Columns: wall seconds, API requests, prompt and completion tokens, results
+that came back as errors (which should stay 0), peak RSS in MB, and the
+worst and p99 event-loop lag in ms, sampled by a task that sleeps in
+--lag-interval steps. --output writes the results as JSON together with the
+git commit, and --compare prints the wall-time ratio against an earlier
+results file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from core.backends import Latency, MockBackend
+from core.openai_api import OpenAIClient, track_usage
+
+AGENTS = [
+    "filter", "map", "sort", "classify", "binary_classify", "summarize", "project",
+    "reduce", "grounded_answer", "chain_of_thought", "generate_object",
+]
+
+
+def items(size):
+    return [f"item {index:06d}" for index in range(size)][::-1]
+
+
+def compare_pairs(messages, match):
+    pairs = json.loads(messages[-1]["content"])
+    return json.dumps({
+        index: "BEFORE" if a <= b else "AFTER" for index, (a, b) in pairs.items()
+    })
+
+
+def filter_reply(messages, match):
+    remove = int(match.group(1)) % 2 == 1
+    return json.dumps({"explanation": "Odd items are removed.", "remove_item": remove})
+
+
+def count_errors(result):
+    if isinstance(result, dict):
+        return int("error" in result)
+    if isinstance(result, list):
+        return sum(count_errors(item) for item in result)
+    return 0
+
+
+def make_case(name, size):
+    """
+    Returns the mock rules for an agent and a coroutine factory that runs it on
+    `size` items.
+    """
+    from core.binary_classify_list_agent import (
+        BinaryClassifyListAgent, BinaryClassifyListInput,
+    )
+    from core.chain_of_thought_agent import ChainOfThoughtAgent, ChainOfThoughtInput
+    from core.classify_list_agent import ClassifyListAgent, ClassifyListInput
+    from core.filter_list_agent import FilterListAgent, FilterListInput
+    from core.generate_object_agent import GenerateObjectAgent, ObjectGenerationInput
+    from core.grounded_answer_agent import GroundedAnswerAgent, GroundedAnswerInput
+    from core.map_list_agent import MapListAgent, MapListInput
+    from core.project_list_agent import ProjectListAgent, ProjectListInput
+    from core.reduce_list_agent import ReduceListAgent, ReduceListInput
+    from core.retrieval import BM25Index
+    from core.sort_list_agent import SortListAgent, SortListInput
+    from core.summarize_list_agent import SummarizeListAgent, SummarizeListInput
+
+    values = items(size)
+    if name == "filter":
+        data = FilterListInput(goal="Remove odd items.", items_to_filter=values)
+        return [(r"item (\d+)", filter_reply)], (
+            lambda client: FilterListAgent(data, openai_client=client).filter()
+        )
+    if name == "map":
+        data = MapListInput(list_to_map=values, transformation="Uppercase the item")
+        return [], lambda client: MapListAgent(data, openai_client=client).map_list()
+    if name == "sort":
+        data = SortListInput(goal="Sort ascending.", list_to_sort=values)
+        return [(r'^\{"\d+": \[', compare_pairs)], (
+            lambda client: SortListAgent(data, openai_client=client).sort()
+        )
+    if name == "classify":
+        data = ClassifyListInput(list_to_classify=values,
+                                 classification_criteria="even or odd")
+        return [(".", "even")], (
+            lambda client: ClassifyListAgent(data, openai_client=client).classify_list()
+        )
+    if name == "binary_classify":
+        data = BinaryClassifyListInput(list_to_classify=values,
+                                       criteria="the number is even")
+        return [(".", "true")], (
+            lambda client: BinaryClassifyListAgent(
+                data, openai_client=client).classify_list()
+        )
+    if name == "summarize":
+        data = SummarizeListInput(list_to_summarize=values)
+        return [], (
+            lambda client: SummarizeListAgent(
+                data, openai_client=client).summarize_list()
+        )
+    if name == "project":
+        data = ProjectListInput(list_to_project=values,
+                                projection_rule="Keep the number")
+        return [], (
+            lambda client: ProjectListAgent(data, openai_client=client).project_list()
+        )
+    if name == "reduce":
+        data = ReduceListInput(list_to_reduce=values, reduction_goal="Keep the number")
+        return [], (
+            lambda client: ReduceListAgent(data, openai_client=client).reduce_list()
+        )
+    if name == "grounded_answer":
+        documents = [
+            (f"doc{index}",
+             f"Document {index} says that {value} is stored on shelf {index % 97}.")
+            for index, value in enumerate(values)
+        ]
+        index = BM25Index.build(documents)
+        data = GroundedAnswerInput(question=f"Which shelf holds {values[0]}?")
+        answer = json.dumps({"explanation": "From the passages.", "answer": "Shelf 0."})
+        return [(".", answer)], (
+            lambda client: GroundedAnswerAgent(
+                data, openai_client=client, index=index).answer()
+        )
+    if name == "chain_of_thought":
+        async def run(client):
+            return await asyncio.gather(*(
+                ChainOfThoughtAgent(
+                    ChainOfThoughtInput(question=f"What is 6 times {value}?"),
+                    openai_client=client,
+                ).chain_of_thought()
+                for value in values
+            ))
+        return [(".", "6 times 7 is 42.")], run
+    if name == "generate_object":
+        async def run(client):
+            return await asyncio.gather(*(
+                GenerateObjectAgent(
+                    ObjectGenerationInput(object_description="A user with a name",
+                                          goal=f"Generate user {value}"),
+                    openai_client=client,
+                ).generate_object()
+                for value in values
+            ))
+        return [(".", '{"name": "Ada"}')], run
+    raise ValueError(f"Unknown agent: {name}")
+
+
+async def measure_lag(interval, samples, done):
+    loop = asyncio.get_running_loop()
+    while not done.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+
+async def run_case(name, size, args):
+    rules, run = make_case(name, size)
+    latency = (Latency.lognormal(args.latency_median, args.latency_sigma)
+               if args.latency_median else Latency.fixed(0.0))
+    backend = MockBackend(rules=rules, latency=latency, seed=args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        settings_path = os.path.join(directory, "settings.json")
+        with open(settings_path, "w") as f:
+            json.dump({"log_path": os.path.join(directory, "error.log")}, f)
+        client = OpenAIClient(settings_path, backend=backend)
+
+        lag, done = [], asyncio.Event()
+        monitor = asyncio.create_task(measure_lag(args.lag_interval, lag, done))
+        started = time.perf_counter()
+        with track_usage() as usage:
+            result = await run(client)
+        wall = time.perf_counter() - started
+        done.set()
+        await monitor
+
+    lag.sort()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "agent": name,
+        "size": size,
+        "wall_s": round(wall, 4),
+        "requests": usage["requests"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "errors": count_errors(result),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "loop_lag_max_ms": round(lag[-1] * 1000, 2) if lag else 0.0,
+        "loop_lag_p99_ms": (
+            round(lag[int(0.99 * (len(lag) - 1))] * 1000, 2) if lag else 0.0
+        ),
+    }
+
+
+def run_in_subprocess(name, size, args):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run-one", name, str(size),
+        "--latency-median", str(args.latency_median),
+        "--latency-sigma", str(args.latency_sigma),
+        "--lag-interval", str(args.lag_interval), "--seed", str(args.seed),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True,
+                               env=os.environ.copy())
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1:]
+        return {"agent": name, "size": size, "error": error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                   capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--agents", nargs="+", default=AGENTS, choices=AGENTS)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency-median", type=float, default=0.0,
+                        help="Median mock latency in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Lognormal spread of the mock latency.")
+    parser.add_argument("--lag-interval", type=float, default=0.005,
+                        help="Event-loop lag sampling step in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="A results file from an earlier run to "
+                                          "compare wall times against.")
+    parser.add_argument("--run-one", nargs=2, metavar=("AGENT", "SIZE"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        name, size = args.run_one
+        print(json.dumps(asyncio.run(run_case(name, int(size), args))))
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(row["agent"], row["size"]): row
+                        for row in json.load(f)["results"] if "wall_s" in row}
+
+    header = (f"{'agent':>16} {'n':>7} {'wall s':>8} {'requests':>9} "
+              f"{'prompt tok':>11} {'compl tok':>10} {'errors':>6} {'rss MB':>7} "
+              f"{'lag max':>8} {'lag p99':>8}")
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    print("-" * len(header))
+    results = []
+    for name in args.agents:
+        for size in args.sizes:
+            row = run_in_subprocess(name, size, args)
+            results.append(row)
+            if "error" in row:
+                print(f"{name:>16} {size:>7} failed: {row['error']}")
+                continue
+            line = (f"{name:>16} {size:>7} {row['wall_s']:>8.3f} {row['requests']:>9} "
+                    f"{row['prompt_tokens']:>11} {row['completion_tokens']:>10} "
+                    f"{row['errors']:>6} {row['peak_rss_mb']:>7.1f} "
+                    f"{row['loop_lag_max_ms']:>8.2f} {row['loop_lag_p99_ms']:>8.2f}")
+            base = baseline.get((name, size))
+            if base and base["wall_s"]:
+                line += f" {row['wall_s'] / base['wall_s']:>7.2f}x"
+            elif base:
+                line += f" {'-':>8}"
+            print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "latency_median": args.latency_median,
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
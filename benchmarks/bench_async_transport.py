@@ -0,0 +1,92 @@
+"""
+Compares the blocking and the async completion transport against a local mock
+server.
+
+Usage (with PYTHONPATH=src):
+    python benchmarks/bench_async_transport.py --requests 50 --latency 0.2
+
+The blocking run reproduces the old behaviour (the synchronous SDK called from
+inside a coroutine), so wall time grows with N * latency. The async run uses
+`OpenAIClient.complete_chat` under `asyncio.gather` and should finish in
+roughly one latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mock_server import MockServer  # noqa: E402
+from core.openai_api import OpenAIClient  # noqa: E402
+
+
+def write_settings(directory, base_url):
+    settings_path = os.path.join(directory, "settings.json")
+    with open(settings_path, "w") as f:
+        json.dump({
+            "openai_api_key": "sk-bench",
+            "openai_base_url": base_url,
+            "log_path": os.path.join(directory, "logs", "bench.log"),
+        }, f)
+    return settings_path
+
+
+async def run_blocking(base_url, n):
+    client = OpenAI(api_key="sk-bench", base_url=base_url)
+
+    async def complete(i):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": f"item {i}"}],
+            max_tokens=16,
+        )
+        return response.choices[0].message.content
+
+    return await asyncio.gather(*(complete(i) for i in range(n)))
+
+
+async def run_async(settings_path, n):
+    client = OpenAIClient(settings_path)
+    return await asyncio.gather(*(
+        client.complete_chat([{"role": "user", "content": f"item {i}"}], max_tokens=16)
+        for i in range(n)
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--requests", type=int, default=50,
+                        help="Number of concurrent completions.")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Mock server latency in seconds.")
+    args = parser.parse_args()
+
+    with MockServer(latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        settings_path = write_settings(tmp, server.base_url)
+
+        start = time.perf_counter()
+        asyncio.run(run_blocking(server.base_url, args.requests))
+        blocking = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(run_async(settings_path, args.requests))
+        non_blocking = time.perf_counter() - start
+
+    print(f"requests={args.requests} latency={args.latency:.3f}s")
+    for label, elapsed in [("blocking", blocking), ("async", non_blocking)]:
+        label = f"{label} transport:"
+        print(f"{label:<19} {elapsed:.3f}s ({elapsed / args.latency:.1f}x latency)")
+    print(f"speed-up:           {blocking / non_blocking:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Times prompt rendering with the original regex substitution against a compiled
+PromptTemplate.
+
+Usage (with PYTHONPATH=src):
+    python benchmarks/bench_compose_prompt.py --renders 100000
+
+Every path renders the same per-item template once per item, as a list
+agent does, and the results are checked against the regex path.
+"""
+import argparse
+import re
+import time
+
+from core.compose_prompt import PromptTemplate, compose_prompt
+
+TEMPLATE = (
+    "Item {{index}}: {{item}}. Based on the criteria '{{criteria}}', "
+    "should it be removed? Answer with explanation and 'remove_item': true/false."
+)
+
+
+def regex_compose_prompt(template, variables):
+    return re.sub(
+        r"{{\s*([^}\s]+)\s*}}",
+        lambda match: str(variables.get(match.group(1), "")),
+        template,
+    )
+
+
+def timed(render, variable_sets):
+    start = time.perf_counter()
+    result = render(variable_sets)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--renders", type=int, default=100000)
+    args = parser.parse_args()
+
+    variable_sets = [
+        {"index": index, "item": f"snack number {index}",
+         "criteria": "remove unhealthy snacks"}
+        for index in range(args.renders)
+    ]
+    compiled = PromptTemplate(TEMPLATE)
+    paths = [
+        ("regex", lambda sets: [regex_compose_prompt(TEMPLATE, v) for v in sets]),
+        ("compose_prompt", lambda sets: [compose_prompt(TEMPLATE, v) for v in sets]),
+        ("render", lambda sets: [compiled.render(variables) for variables in sets]),
+        ("render_many", compiled.render_many),
+    ]
+
+    baseline_time, expected = timed(paths[0][1], variable_sets)
+    header = f"{'path':>15} {'seconds':>8} {'renders/s':>11} {'speed-up':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, render in paths:
+        if name == "regex":
+            elapsed, result = baseline_time, expected
+        else:
+            elapsed, result = timed(render, variable_sets)
+        assert result == expected, f"{name} rendered differently from the regex path"
+        print(f"{name:>15} {elapsed:>8.3f} {args.renders / elapsed:>11.0f} "
+              f"{baseline_time / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
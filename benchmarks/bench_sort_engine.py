@@ -0,0 +1,89 @@
+"""
+Counts comparisons, calls and rounds made by SortEngine against a deterministic
+mock comparator.
+
+Usage (with PYTHONPATH=src):
+    python benchmarks/bench_sort_engine.py --sizes 10 100 1000 --batch-size 20 \
+        --top-k 10
+
+No API calls are made: the comparator orders integers and only counts how
+often it is asked. The reference column is `n log2 n` for a full sort and
+`n + k log2 n` for top-k selection; rounds is the number of sequential LLM
+round trips.
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+
+from core.sort_engine import SortEngine
+
+
+def make_comparator():
+    async def compare_batch(pairs):
+        return [int(a) < int(b) for a, b in pairs]
+
+    return compare_batch
+
+
+async def rank_chunk(chunk):
+    return sorted(range(len(chunk)), key=lambda i: int(chunk[i]))
+
+
+async def bench(size, batch_size, listwise, seed, top_k=None):
+    items = [str(i) for i in range(size)]
+    shuffled = random.Random(seed).sample(items, size)
+    engine = SortEngine(
+        make_comparator(),
+        batch_size=batch_size,
+        rank_chunk=rank_chunk if listwise else None,
+    )
+
+    start = time.perf_counter()
+    if top_k is None:
+        result = await engine.sort(shuffled)
+    else:
+        result = await engine.top_k(shuffled, top_k)
+    elapsed = time.perf_counter() - start
+    assert result == items[:top_k], "SortEngine returned a wrong order"
+    return engine.stats(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--batch-size", type=int, default=20,
+                        help="Pairs per comparison call.")
+    parser.add_argument("--top-k", type=int, default=10,
+                        help="k for the top-k rows, or 0 to skip them.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    header = (f"{'n':>6} {'mode':>9} {'reference':>9} {'comparisons':>12} "
+              f"{'calls':>7} {'rounds':>7} {'cpu s':>7}")
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        log_size = math.log2(size) if size > 1 else 0
+        modes = [
+            ("pairwise", False, None, size * log_size),
+            ("listwise", True, None, size * log_size),
+        ]
+        if args.top_k:
+            reference = size + args.top_k * log_size
+            modes.append((f"top-{args.top_k}", False, args.top_k, reference))
+        for mode, listwise, top_k, reference in modes:
+            stats, elapsed = asyncio.run(
+                bench(size, args.batch_size, listwise, args.seed, top_k)
+            )
+            print(
+                f"{size:>6} {mode:>9} {reference:>9.0f} {stats['comparisons']:>12} "
+                f"{stats['calls']:>7} {stats['rounds']:>7} {elapsed:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
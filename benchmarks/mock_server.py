@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """
+    Request handler that mimics the OpenAI chat completions endpoint.
+
+    Every POST sleeps for the server's configured latency and then returns a
+    minimal chat completion whose content echoes the last user message. When
+    the request sets "stream", the content is sent word by word as
+    server-sent events.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+
+        messages = body.get("messages", [])
+        content = messages[-1]["content"] if messages else ""
+        if body.get("stream"):
+            self._stream(body, content)
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, body, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0, "delta": {"content": delta}, "finish_reason": None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class MockServer:
+    """
+    A local HTTP server speaking enough of the OpenAI API for benchmarks.
+
+    Attributes:
+        latency (float): Seconds each request sleeps before responding.
+        base_url (str): The base URL to configure the OpenAI client with.
+
+    Methods:
+        start(): Starts serving on a background thread.
+        stop(): Shuts the server down.
+    """
+
+    def __init__(self, latency=0.1, host="127.0.0.1", port=0):
+        """
+        Constructs the MockServer object.
+
+        Args:
+            latency (float): Seconds each request sleeps before responding.
+            host (str): The interface to bind.
+            port (int): The port to bind, 0 picks a free port.
+        """
+        self.httpd = _MockHTTPServer((host, port), MockChatHandler)
+        self.httpd.latency = latency
+        self.latency = latency
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        self.thread = None
+
+    def start(self):
+        """
+        Starts serving on a background thread.
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Shuts the server down.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -1,5 +1,5 @@
 import asyncio
-from core.sort_list_agent import SortListAgent 
+from core.sort_list_agent import SortListAgent, SortListInput
 
 async def run_sort_list_example():
     # Sample input list
@@ -11,7 +11,9 @@ async def run_sort_list_example():
     goal = "Sort the fruits alphabetically."
     
     # Create the sorting agent
-    agent = SortListAgent(goal=goal, list_to_sort=items_to_sort, log_explanations=True)
+    input_data = SortListInput(goal=goal, list_to_sort=items_to_sort,
+                               log_explanations=True)
+    agent = SortListAgent(input_data)
     
     # Execute the sorting process
     sorted_list = await agent.sort()
@@ -19,6 +21,7 @@ async def run_sort_list_example():
     # Output the result
     print("Original list:", items_to_sort)
     print("Sorted list:", sorted_list)
+    print("Comparisons:", agent.comparisons)
 
 # Run the example
 if __name__ == "__main__":
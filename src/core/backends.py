@@ -0,0 +1,387 @@
+import abc
+import asyncio
+import math
+import random
+import re
+import time
+from collections import deque
+import httpx
+from openai import APIStatusError, InternalServerError, RateLimitError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from .token_counter import TokenCounter
+
+_MOCK_REQUEST = httpx.Request("POST", "http://mock-backend/v1/chat/completions")
+
+
+class ChatBackend(abc.ABC):
+    """
+    The interface OpenAIClient sends chat completion requests through.
+
+    A backend takes the arguments of the SDK's `chat.completions.create` and
+    returns the same shapes: a ChatCompletion, or an async iterator of
+    ChatCompletionChunk objects when `stream=True`. Failures are raised as
+    the SDK's exceptions so the retry policy treats them alike. Subclasses
+    must implement `create`.
+
+    Methods:
+        create(model, messages, max_tokens, **params): Runs one chat completion request.
+    """
+
+    @abc.abstractmethod
+    async def create(self, model, messages, max_tokens, **params):
+        """
+        Runs one chat completion request.
+
+        Args:
+            model (str): The model name.
+            messages (list): The chat messages.
+            max_tokens (int): The completion token limit.
+            **params: Other request parameters, such as temperature, response_format or
+                stream.
+
+        Returns:
+            ChatCompletion: The completion, or an async iterator of chunks when
+            streaming.
+        """
+
+
+class OpenAIBackend(ChatBackend):
+    """
+    Sends requests to the OpenAI API (or a compatible endpoint) through the client's
+    pooled SDK client.
+
+    Attributes:
+        openai_client (OpenAIClient): The client whose per-event-loop SDK client is
+            used.
+    """
+
+    def __init__(self, openai_client):
+        """
+        Constructs the OpenAIBackend object.
+
+        Args:
+            openai_client (OpenAIClient): The client whose SDK client is used.
+        """
+        self.openai_client = openai_client
+
+    async def create(self, model, messages, max_tokens, **params):
+        return await self.openai_client.client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, **params
+        )
+
+
+class Latency:
+    """
+    A distribution of simulated response latencies, in seconds.
+
+    Attributes:
+        kind (str): "fixed", "lognormal" or "heavy_tail".
+        params (dict): The distribution's parameters.
+
+    Methods:
+        fixed(seconds): Every response takes the same time.
+        lognormal(median, sigma): Latencies spread around a median, as for most APIs.
+        heavy_tail(minimum, alpha, cap): Pareto latencies with rare very slow responses.
+        from_settings(settings): Builds a distribution from a settings dict.
+        sample(rng): Draws one latency.
+    """
+
+    def __init__(self, kind, **params):
+        """
+        Constructs a Latency distribution. Use the named constructors instead.
+
+        Args:
+            kind (str): "fixed", "lognormal" or "heavy_tail".
+            **params: The distribution's parameters.
+
+        Raises:
+            ValueError: If the kind is unknown.
+        """
+        if kind not in ("fixed", "lognormal", "heavy_tail"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def fixed(cls, seconds=0.0):
+        """
+        Every response takes `seconds`.
+        """
+        return cls("fixed", seconds=seconds)
+
+    @classmethod
+    def lognormal(cls, median=0.5, sigma=0.5):
+        """
+        Latencies are lognormal around `median` seconds, with log-space spread `sigma`.
+        """
+        return cls("lognormal", median=median, sigma=sigma)
+
+    @classmethod
+    def heavy_tail(cls, minimum=0.2, alpha=1.5, cap=60.0):
+        """
+        Latencies are Pareto from `minimum` seconds with shape `alpha`, capped at `cap`
+        seconds.
+        """
+        return cls("heavy_tail", minimum=minimum, alpha=alpha, cap=cap)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a distribution from a dict such as {"kind": "lognormal", "median": 0.4,
+        "sigma": 0.6}.
+
+        Args:
+            settings (dict): The kind and its parameters, or None for no latency.
+
+        Returns:
+            Latency: The distribution.
+        """
+        if not settings:
+            return cls.fixed(0.0)
+        params = dict(settings)
+        return cls(params.pop("kind", "fixed"), **params)
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Draws one latency.
+
+        Args:
+            rng (random.Random): The random source.
+
+        Returns:
+            float: The latency in seconds.
+        """
+        if self.kind == "fixed":
+            return self.params["seconds"]
+        if self.kind == "lognormal":
+            return rng.lognormvariate(
+                math.log(self.params["median"]), self.params["sigma"]
+            )
+        return min(
+            self.params["minimum"] * rng.paretovariate(self.params["alpha"]),
+            self.params["cap"],
+        )
+
+
+class MockBackend(ChatBackend):
+    """
+    An offline, deterministic stand-in for the chat completions API, for load tests and
+    benchmarks.
+
+    Replies come from a script (consumed in order, the last one repeating),
+    from rules matched against the last message, or from a default echo of
+    the last message. Each request waits for a latency drawn from a seeded
+    distribution, may fail with an injected 429 or 5xx, and is rejected with
+    a 429 carrying retry-after when it exceeds the simulated per-minute
+    request or token limits. Token usage is estimated from text length.
+
+    Attributes:
+        latency (Latency): The response latency distribution.
+        error_rates (dict): Maps status codes (429, 500, 503, ...) to the probability of
+            injecting them.
+        requests_per_minute (int): The simulated request limit, or None.
+        tokens_per_minute (int): The simulated token limit, or None.
+        requests (int): Requests received.
+        completed (int): Requests answered successfully.
+        errors (dict): Maps status codes to the number of requests failed with them.
+
+    Methods:
+        from_settings(settings): Builds a mock from a settings dict.
+        reply(messages): Chooses the reply text for a request.
+        create(model, messages, max_tokens, **params): Runs one simulated request.
+        stats(): Returns the request and error counters.
+    """
+
+    def __init__(
+        self,
+        script=None,
+        rules=None,
+        latency=None,
+        error_rates=None,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        seed=0,
+        clock=time.monotonic,
+        sleep=asyncio.sleep,
+    ):
+        """
+        Constructs the MockBackend object.
+
+        Args:
+            script (List[str]): Replies returned in order; the last one repeats.
+            rules (List[Tuple[str, Any]]): (regex, reply) pairs tried in order against
+                the last message. A reply is a string or a callable taking (messages,
+                match).
+            latency (Latency): The response latency distribution. Defaults to no
+                latency.
+            error_rates (dict): Maps status codes to the probability of failing a
+                request with them.
+            requests_per_minute (int): The simulated request limit, or None.
+            tokens_per_minute (int): The simulated token limit, or None.
+            seed (int): Seeds latencies and injected errors, so runs are reproducible.
+            clock (Callable): Returns the current time in seconds.
+            sleep (Callable): Awaited with each simulated latency.
+        """
+        self.script = list(script or [])
+        self.rules = [(re.compile(pattern), reply) for pattern, reply in (rules or [])]
+        self.latency = latency or Latency.fixed(0.0)
+        self.error_rates = {
+            int(status): rate for status, rate in (error_rates or {}).items()
+        }
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = 0
+        self.completed = 0
+        self.errors = {}
+        self._script_position = 0
+        self._window = deque()
+        self._window_tokens = 0
+        self._counter = TokenCounter(approximate=True)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a mock from the "mock_backend" setting, e.g. {"latency": {"kind":
+        "lognormal", "median": 0.4}, "error_rates": {"429": 0.02},
+        "requests_per_minute": 500, "seed": 1}.
+
+        Args:
+            settings (dict): The loaded settings.
+
+        Returns:
+            MockBackend: The configured mock, or None when "mock_backend" is not set.
+        """
+        options = settings.get("mock_backend")
+        if options is None:
+            return None
+        options = dict(options)
+        options["latency"] = Latency.from_settings(options.get("latency"))
+        return cls(**options)
+
+    def reply(self, messages) -> str:
+        """
+        Chooses the reply text for a request.
+
+        Args:
+            messages (list): The chat messages.
+
+        Returns:
+            str: The next scripted reply, the first matching rule's reply, or the last
+            message.
+        """
+        if self.script:
+            reply = self.script[min(self._script_position, len(self.script) - 1)]
+            self._script_position += 1
+            return reply
+        text = messages[-1]["content"] if messages else ""
+        for pattern, reply in self.rules:
+            match = pattern.search(text)
+            if match:
+                return reply(messages, match) if callable(reply) else reply
+        return text
+
+    def _error(self, status, message, retry_after=None):
+        self.errors[status] = self.errors.get(status, 0) + 1
+        headers = (
+            {"retry-after": f"{retry_after:.3f}"} if retry_after is not None else None
+        )
+        response = httpx.Response(status, headers=headers, request=_MOCK_REQUEST)
+        if status == 429:
+            return RateLimitError(message, response=response, body=None)
+        if status >= 500:
+            return InternalServerError(message, response=response, body=None)
+        return APIStatusError(message, response=response, body=None)
+
+    def _admit(self, tokens):
+        now = self.clock()
+        while self._window and now - self._window[0][0] >= 60.0:
+            self._window_tokens -= self._window.popleft()[1]
+        over_requests = (
+            self.requests_per_minute is not None
+            and len(self._window) >= self.requests_per_minute
+        )
+        over_tokens = (self.tokens_per_minute is not None and self._window
+                       and self._window_tokens + tokens > self.tokens_per_minute)
+        if over_requests or over_tokens:
+            retry_after = 60.0 - (now - self._window[0][0])
+            raise self._error(429, "Mock rate limit exceeded.", retry_after)
+        self._window.append((now, tokens))
+        self._window_tokens += tokens
+
+    async def create(self, model, messages, max_tokens, **params):
+        self.requests += 1
+        prompt_tokens = self._counter.count_tokens(messages)
+        if self.requests_per_minute is not None or self.tokens_per_minute is not None:
+            self._admit(prompt_tokens + (max_tokens or 0))
+
+        await self.sleep(self.latency.sample(self.rng))
+        draw = self.rng.random()
+        for status, rate in self.error_rates.items():
+            if draw < rate:
+                raise self._error(status, f"Injected mock error {status}.")
+            draw -= rate
+
+        content = self.reply(messages)
+        completion_tokens = self._counter.count_text(content)
+        self.completed += 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if params.get("stream"):
+            return self._stream(model, content, usage)
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    async def _stream(self, model, content, usage):
+        words = content.split(" ")
+        for index, word in enumerate(words):
+            yield ChatCompletionChunk.model_validate(
+                {
+                    "id": f"chatcmpl-mock-{self.requests}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word if index == 0 else " " + word},
+                        }
+                    ],
+                }
+            )
+        yield ChatCompletionChunk.model_validate({
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [],
+            "usage": usage,
+        })
+
+    def stats(self) -> dict:
+        """
+        Returns the request and error counters.
+
+        Returns:
+            dict: "requests", "completed" and "errors" (by status code).
+        """
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "errors": dict(self.errors),
+        }
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import jsonschema
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .model_router import json_acceptor
+from .structured_output import StructuredOutputError, StructuredOutputPolicy
+
+
+class BatchCompleter:
+    """
+    Packs several list items into one chat request with an index-keyed JSON response.
+
+    Items are sent as a JSON object keyed by their index, so items that
+    contain newlines or text that looks like another item's number cannot
+    be confused with each other.
+
+    The shared instructions are sent once per batch instead of once per item.
+    Batch sizes are chosen from a prompt token budget, and the expected output
+    size keeps each response under a completion token cap. A response that
+    is not a JSON object is repaired through a StructuredOutputPolicy. Items
+    whose value is missing or fails validation are re-split into smaller
+    batches and, once alone, handed to a per-item fallback.
+
+    Attributes:
+        openai_client (OpenAIClient): The client used to call the API.
+        instructions (str): The task applied to every item.
+        value_description (str): Describes the JSON value expected for each item.
+        value_schema (dict): JSON schema each item's value must satisfy.
+        validator (jsonschema.Draft7Validator): The value schema's validator, compiled
+            once.
+        token_budget (int): The maximum number of prompt tokens per batch.
+        output_tokens_per_item (int): The expected completion tokens per item.
+        max_completion_tokens (int): The completion token cap per batch.
+        max_batch_size (int): The maximum number of items per batch.
+        temperature (float): Sampling temperature for the OpenAI model.
+        model (str): The model the batches are sent to.
+        token_counter (TokenCounter): Used to measure the size of each item.
+        accept (Callable): Rejects responses that are not JSON objects, so that a
+            ModelRouter escalates them.
+        output_policy (StructuredOutputPolicy): Bounds the repairs of responses that are
+            not JSON objects.
+        requests (int): The number of batches sent, not counting repair requests.
+
+    Methods:
+        system_prompt(): Builds the system prompt shared by every batch.
+        prefix_tokens(encoder): Returns the number of prompt tokens every batch shares.
+        plan_batches(items): Groups item indexes into batches that fit the budget.
+        complete(items, fallback, wrap): Runs every item through batched requests.
+        parse_object(response): Parses a response that should hold a single JSON object.
+    """
+
+    accept = staticmethod(json_acceptor({"type": "object"}))
+
+    def __init__(
+        self,
+        openai_client,
+        instructions: str,
+        value_description: str,
+        value_schema: Optional[Dict] = None,
+        token_budget: int = 4000,
+        output_tokens_per_item: int = 100,
+        max_completion_tokens: int = 4096,
+        max_batch_size: int = 50,
+        temperature: Optional[float] = None,
+        token_counter=None,
+        model: str = "gpt-4o-mini",
+        output_policy: Optional[StructuredOutputPolicy] = None,
+    ):
+        """
+        Constructs the BatchCompleter object.
+
+        Args:
+            openai_client (OpenAIClient): The client used to call the API.
+            instructions (str): The task applied to every item.
+            value_description (str): Describes the JSON value expected for each item.
+            value_schema (dict): JSON schema each item's value must satisfy. Defaults to
+                a string.
+            token_budget (int): The maximum number of prompt tokens per batch.
+            output_tokens_per_item (int): The expected completion tokens per item.
+            max_completion_tokens (int): The completion token cap per batch.
+            max_batch_size (int): The maximum number of items per batch.
+            temperature (float): Sampling temperature for the OpenAI model.
+            token_counter (TokenCounter): Used to measure items. Defaults to the shared
+                counter for `model`, created on first use.
+            model (str): The model the batches are sent to.
+            output_policy (StructuredOutputPolicy): Bounds the repairs of responses that
+                are not JSON objects. Defaults to a policy of its own.
+        """
+        self.openai_client = openai_client
+        self.instructions = instructions
+        self.value_description = value_description
+        self.value_schema = value_schema or {"type": "string"}
+        self.validator = jsonschema.Draft7Validator(self.value_schema)
+        self.token_budget = token_budget
+        self.output_tokens_per_item = output_tokens_per_item
+        self.max_completion_tokens = max_completion_tokens
+        self.max_batch_size = max_batch_size
+        self.temperature = temperature
+        self.token_counter = token_counter
+        self.model = model
+        self.output_policy = output_policy or StructuredOutputPolicy()
+        self.requests = 0
+
+    def system_prompt(self) -> str:
+        """
+        Builds the system prompt shared by every batch.
+
+        Returns:
+            str: The instructions followed by the response format.
+        """
+        return (
+            f"{self.instructions}\n\n"
+            "You will receive a JSON object whose keys are item numbers (as strings) "
+            "and whose values are the items. Handle each item independently.\n"
+            "Respond with a single JSON object with the same keys, whose values are "
+            f"{self.value_description}. Include every item number exactly once and "
+            "nothing else."
+        )
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens every batch request shares: the system
+        message and the framing of the user message.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the encoding of the batches' model.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        from .token_counter import MESSAGE_OVERHEAD_TOKENS, TokenCounter
+        if encoder is None:
+            encoder = TokenCounter.shared(self.model).encoder
+        encode = getattr(encoder, "encode_ordinary", encoder.encode)
+        return 2 * MESSAGE_OVERHEAD_TOKENS + len(encode(self.system_prompt()))
+
+    def _count(self, text: str) -> int:
+        if self.token_counter is None:
+            from .token_counter import TokenCounter
+            self.token_counter = TokenCounter.shared(self.model)
+        return self.token_counter.count_text(text)
+
+    def plan_batches(self, items: List[str]) -> List[List[int]]:
+        """
+        Groups item indexes into batches that fit the prompt and completion budgets.
+
+        Args:
+            items (List[str]): The items to batch.
+
+        Returns:
+            List[List[int]]: The item indexes of each batch, in order.
+        """
+        available = self.token_budget - self._count(self.system_prompt())
+        max_items = max(
+            1,
+            min(
+                self.max_batch_size,
+                self.max_completion_tokens // self.output_tokens_per_item,
+            ),
+        )
+
+        batches = []
+        batch = []
+        used = 0
+        for index, item in enumerate(items):
+            cost = self._count(
+                f"{json.dumps(str(index))}: {json.dumps(item, ensure_ascii=False)}"
+            )
+            if batch and (used + cost > available or len(batch) >= max_items):
+                batches.append(batch)
+                batch = []
+                used = 0
+            batch.append(index)
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def complete(
+        self,
+        items: List[str],
+        fallback: Callable[[int], Awaitable[Any]],
+        wrap: Optional[Callable[[int, Any], Any]] = None,
+    ) -> List[Any]:
+        """
+        Runs every item through batched requests.
+
+        Args:
+            items (List[str]): The items to process.
+            fallback (Callable): Called with an item index to process that item on its
+                own when batched responses for it keep failing.
+            wrap (Callable): Called as wrap(index, value) to turn a batched value into
+                the agent's per-item result. Defaults to returning the value.
+
+        Returns:
+            List[Any]: One result per item, in input order.
+        """
+        results: List[Any] = [None] * len(items)
+        await asyncio.gather(
+            *(
+                self._complete_batch(items, batch, results, fallback, wrap)
+                for batch in self.plan_batches(items)
+            )
+        )
+        return results
+
+    async def _complete_batch(self, items, batch, results, fallback, wrap):
+        if len(batch) == 1:
+            results[batch[0]] = await fallback(batch[0])
+            return
+
+        user_prompt = json.dumps(
+            {str(index): items[index] for index in batch}, ensure_ascii=False
+        )
+        self.requests += 1
+        messages = [
+            {"role": "system", "content": self.system_prompt()},
+            {"role": "user", "content": user_prompt}
+        ]
+        try:
+            values = await self.output_policy.complete(
+                self.openai_client,
+                messages,
+                self.parse_object,
+                max_tokens=min(
+                    self.max_completion_tokens, self.output_tokens_per_item * len(batch)
+                ),
+                temperature=self.temperature,
+                response_format={"type": "json_object"},
+                accept=self.accept,
+                model=self.model,
+            )
+        except StructuredOutputError:
+            values = {}
+        failed = []
+        for index in batch:
+            value = values.get(str(index))
+            if value is None or not self._is_valid(value):
+                failed.append(index)
+            else:
+                results[index] = wrap(index, value) if wrap else value
+
+        if failed:
+            middle = (len(failed) + 1) // 2
+            halves = [half for half in (failed[:middle], failed[middle:]) if half]
+            await asyncio.gather(
+                *(
+                    self._complete_batch(items, half, results, fallback, wrap)
+                    for half in halves
+                )
+            )
+
+    @staticmethod
+    def parse_object(response: Optional[str]) -> Dict:
+        """
+        Parses a response that should hold a single JSON object.
+
+        Args:
+            response (str): The response, optionally wrapped in a Markdown code fence.
+
+        Returns:
+            Dict: The parsed object.
+
+        Raises:
+            ValueError: If the response is not a JSON object.
+        """
+        text = (response or "").strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            if text.startswith("json"):
+                text = text[4:]
+        values = json.loads(text)
+        if not isinstance(values, dict):
+            raise ValueError(f"Expected a JSON object, got {type(values).__name__}.")
+        return values
+
+    def _is_valid(self, value) -> bool:
+        return self.validator.is_valid(value)
@@ -1,14 +1,27 @@
 from pydantic import BaseModel, Field
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional, AsyncIterator, Iterable, Tuple
 from .openai_api import OpenAIClient
-from .logging import Logger  # Using correct logging abstraction
+from .batching import BatchCompleter
+from .concurrency import stream_bounded
+from .compose_prompt import PromptLayout
+from .tracing import traced
 
 class BinaryClassifyListInput(BaseModel):
     list_to_classify: List[str] = Field(..., description="The list of items to classify")
     criteria: str = Field(..., description="The criteria for binary classification")
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
     temperature: float = Field(0.0, description="Sampling temperature for the OpenAI model")
+    batch_mode: bool = Field(
+        False, description="Whether to pack several items into each request"
+    )
+    batch_token_budget: int = Field(
+        4000, description="The maximum number of prompt tokens per batched request"
+    )
+    batch_output_tokens: int = Field(
+        10,
+        description="The completion tokens reserved for each item in a batched request",
+    )
 
 class BinaryClassifyListAgent:
     """
@@ -19,29 +32,59 @@ class BinaryClassifyListAgent:
         criteria (str): The criteria for binary classification.
         max_tokens (int): The maximum number of tokens to generate.
         temperature (float): Sampling temperature for the OpenAI model.
+        batch_mode (bool): Whether to pack several items into each request.
+        batch_token_budget (int): The maximum number of prompt tokens per batched
+            request.
+        batch_output_tokens (int): The completion tokens reserved for each item in a
+            batched request.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
         logger (Logger): An instance of Logger to log classification requests and responses.
+        layout (PromptLayout): Keeps the criteria in the system message shared by every
+            item.
 
     Methods:
         classify_list(): Classifies the entire list of items.
+        classify_list_batched(): Classifies the list by packing several items into each
+            request.
+        classify_stream(items, max_concurrency): Classifies items and yields results as
+            they complete.
         classify_item(user_prompt): Classifies a single item based on the criteria.
+        prefix_tokens(encoder): Returns the number of prompt tokens every request of a
+            run shares.
     """
 
-    def __init__(self, data: BinaryClassifyListInput):
+    def __init__(
+        self,
+        data: BinaryClassifyListInput,
+        openai_client: Optional[OpenAIClient] = None,
+    ):
         """
         Constructs all the necessary attributes for the BinaryClassifyListAgent object.
 
         Args:
             data (BinaryClassifyListInput): An instance of BinaryClassifyListInput containing 
             the list of items, criteria, max_tokens, and temperature.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.list_to_classify = data.list_to_classify
         self.criteria = data.criteria
         self.max_tokens = data.max_tokens
         self.temperature = data.temperature
-        self.openai_client = OpenAIClient()
-        self.logger = Logger()
-
+        self.batch_mode = data.batch_mode
+        self.batch_token_budget = data.batch_token_budget
+        self.batch_output_tokens = data.batch_output_tokens
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.logger = self.openai_client.logger
+        self.layout = PromptLayout(
+            "You are an assistant tasked with binary classification of items. Classify "
+            "each item as true or false based on the following criteria: "
+            "{{criteria}}",
+            "Classify the item '{{item}}' as true or false.",
+            {"criteria": self.criteria},
+        )
+
+    @traced
     async def classify_list(self) -> List[Dict]:
         """
         Classifies the entire list based on the provided items and criteria.
@@ -49,33 +92,121 @@ class BinaryClassifyListAgent:
         Returns:
             List[Dict]: A list of dictionaries with the classification results.
         """
+        if self.batch_mode:
+            return await self.classify_list_batched()
+
         tasks = []
         for item in self.list_to_classify:
-            user_prompt = f"Based on the following criteria '{self.criteria}', classify the item '{item}' as true or false."
-            tasks.append(self.classify_item(user_prompt))
+            tasks.append(self.classify_item(self._user_prompt(item)))
 
         results = await asyncio.gather(*tasks)
         return results
 
+    @traced
+    async def classify_list_batched(self) -> List[Dict]:
+        """
+        Classifies the list by packing several items into each request.
+
+        Returns:
+            List[Dict]: A list of dictionaries with the classification results.
+        """
+        batcher = self._batcher()
+        return await batcher.complete(
+            self.list_to_classify,
+            fallback=lambda index: self.classify_item(
+                self._user_prompt(self.list_to_classify[index])
+            ),
+            wrap=lambda index, value: {
+                "item": self._user_prompt(self.list_to_classify[index]),
+                "classification": str(value).lower(),
+            },
+        )
+
+    async def classify_stream(
+        self, items: Optional[Iterable[str]] = None, max_concurrency: int = 10
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Classifies items and yields each result as soon as its request completes.
+
+        At most `max_concurrency` requests are in flight, and new items are only
+        read once the caller has consumed earlier results.
+
+        Args:
+            items (Iterable[str]): The items to classify, which may be a lazy or async
+                iterable. Defaults to the agent's list.
+            max_concurrency (int): The maximum number of requests in flight.
+
+        Yields:
+            Tuple[int, Dict]: The index of each item and its classification result, in
+            completion order.
+        """
+        async for index, result in stream_bounded(
+            lambda index, item: self.classify_item(self._user_prompt(item)),
+            self.list_to_classify if items is None else items,
+            max_concurrency,
+        ):
+            yield index, result
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens shared by every request of a list run.
+
+        Providers only serve a prefix from their prompt cache once it reaches
+        MIN_CACHED_PREFIX_TOKENS. In batch mode the shared prefix is the batch
+        system prompt; otherwise it is the prompt layout's prefix.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the model's encoding.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if self.batch_mode:
+            return self._batcher().prefix_tokens(encoder)
+        return self.layout.prefix_tokens(encoder)
+
+    def _batcher(self) -> BatchCompleter:
+        return BatchCompleter(
+            self.openai_client,
+            instructions=(
+                "You are an assistant tasked with binary classification of items. "
+                "Classify each item as true or false based on the following criteria: "
+                f"{self.criteria}"
+            ),
+            value_description="true or false as a JSON boolean",
+            value_schema={"type": "boolean"},
+            token_budget=self.batch_token_budget,
+            output_tokens_per_item=min(self.batch_output_tokens, self.max_tokens),
+            temperature=self.temperature,
+        )
+
+    def _user_prompt(self, item: str) -> str:
+        return self.layout.user_prompt({"item": item})
+
+    @traced
     async def classify_item(self, user_prompt: str) -> Dict:
         """
         Classifies a single item based on the criteria.
 
         Args:
-            user_prompt (str): The prompt describing the classification criteria and item.
+            user_prompt (str): The prompt naming the item, from `_user_prompt`.
 
         Returns:
             Dict: A dictionary with the classification result.
         """
-        system_prompt = "You are an assistant tasked with binary classification of items."
-
-        self.logger.info(f"Classifying item: {user_prompt}")  # Logging the classification request
-
-        response = await self.openai_client.complete_chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
-
-        self.logger.info(f"Received response for item: {user_prompt} -> {response.strip()}")  # Logging the response
+        self.logger.info(
+            "Classifying item: %s", user_prompt
+        )  # Logging the classification request
+
+        response = await self.openai_client.complete_chat(
+            self.layout.messages(user_prompt),
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+        )
+
+        self.logger.info(
+            "Received response for item: %s -> %s", user_prompt, response.strip()
+        )  # Logging the response
 
         return {"item": user_prompt, "classification": response.strip()}
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import AsyncIterator, List, Optional
 from .openai_api import OpenAIClient
+from .tracing import traced
 
 class ChainOfThoughtInput(BaseModel):
     question: str = Field(..., description="The question to solve using chain of thought reasoning")
@@ -19,21 +20,27 @@ class ChainOfThoughtAgent:
 
     Methods:
         chain_of_thought(): Solves the question using chain of thought reasoning.
+        chain_of_thought_stream(): Streams the reasoning as it is generated.
     """
 
-    def __init__(self, data: ChainOfThoughtInput):
+    def __init__(
+        self, data: ChainOfThoughtInput, openai_client: Optional[OpenAIClient] = None
+    ):
         """
         Constructs all the necessary attributes for the ChainOfThoughtAgent object.
 
         Args:
             data (ChainOfThoughtInput): An instance of ChainOfThoughtInput containing 
             the question, max_tokens, and temperature.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.question = data.question
         self.max_tokens = data.max_tokens
         self.temperature = data.temperature
-        self.openai_client = OpenAIClient()
+        self.openai_client = openai_client or OpenAIClient.shared()
 
+    @traced
     async def chain_of_thought(self) -> str:
         """
         Solves the question using chain of thought reasoning.
@@ -41,12 +48,28 @@ class ChainOfThoughtAgent:
         Returns:
             str: The step-by-step reasoning process and solution.
         """
+        response = await self.openai_client.complete_chat(
+            self._messages(), max_tokens=self.max_tokens, temperature=self.temperature
+        )
+
+        return response.strip()
+
+    async def chain_of_thought_stream(self) -> AsyncIterator[str]:
+        """
+        Solves the question using chain of thought reasoning, streaming the answer.
+
+        Yields:
+            str: Pieces of the reasoning process and solution as they are generated.
+        """
+        async for delta in self.openai_client.stream_chat(
+            self._messages(), max_tokens=self.max_tokens, temperature=self.temperature
+        ):
+            yield delta
+
+    def _messages(self):
         system_prompt = "You are an assistant tasked with solving problems using the 'chain of thought' reasoning process."
         user_prompt = f"Solve the following problem step-by-step: {self.question}"
-
-        response = await self.openai_client.complete_chat([
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
-
-        return response.strip()
+        ]
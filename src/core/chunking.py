@@ -0,0 +1,143 @@
+import re
+from typing import List, NamedTuple
+
+_WORD = re.compile(r"\s*\S+")
+
+
+class Chunk(NamedTuple):
+    """
+    A slice of a larger text.
+
+    Attributes:
+        index (int): The chunk's position among the text's chunks, from 0.
+        start (int): The character offset where the chunk starts.
+        end (int): The character offset just past the chunk's end.
+        text (str): The chunk's text.
+    """
+    index: int
+    start: int
+    end: int
+    text: str
+
+
+class WordEncoder:
+    """
+    A tokenizer stand-in that treats every word, with its leading whitespace, as one
+    token.
+
+    It needs no model files, so chunking with it works fully offline. Word
+    counts only approximate model token counts.
+
+    Methods:
+        encode(text): Returns one token per word.
+        decode_with_offsets(tokens): Returns the character offset of each token.
+    """
+
+    def encode(self, text: str) -> List[int]:
+        """
+        Returns one token per word. Each token is the word's character offset.
+
+        Args:
+            text (str): The text to encode.
+
+        Returns:
+            List[int]: The tokens.
+        """
+        return [match.start() for match in _WORD.finditer(text)]
+
+    def decode_with_offsets(self, tokens: List[int]):
+        """
+        Returns the character offset where each token starts.
+
+        Args:
+            tokens (List[int]): Tokens produced by `encode`.
+
+        Returns:
+            Tuple[None, List[int]]: No decoded text, and the offsets.
+        """
+        return None, list(tokens)
+
+
+class TextChunker:
+    """
+    Splits text into overlapping chunks measured in tokens.
+
+    Chunks hold at most `chunk_tokens` tokens and each one repeats the last
+    `overlap_tokens` tokens of the previous chunk, so a sentence cut at a
+    boundary still appears whole in one of them. Every chunk records its
+    character offsets in the original text, for citations.
+
+    Attributes:
+        chunk_tokens (int): The maximum number of tokens per chunk.
+        overlap_tokens (int): The number of tokens shared by consecutive chunks.
+        encoder: Provides `encode` (or `encode_ordinary`, preferred so that text
+            like "<|endoftext|>" is treated as plain text) and `decode_with_offsets`.
+            Defaults to the tiktoken encoding of `model`, created on first use.
+        model (str): The model whose encoding is used when no encoder is given.
+
+    Methods:
+        split(text): Splits text into chunks.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = 1000,
+        overlap_tokens: int = 100,
+        encoder=None,
+        model: str = "gpt-4o-mini",
+    ):
+        """
+        Constructs the TextChunker object.
+
+        Args:
+            chunk_tokens (int): The maximum number of tokens per chunk.
+            overlap_tokens (int): The number of tokens shared by consecutive chunks.
+            encoder: Provides `encode` and `decode_with_offsets`, such as a tiktoken
+                encoding or a WordEncoder. Defaults to the encoding of `model`.
+            model (str): The model whose encoding is used when no encoder is given.
+
+        Raises:
+            ValueError: If the overlap is not smaller than the chunk size.
+        """
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError(
+                "overlap_tokens must be at least 0 and smaller than chunk_tokens."
+            )
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoder = encoder
+        self.model = model
+
+    def split(self, text: str) -> List[Chunk]:
+        """
+        Splits text into overlapping chunks.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            List[Chunk]: The chunks in order. Empty text yields no chunks.
+        """
+        if self.encoder is None:
+            from .token_counter import TokenCounter
+            self.encoder = TokenCounter.shared(self.model).encoder
+
+        encode = getattr(self.encoder, "encode_ordinary", self.encoder.encode)
+        tokens = encode(text)
+        if not tokens:
+            return []
+        _, offsets = self.encoder.decode_with_offsets(tokens)
+
+        chunks = []
+        step = self.chunk_tokens - self.overlap_tokens
+        start = 0
+        while True:
+            end = min(start + self.chunk_tokens, len(tokens))
+            char_start = offsets[start]
+            char_end = offsets[end] if end < len(tokens) else len(text)
+            chunks.append(
+                Chunk(len(chunks), char_start, char_end, text[char_start:char_end])
+            )
+            if end == len(tokens):
+                return chunks
+            start += step
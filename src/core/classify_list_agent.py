@@ -1,12 +1,26 @@
 from pydantic import BaseModel, Field
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional, AsyncIterator, Iterable, Tuple
 from .openai_api import OpenAIClient
+from .batching import BatchCompleter
+from .concurrency import stream_bounded
+from .compose_prompt import PromptLayout
+from .tracing import traced
 
 class ClassifyListInput(BaseModel):
     list_to_classify: List[str] = Field(..., description="The list of items to classify")
     classification_criteria: str = Field(..., description="The criteria for classifying the items")
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
+    batch_mode: bool = Field(
+        False, description="Whether to pack several items into each request"
+    )
+    batch_token_budget: int = Field(
+        4000, description="The maximum number of prompt tokens per batched request"
+    )
+    batch_output_tokens: int = Field(
+        100,
+        description="The completion tokens reserved for each item in a batched request",
+    )
 
 class ClassifyListAgent:
     """
@@ -16,26 +30,54 @@ class ClassifyListAgent:
         list_to_classify (List[str]): The list of items to classify.
         classification_criteria (str): The criteria for classifying the items.
         max_tokens (int): The maximum number of tokens to generate.
+        batch_mode (bool): Whether to pack several items into each request.
+        batch_token_budget (int): The maximum number of prompt tokens per batched
+            request.
+        batch_output_tokens (int): The completion tokens reserved for each item in a
+            batched request.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        layout (PromptLayout): Keeps the criteria in the system message shared by every
+            item.
 
     Methods:
         classify_list(): Classifies the entire list of items.
+        classify_list_batched(): Classifies the list by packing several items into each
+            request.
+        classify_stream(items, max_concurrency): Classifies items and yields results as
+            they complete.
         classify_item(user_prompt): Classifies a single item based on the classification criteria.
+        prefix_tokens(encoder): Returns the number of prompt tokens every request of a
+            run shares.
     """
 
-    def __init__(self, data: ClassifyListInput):
+    def __init__(
+        self, data: ClassifyListInput, openai_client: Optional[OpenAIClient] = None
+    ):
         """
         Constructs all the necessary attributes for the ClassifyListAgent object.
 
         Args:
             data (ClassifyListInput): An instance of ClassifyListInput containing 
             the list of items, classification criteria, and max_tokens.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.list_to_classify = data.list_to_classify
         self.classification_criteria = data.classification_criteria
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.batch_mode = data.batch_mode
+        self.batch_token_budget = data.batch_token_budget
+        self.batch_output_tokens = data.batch_output_tokens
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.layout = PromptLayout(
+            "You are an assistant tasked with classifying items based on the given "
+            "criteria. "
+            "The criteria are: {{criteria}}",
+            "Classify the item '{{item}}' according to the criteria.",
+            {"criteria": self.classification_criteria},
+        )
 
+    @traced
     async def classify_list(self) -> List[Dict]:
         """
         Classifies the entire list based on the provided items and classification criteria.
@@ -43,28 +85,109 @@ class ClassifyListAgent:
         Returns:
             List[Dict]: A list of dictionaries with the classification results.
         """
+        if self.batch_mode:
+            return await self.classify_list_batched()
+
         tasks = []
         for item in self.list_to_classify:
-            user_prompt = f"Classify the item '{item}' according to the following criteria: {self.classification_criteria}."
-            tasks.append(self.classify_item(user_prompt))
+            tasks.append(self.classify_item(self._user_prompt(item)))
 
         results = await asyncio.gather(*tasks)
         return results
 
+    @traced
+    async def classify_list_batched(self) -> List[Dict]:
+        """
+        Classifies the list by packing several items into each request.
+
+        Returns:
+            List[Dict]: A list of dictionaries with the classification results.
+        """
+        batcher = self._batcher()
+        return await batcher.complete(
+            self.list_to_classify,
+            fallback=lambda index: self.classify_item(
+                self._user_prompt(self.list_to_classify[index])
+            ),
+            wrap=lambda index, value: {
+                "item": self._user_prompt(self.list_to_classify[index]),
+                "classification": value.strip(),
+            },
+        )
+
+    async def classify_stream(
+        self, items: Optional[Iterable[str]] = None, max_concurrency: int = 10
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Classifies items and yields each result as soon as its request completes.
+
+        At most `max_concurrency` requests are in flight, and new items are only
+        read once the caller has consumed earlier results.
+
+        Args:
+            items (Iterable[str]): The items to classify, which may be a lazy or async
+                iterable. Defaults to the agent's list.
+            max_concurrency (int): The maximum number of requests in flight.
+
+        Yields:
+            Tuple[int, Dict]: The index of each item and its classification result, in
+            completion order.
+        """
+        async for index, result in stream_bounded(
+            lambda index, item: self.classify_item(self._user_prompt(item)),
+            self.list_to_classify if items is None else items,
+            max_concurrency,
+        ):
+            yield index, result
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens shared by every request of a list run.
+
+        Providers only serve a prefix from their prompt cache once it reaches
+        MIN_CACHED_PREFIX_TOKENS. In batch mode the shared prefix is the batch
+        system prompt; otherwise it is the prompt layout's prefix.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the model's encoding.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if self.batch_mode:
+            return self._batcher().prefix_tokens(encoder)
+        return self.layout.prefix_tokens(encoder)
+
+    def _batcher(self) -> BatchCompleter:
+        return BatchCompleter(
+            self.openai_client,
+            instructions=(
+                "You are an assistant tasked with classifying items based on the given "
+                "criteria. "
+                f"The criteria are: {self.classification_criteria}"
+            ),
+            value_description="the classification of the item as a string",
+            token_budget=self.batch_token_budget,
+            output_tokens_per_item=min(self.batch_output_tokens, self.max_tokens),
+        )
+
+    def _user_prompt(self, item: str) -> str:
+        return self.layout.user_prompt({"item": item})
+
+    @traced
     async def classify_item(self, user_prompt: str) -> Dict:
         """
         Classifies a single item based on the classification criteria.
 
         Args:
-            user_prompt (str): The prompt describing the item and classification criteria.
+            user_prompt (str): The prompt naming the item, from `_user_prompt`.
 
         Returns:
             Dict: A dictionary with the classification result.
         """
-        system_prompt = "You are an assistant tasked with classifying items based on the given criteria."
-        response = await self.openai_client.complete_chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
+        response = await self.openai_client.complete_chat(
+            self.layout.messages(user_prompt), max_tokens=self.max_tokens
+        )
 
         return {"item": user_prompt, "classification": response.strip()}
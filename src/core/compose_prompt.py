@@ -1,9 +1,21 @@
 import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from .token_counter import MESSAGE_OVERHEAD_TOKENS, TokenCounter
+
+_SLOT = re.compile(r"{{\s*([^}\s]+)\s*}}")
+
+# Providers only reuse a cached prompt prefix once it is at least this long.
+MIN_CACHED_PREFIX_TOKENS = 1024
+
 
 def compose_prompt(template: str, variables: dict) -> str:
     """
     Composes a prompt by substituting variables in a template string.
 
+    The template is compiled into a PromptTemplate on first use and the
+    compiled form is reused for later calls with the same template.
+
     Args:
         template (str): The template string containing placeholders in the form of {{variable_name}}.
         variables (dict): A dictionary where keys are variable names and values are the replacements.
@@ -11,8 +23,238 @@ def compose_prompt(template: str, variables: dict) -> str:
     Returns:
         str: The composed string with all placeholders replaced by their corresponding values.
     """
-    return re.sub(
-        r"{{\s*([^}\s]+)\s*}}",
-        lambda match: str(variables.get(match.group(1), "")),
-        template,
-    )
+    return _compiled(template).render(variables)
+
+
+class PromptTemplate:
+    """
+    A prompt template parsed once into literal and slot segments.
+
+    Rendering fills the slots and joins the segments, without scanning the
+    template again. Placeholders use the {{variable_name}} form of
+    compose_prompt, and missing variables render as empty strings.
+
+    Attributes:
+        template (str): The template string.
+        literals (List[str]): The literal text around the slots; one more than there are
+            slots.
+        variables (List[str]): The variable name of each slot, in order.
+
+    Methods:
+        render(variables): Renders the template with one set of variables.
+        render_many(variable_sets): Renders the template once per set of variables.
+        missing_variables(variables): Returns the slot names that variables does not
+            provide.
+        static_tokens(encoder): Returns the number of tokens in the literal text.
+    """
+
+    def __init__(self, template: str):
+        """
+        Constructs the PromptTemplate object and parses the template.
+
+        Args:
+            template (str): The template string containing placeholders in the form of
+                {{variable_name}}.
+        """
+        self.template = template
+        self.literals = []
+        self.variables = []
+        position = 0
+        for match in _SLOT.finditer(template):
+            self.literals.append(template[position:match.start()])
+            self.variables.append(match.group(1))
+            position = match.end()
+        self.literals.append(template[position:])
+        self._parts = [None] * (2 * len(self.variables) + 1)
+        self._parts[0::2] = self.literals
+
+    def render(self, variables: dict) -> str:
+        """
+        Renders the template with one set of variables.
+
+        Args:
+            variables (dict): Maps variable names to their values.
+
+        Returns:
+            str: The rendered prompt.
+        """
+        if not self.variables:
+            return self.literals[0]
+        get = variables.get
+        parts = self._parts[:]
+        parts[1::2] = [str(get(name, "")) for name in self.variables]
+        return "".join(parts)
+
+    def render_many(self, variable_sets: Iterable[dict]) -> List[str]:
+        """
+        Renders the template once per set of variables.
+
+        Args:
+            variable_sets (Iterable[dict]): The sets of variables, e.g. one per list
+                item.
+
+        Returns:
+            List[str]: The rendered prompts, in order.
+        """
+        if not self.variables:
+            return [self.literals[0] for _ in variable_sets]
+        parts = self._parts
+        names = self.variables
+        join = "".join
+        rendered = []
+        for variables in variable_sets:
+            get = variables.get
+            filled = parts[:]
+            filled[1::2] = [str(get(name, "")) for name in names]
+            rendered.append(join(filled))
+        return rendered
+
+    def missing_variables(self, variables: dict) -> List[str]:
+        """
+        Returns the slot names that a set of variables does not provide.
+
+        Args:
+            variables (dict): Maps variable names to their values.
+
+        Returns:
+            List[str]: The missing names, each once, in template order.
+        """
+        return [name for name in dict.fromkeys(self.variables) if name not in variables]
+
+    def static_tokens(self, encoder=None, model: str = "gpt-4o-mini") -> int:
+        """
+        Returns the number of tokens in the template's literal text.
+
+        Each literal segment is counted on its own, so the total can differ
+        slightly from a rendered prompt where text merges across slot boundaries.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the encoding of `model`.
+            model (str): The model whose encoding is used when no encoder is given.
+
+        Returns:
+            int: The number of tokens every rendering shares.
+        """
+        if encoder is None:
+            encoder = TokenCounter.shared(model).encoder
+        encode = getattr(encoder, "encode_ordinary", encoder.encode)
+        return sum(len(encode(literal)) for literal in self.literals if literal)
+
+
+@lru_cache(maxsize=256)
+def _compiled(template: str) -> PromptTemplate:
+    return PromptTemplate(template)
+
+
+class PromptLayout:
+    """
+    Lays out the chat messages of a list run so that every item shares the longest
+    possible prefix.
+
+    Providers discount prompt tokens that repeat the prefix of a recent
+    request. The layout renders everything that is the same for the whole run
+    (instructions, criteria, rules) once into the system message, and keeps
+    only per-item variables in the trailing user message. It refuses item
+    templates that reference run-wide variables, so shared text can never end
+    up after the first per-item byte.
+
+    Attributes:
+        prefix (List[Dict]): The messages shared by every item of the run.
+        item_template (str): The template of the per-item user message.
+
+    Methods:
+        user_prompt(variables): Renders the per-item user message.
+        messages(user_prompt): Returns the full message list for one item.
+        prefix_tokens(encoder): Returns the number of tokens every item's prompt shares.
+    """
+
+    def __init__(
+        self,
+        system_template: str,
+        item_template: str,
+        shared_variables: Optional[dict] = None,
+    ):
+        """
+        Constructs the PromptLayout object and renders the shared prefix.
+
+        Args:
+            system_template (str): The template of the system message, rendered once.
+            item_template (str): The template of the per-item user message.
+            shared_variables (dict): The variables that are the same for every item.
+
+        Raises:
+            ValueError: If the item template references a shared variable.
+        """
+        shared_variables = shared_variables or {}
+        self._item = PromptTemplate(item_template)
+        misplaced = sorted(set(self._item.variables) & set(shared_variables))
+        if misplaced:
+            raise ValueError(
+                "Shared variables belong in the system template, not the item "
+                f"template: {misplaced}"
+            )
+        self.prefix = [
+            {
+                "role": "system",
+                "content": compose_prompt(system_template, shared_variables),
+            }
+        ]
+        self.item_template = item_template
+
+    def user_prompt(self, variables: dict) -> str:
+        """
+        Renders the per-item user message.
+
+        Args:
+            variables (dict): The item's variables.
+
+        Returns:
+            str: The user message content.
+        """
+        return self._item.render(variables)
+
+    def messages(self, user_prompt: str) -> List[Dict]:
+        """
+        Returns the full message list for one item.
+
+        Args:
+            user_prompt (str): The item's rendered user message.
+
+        Returns:
+            List[Dict]: The shared prefix followed by the user message.
+        """
+        return self.prefix + [{"role": "user", "content": user_prompt}]
+
+    def prefix_tokens(self, encoder=None, model: str = "gpt-4o-mini") -> int:
+        """
+        Returns the number of prompt tokens that every item's request shares.
+
+        This covers the prefix messages, the framing of the user message and
+        the item template's literal text up to its last whitespace before the
+        first variable, since the tokenizer may merge text across that boundary.
+        Compare it with MIN_CACHED_PREFIX_TOKENS to check that cached-input
+        pricing applies.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the encoding of `model`.
+            model (str): The model whose encoding is used when no encoder is given.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if encoder is None:
+            encoder = TokenCounter.shared(model).encoder
+        encode = getattr(encoder, "encode_ordinary", encoder.encode)
+
+        total = sum(
+            MESSAGE_OVERHEAD_TOKENS + len(encode(message["content"]))
+            for message in self.prefix
+        )
+        total += MESSAGE_OVERHEAD_TOKENS
+        literal = self._item.literals[0]
+        cut = max(literal.rfind(" "), literal.rfind("\n"))
+        if cut > 0:
+            total += len(encode(literal[:cut]))
+        return total
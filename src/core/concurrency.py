@@ -1,4 +1,7 @@
 import asyncio
+import contextlib
+import time
+import weakref
 
 class Semaphore:
     """
@@ -48,3 +51,437 @@ class Semaphore:
         """
         async with self.semaphore:
             return await func(*args, **kwargs)
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at a fixed rate.
+
+    Attributes:
+        capacity (float): The maximum number of tokens the bucket can hold.
+        rate (float): Tokens added per second.
+        tokens (float): Tokens currently available.
+        clock (Callable): Returns the current time in seconds.
+
+    Methods:
+        time_until(amount): Seconds until `amount` tokens are available.
+        consume(amount): Removes tokens from the bucket.
+        refund(amount): Returns unused tokens to the bucket.
+    """
+
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        """
+        Constructs a full TokenBucket.
+
+        Args:
+            capacity (float): The maximum number of tokens the bucket can hold.
+            rate (float): Tokens added per second.
+            clock (Callable): Returns the current time in seconds.
+        """
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """
+        Returns the number of seconds until `amount` tokens are available.
+
+        Args:
+            amount (float): The number of tokens needed. Requests larger than the
+                capacity are treated as a request for the full capacity.
+
+        Returns:
+            float: Zero if the tokens are available now, otherwise the wait in seconds.
+        """
+        self._refill()
+        deficit = min(amount, self.capacity) - self.tokens
+        return max(0.0, deficit / self.rate)
+
+    def consume(self, amount):
+        """
+        Removes tokens from the bucket.
+
+        Args:
+            amount (float): The number of tokens to remove.
+        """
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        """
+        Returns unused tokens to the bucket.
+
+        Args:
+            amount (float): The number of tokens to return.
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Reservation:
+    """
+    Capacity admitted by a RateLimitScheduler for a single request.
+
+    Attributes:
+        tokens (int): The number of tokens reserved for the request.
+        used_tokens (int): The number of tokens the request actually used, if known.
+            Unused tokens are returned to the budget when the reservation ends.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.used_tokens = None
+
+
+class RateLimitScheduler:
+    """
+    Admits requests at the rate allowed by requests-per-minute and tokens-per-minute
+    quotas.
+
+    Requests wait in FIFO order until both token buckets have capacity and a
+    concurrency slot is free, so a burst of work is spread over the quota
+    instead of triggering a storm of 429 responses. Any limit left as None
+    is not enforced.
+
+    Attributes:
+        requests_per_minute (int): The request quota, or None.
+        tokens_per_minute (int): The token quota, or None.
+        max_concurrent_requests (int): The maximum number of in-flight requests, or
+            None.
+        token_counter (TokenCounter): Used to estimate prompt tokens ahead of time.
+
+    Methods:
+        from_settings(settings): Builds a scheduler from a settings dict.
+        estimate_tokens(messages, max_tokens, model): Estimates the tokens a request
+            will consume.
+        reserve(tokens): Async context manager that admits one request.
+        call_function(func, *args, tokens, **kwargs): Calls a function once admitted.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_concurrent_requests=None,
+        token_counter=None,
+        clock=time.monotonic,
+    ):
+        """
+        Constructs the RateLimitScheduler object.
+
+        Args:
+            requests_per_minute (int): The request quota, or None for no limit.
+            tokens_per_minute (int): The token quota, or None for no limit.
+            max_concurrent_requests (int): The maximum number of in-flight requests, or
+                None.
+            token_counter (TokenCounter): Used to estimate prompt tokens. Defaults to
+                the shared counter for each request's model.
+            clock (Callable): Returns the current time in seconds.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrent_requests = max_concurrent_requests
+        self.token_counter = token_counter
+        self.request_bucket = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60.0, clock)
+            if requests_per_minute
+            else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60.0, clock)
+            if tokens_per_minute
+            else None
+        )
+        self._primitives = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a scheduler from the "requests_per_minute", "tokens_per_minute" and
+        "max_concurrent_requests" settings.
+
+        Args:
+            settings (dict): The loaded settings.
+
+        Returns:
+            RateLimitScheduler: The configured scheduler.
+        """
+        return cls(
+            requests_per_minute=settings.get("requests_per_minute"),
+            tokens_per_minute=settings.get("tokens_per_minute"),
+            max_concurrent_requests=settings.get("max_concurrent_requests"),
+        )
+
+    def estimate_tokens(self, messages, max_tokens=0, model="gpt-4o-mini"):
+        """
+        Estimates the tokens a request will consume against the token quota.
+
+        Args:
+            messages (list): The chat messages to send.
+            max_tokens (int): The completion token limit, which providers count
+                against the quota when the request is admitted.
+            model (str): The model the request is sent to, whose encoding is used
+                unless the scheduler was given a token counter.
+
+        Returns:
+            int: The estimated token cost, or 0 when no token quota is set.
+        """
+        if self.token_bucket is None:
+            return 0
+        token_counter = self.token_counter
+        if token_counter is None:
+            from .token_counter import TokenCounter
+            token_counter = TokenCounter.shared(model)
+        return token_counter.count_tokens(messages) + (max_tokens or 0)
+
+    def _loop_primitives(self):
+        loop = asyncio.get_running_loop()
+        primitives = self._primitives.get(loop)
+        if primitives is None:
+            semaphore = (
+                Semaphore(self.max_concurrent_requests)
+                if self.max_concurrent_requests
+                else None
+            )
+            primitives = self._primitives[loop] = (asyncio.Lock(), semaphore)
+        return primitives
+
+    async def _admit(self, lock, tokens):
+        if self.request_bucket is None and self.token_bucket is None:
+            return
+        async with lock:
+            while True:
+                wait = 0.0
+                if self.request_bucket is not None:
+                    wait = max(wait, self.request_bucket.time_until(1))
+                if self.token_bucket is not None:
+                    wait = max(wait, self.token_bucket.time_until(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens)
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, tokens=0):
+        """
+        Waits until a request costing `tokens` may be sent and holds its concurrency
+        slot.
+
+        Args:
+            tokens (int): The estimated token cost of the request.
+
+        Yields:
+            Reservation: Set `used_tokens` on it to return unused tokens to the budget.
+        """
+        lock, semaphore = self._loop_primitives()
+        reservation = Reservation(tokens)
+        if semaphore is not None:
+            await semaphore.__aenter__()
+        try:
+            await self._admit(lock, tokens)
+            yield reservation
+        finally:
+            if semaphore is not None:
+                await semaphore.__aexit__(None, None, None)
+            if self.token_bucket is not None and reservation.used_tokens is not None:
+                unused = reservation.tokens - reservation.used_tokens
+                if unused > 0:
+                    self.token_bucket.refund(unused)
+
+    async def call_function(self, func, *args, tokens=0, **kwargs):
+        """
+        Calls a function once the scheduler admits it.
+
+        Args:
+            func (Callable): The coroutine function to call.
+            *args: Positional arguments for the function.
+            tokens (int): The estimated token cost of the call.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The result of the function call.
+        """
+        async with self.reserve(tokens):
+            return await func(*args, **kwargs)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into a single execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    with the same key while it is in flight await that task instead of
+    starting their own. The key is forgotten as soon as the task finishes,
+    so later calls run again. Cancelling one caller does not cancel the
+    shared work for the others.
+
+    Work that cannot run as a single task, such as a stream consumed as it
+    arrives, is registered with `lead` instead, and callers with the same
+    key `join` it to wait for its final result.
+
+    Attributes:
+        shared (int): The number of calls that joined an in-flight execution.
+
+    Methods:
+        call_function(key, func, *args, **kwargs): Calls a function, sharing in-flight
+            results by key.
+        join(key): Returns the in-flight result for a key to await, or None.
+        lead(key): Registers work the caller performs itself so that others can join it.
+    """
+
+    def __init__(self):
+        """
+        Constructs the SingleFlight object.
+        """
+        self.shared = 0
+        self._calls = weakref.WeakKeyDictionary()
+
+    def _loop_calls(self):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        return calls
+
+    def join(self, key):
+        """
+        Returns the result of the call in flight for a key, to await, or None if there
+        is none.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+
+        Returns:
+            Awaitable: Resolves to the in-flight call's result, or None.
+        """
+        pending = self._loop_calls().get(key)
+        if pending is None:
+            return None
+        self.shared += 1
+        return asyncio.shield(pending)
+
+    @contextlib.contextmanager
+    def lead(self, key):
+        """
+        Registers work the caller performs itself under a key, so that calls to
+        `join` with the same key wait for its result instead of repeating it.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+
+        Yields:
+            asyncio.Future: Set its result once the work is complete. If the block
+            exits without one, the joined callers receive None.
+        """
+        calls = self._loop_calls()
+        result = calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            yield result
+        finally:
+            if not result.done():
+                result.set_result(None)
+            if calls.get(key) is result:
+                del calls[key]
+
+    async def call_function(self, key, func, *args, **kwargs):
+        """
+        Calls a function unless a call with the same key is already in flight.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+            func (Callable): The coroutine function to call.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The result of the (possibly shared) function call.
+        """
+        calls = self._loop_calls()
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = asyncio.get_running_loop().create_task(
+                func(*args, **kwargs)
+            )
+            task.add_done_callback(
+                lambda done: calls.pop(key, None) if calls.get(key) is done else None
+            )
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+
+async def stream_bounded(func, items, max_concurrency=10):
+    """
+    Applies a coroutine function to items and yields results as they complete.
+
+    At most `max_concurrency` calls are in flight. Items are pulled from
+    `items` (a sync or async iterable) only when a slot frees up and the
+    consumer has taken the previous results, so a slow consumer or a very
+    large input does not build up pending work or buffered results.
+
+    Args:
+        func (Callable): Called as func(index, item); must return an awaitable.
+        items (Iterable | AsyncIterable): The items to process.
+        max_concurrency (int): The maximum number of calls in flight.
+
+    Yields:
+        Tuple[int, Any]: The index of each item and its result, in completion order.
+
+    Raises:
+        ValueError: If max_concurrency is less than 1, when iteration starts.
+        Exception: The first error raised by `func`; remaining calls are cancelled.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    done_marker = object()
+    if hasattr(items, "__aiter__"):
+        iterator = items.__aiter__()
+
+        async def next_item():
+            try:
+                return await iterator.__anext__()
+            except StopAsyncIteration:
+                return done_marker
+    else:
+        iterator = iter(items)
+
+        async def next_item():
+            return next(iterator, done_marker)
+
+    indexes = {}
+    pending = set()
+    next_index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < max_concurrency:
+                item = await next_item()
+                if item is done_marker:
+                    exhausted = True
+                    break
+                task = asyncio.ensure_future(func(next_index, item))
+                indexes[task] = next_index
+                pending.add(task)
+                next_index += 1
+
+            if not pending:
+                return
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=indexes.get):
+                yield indexes.pop(task), task.result()
+    finally:
+        for task in pending:
+            task.cancel()
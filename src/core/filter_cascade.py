@@ -0,0 +1,312 @@
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Embed = Callable[[List[str]], List[Sequence[float]]]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def keyword_vector(text: str) -> Dict[str, float]:
+    """
+    Builds a sparse bag-of-words vector from lower-cased alphanumeric words.
+
+    Args:
+        text (str): The text to vectorize.
+
+    Returns:
+        Dict[str, float]: Word counts keyed by word.
+    """
+    return dict(Counter(_WORD.findall(text.lower())))
+
+
+def cosine_similarity(a, b) -> float:
+    """
+    Computes the cosine similarity of two sparse (dict) or dense (sequence) vectors.
+
+    Args:
+        a (Dict[str, float] | Sequence[float]): The first vector.
+        b (Dict[str, float] | Sequence[float]): The second vector, of the same kind.
+
+    Returns:
+        float: The similarity, or 0.0 if either vector is empty.
+    """
+    if isinstance(a, dict):
+        if len(a) > len(b):
+            a, b = b, a
+        dot = sum(value * b.get(key, 0.0) for key, value in a.items())
+        norms = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(
+            sum(v * v for v in b.values())
+        )
+    else:
+        dot = sum(x * y for x, y in zip(a, b))
+        norms = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norms if norms else 0.0
+
+
+class RuleStage:
+    """
+    Decides items that exactly match, or match a regular expression from, a keep or
+    remove list.
+
+    Attributes:
+        keep (set): Items that are always kept.
+        remove (set): Items that are always removed.
+        keep_patterns (List[re.Pattern]): Patterns whose matches are kept.
+        remove_patterns (List[re.Pattern]): Patterns whose matches are removed.
+        case_sensitive (bool): Whether exact matches and patterns respect case.
+        name (str): The stage name reported in explanations and counters.
+
+    Methods:
+        decide(item): Returns a filtering result, or None if no rule applies.
+    """
+
+    name = "rules"
+
+    def __init__(
+        self,
+        keep: Iterable[str] = (),
+        remove: Iterable[str] = (),
+        keep_patterns: Iterable[str] = (),
+        remove_patterns: Iterable[str] = (),
+        case_sensitive: bool = False,
+    ):
+        """
+        Constructs the RuleStage object and compiles its patterns once.
+
+        Args:
+            keep (Iterable[str]): Items that are always kept.
+            remove (Iterable[str]): Items that are always removed.
+            keep_patterns (Iterable[str]): Regular expressions whose matches are kept.
+            remove_patterns (Iterable[str]): Regular expressions whose matches are
+                removed.
+            case_sensitive (bool): Whether exact matches and patterns respect case.
+        """
+        self.case_sensitive = case_sensitive
+        self.keep = {self._normalize(item) for item in keep}
+        self.remove = {self._normalize(item) for item in remove}
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self.keep_patterns = [re.compile(pattern, flags) for pattern in keep_patterns]
+        self.remove_patterns = [
+            re.compile(pattern, flags) for pattern in remove_patterns
+        ]
+
+    def _normalize(self, item: str) -> str:
+        item = item.strip()
+        return item if self.case_sensitive else item.casefold()
+
+    def decide(self, item: str) -> Optional[Dict]:
+        """
+        Applies the exact-match rules and then the patterns. Remove rules win over keep
+        rules.
+
+        Args:
+            item (str): The item to decide.
+
+        Returns:
+            Dict: A filtering result with "explanation" and "remove_item", or None.
+        """
+        normalized = self._normalize(item)
+        if normalized in self.remove:
+            return {"explanation": "Matched the remove list.", "remove_item": True}
+        if normalized in self.keep:
+            return {"explanation": "Matched the keep list.", "remove_item": False}
+        for pattern in self.remove_patterns:
+            if pattern.search(item):
+                return {
+                    "explanation": f"Matched the remove pattern {pattern.pattern!r}.",
+                    "remove_item": True,
+                }
+        for pattern in self.keep_patterns:
+            if pattern.search(item):
+                return {
+                    "explanation": f"Matched the keep pattern {pattern.pattern!r}.",
+                    "remove_item": False,
+                }
+        return None
+
+
+class SimilarityStage:
+    """
+    Decides items that are clearly closer to the keep exemplars than to the remove
+    exemplars, or vice versa.
+
+    Items are scored by their best cosine similarity to each exemplar set,
+    using a local embedding function when one is given and keyword vectors
+    otherwise. An item is decided only when its best score reaches
+    `threshold` and beats the other set by at least `margin`; everything
+    else is left for the next stage.
+
+    Attributes:
+        keep_exemplars (List[str]): Examples of items to keep.
+        remove_exemplars (List[str]): Examples of items to remove.
+        threshold (float): The minimum similarity needed to decide an item.
+        margin (float): How much the winning set must beat the other by.
+        embed (Callable): Maps a list of texts to dense vectors, or None for keyword
+            vectors.
+        name (str): The stage name reported in explanations and counters.
+
+    Methods:
+        score(item): Returns the best keep and remove similarities.
+        decide(item): Returns a filtering result, or None if the item is ambiguous.
+    """
+
+    name = "similarity"
+
+    def __init__(
+        self,
+        keep_exemplars: Iterable[str] = (),
+        remove_exemplars: Iterable[str] = (),
+        threshold: float = 0.5,
+        margin: float = 0.2,
+        embed: Optional[Embed] = None,
+    ):
+        """
+        Constructs the SimilarityStage object and vectorizes the exemplars once.
+
+        Args:
+            keep_exemplars (Iterable[str]): Examples of items to keep.
+            remove_exemplars (Iterable[str]): Examples of items to remove.
+            threshold (float): The minimum similarity needed to decide an item.
+            margin (float): How much the winning set must beat the other by.
+            embed (Callable): Maps a list of texts to dense vectors. Defaults to keyword
+                vectors.
+        """
+        self.keep_exemplars = list(keep_exemplars)
+        self.remove_exemplars = list(remove_exemplars)
+        self.threshold = threshold
+        self.margin = margin
+        self.embed = embed
+        self._keep_vectors = self._vectorize(self.keep_exemplars)
+        self._remove_vectors = self._vectorize(self.remove_exemplars)
+
+    def _vectorize(self, texts: List[str]) -> list:
+        if not texts:
+            return []
+        if self.embed is not None:
+            return list(self.embed(texts))
+        return [keyword_vector(text) for text in texts]
+
+    def score(self, item: str) -> Tuple[float, float]:
+        """
+        Returns the item's best similarity to the keep and the remove exemplars.
+
+        Args:
+            item (str): The item to score.
+
+        Returns:
+            Tuple[float, float]: The keep and remove similarities.
+        """
+        vector = self._vectorize([item])[0]
+        keep = max(
+            (cosine_similarity(vector, other) for other in self._keep_vectors),
+            default=0.0,
+        )
+        remove = max(
+            (cosine_similarity(vector, other) for other in self._remove_vectors),
+            default=0.0,
+        )
+        return keep, remove
+
+    def decide(self, item: str) -> Optional[Dict]:
+        """
+        Decides the item if it is confidently closer to one exemplar set.
+
+        Args:
+            item (str): The item to decide.
+
+        Returns:
+            Dict: A filtering result with "explanation" and "remove_item", or None.
+        """
+        keep, remove = self.score(item)
+        if max(keep, remove) < self.threshold or abs(keep - remove) < self.margin:
+            return None
+        remove_item = remove > keep
+        label = "remove" if remove_item else "keep"
+        explanation = (
+            f"Similar to the {label} examples (keep {keep:.2f}, remove {remove:.2f})."
+        )
+        return {
+            "explanation": explanation,
+            "remove_item": remove_item,
+        }
+
+
+class FilterCascade:
+    """
+    Runs cheap filtering stages in order and leaves only ambiguous items for the LLM.
+
+    A stage is any object with a `decide(item)` method returning a filtering
+    result or None, and a `name`. The first stage to return a result decides
+    the item.
+
+    Attributes:
+        stages (List): The stages, cheapest first.
+        decided (Dict[str, int]): Items decided by each stage.
+        undecided (int): Items no stage could decide.
+
+    Methods:
+        decide(item): Returns the first stage's result, or None.
+        partition(items): Splits items into decided results and undecided indexes.
+        stats(): Returns the per-stage counters.
+    """
+
+    def __init__(self, stages: Iterable):
+        """
+        Constructs the FilterCascade object.
+
+        Args:
+            stages (Iterable): The stages, cheapest first.
+        """
+        self.stages = list(stages)
+        self.decided = {stage.name: 0 for stage in self.stages}
+        self.undecided = 0
+
+    def decide(self, item: str) -> Optional[Dict]:
+        """
+        Returns the result of the first stage that can decide the item.
+
+        Args:
+            item (str): The item to decide.
+
+        Returns:
+            Dict: A filtering result tagged with the deciding "stage", or None.
+        """
+        for stage in self.stages:
+            result = stage.decide(item)
+            if result is not None:
+                self.decided[stage.name] = self.decided.get(stage.name, 0) + 1
+                return {**result, "stage": stage.name}
+        self.undecided += 1
+        return None
+
+    def partition(self, items: List[str]) -> Tuple[Dict[int, Dict], List[int]]:
+        """
+        Splits items into those the stages can decide and those they cannot.
+
+        Args:
+            items (List[str]): The items to decide.
+
+        Returns:
+            Tuple[Dict[int, Dict], List[int]]: The results keyed by item index, and
+            the indexes of the undecided items in order.
+        """
+        decided = {}
+        undecided = []
+        for index, item in enumerate(items):
+            result = self.decide(item)
+            if result is None:
+                undecided.append(index)
+            else:
+                decided[index] = result
+        return decided, undecided
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the per-stage counters.
+
+        Returns:
+            Dict[str, int]: Items decided by each stage, plus "undecided".
+        """
+        return {**self.decided, "undecided": self.undecided}
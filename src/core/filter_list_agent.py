@@ -2,14 +2,36 @@ from pydantic import BaseModel, Field
 import asyncio
 import json
 import jsonschema
-from typing import List, Dict
+from typing import List, Dict, Optional, AsyncIterator, Iterable, Tuple
 from .openai_api import OpenAIClient
+from .batching import BatchCompleter
+from .filter_cascade import FilterCascade
+from .concurrency import stream_bounded
+from .compose_prompt import PromptLayout
+from .model_router import json_acceptor
+from .structured_output import (
+    PARSE_ERRORS,
+    StructuredOutputError,
+    StructuredOutputPolicy,
+    json_schema_format,
+)
+from .tracing import traced
 
 class FilterListInput(BaseModel):
     goal: str = Field(..., description="The goal for filtering the list")
     items_to_filter: List[str] = Field(..., description="The list of items to filter")
     max_tokens: int = Field(500, description="The maximum number of tokens to generate")
     temperature: float = Field(0.0, description="Sampling temperature for the OpenAI model")
+    batch_mode: bool = Field(
+        False, description="Whether to pack several items into each request"
+    )
+    batch_token_budget: int = Field(
+        4000, description="The maximum number of prompt tokens per batched request"
+    )
+    batch_output_tokens: int = Field(
+        100,
+        description="The completion tokens reserved for each item in a batched request",
+    )
 
 class FilterListAgent:
     """
@@ -20,14 +42,37 @@ class FilterListAgent:
         items (List[str]): The list of items to filter.
         max_tokens (int): The maximum number of tokens to generate.
         temperature (float): Sampling temperature for the OpenAI model.
+        batch_mode (bool): Whether to pack several items into each request.
+        batch_token_budget (int): The maximum number of prompt tokens per batched
+            request.
+        batch_output_tokens (int): The completion tokens reserved for each item in a
+            batched request.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        prefilter (FilterCascade): Cheap stages that decide clear-cut items before the
+            LLM.
+        output_policy (StructuredOutputPolicy): Bounds the retries of invalid responses.
+        layout (PromptLayout): Keeps the goal and examples in the system message shared
+            by every item.
         schema (dict): JSON schema to validate the API's response format.
+        validator (jsonschema.Draft7Validator): The schema's validator, compiled once
+            for the class.
+        response_format (dict): Asks the API for output that matches the schema.
+        accept (Callable): Rejects responses that fail the schema, so that a ModelRouter
+            escalates them.
 
     Methods:
         filter(): Filters the entire list of items.
         filter_list(items): Filters a given list of items.
+        filter_list_batched(items): Filters a given list by packing several items into
+            each request.
+        filter_stream(items, max_concurrency): Filters items and yields results as they
+            complete.
         filter_item(system_prompt, user_prompt): Filters a single item.
-        process_response(response, system_prompt, user_prompt, retry): Processes and validates the API response.
+        process_response(response, system_prompt, user_prompt, retry): Validates a
+            response, repairing it once if needed.
+        parse_response(response): Parses and validates the API response.
+        prefix_tokens(encoder): Returns the number of prompt tokens every request of a
+            run shares.
     """
 
     schema = {
@@ -36,23 +81,63 @@ class FilterListAgent:
             "explanation": {"type": "string"},
             "remove_item": {"type": "boolean"}
         },
-        "required": ["explanation", "remove_item"]
+        "required": ["explanation", "remove_item"],
+        "additionalProperties": False
     }
+    validator = jsonschema.Draft7Validator(schema)
+    response_format = json_schema_format("filter_result", schema)
+    accept = staticmethod(json_acceptor(schema))
 
-    def __init__(self, data: FilterListInput):
+    def __init__(
+        self,
+        data: FilterListInput,
+        openai_client: Optional[OpenAIClient] = None,
+        prefilter: Optional[FilterCascade] = None,
+        output_policy: Optional[StructuredOutputPolicy] = None,
+    ):
         """
         Constructs all the necessary attributes for the FilterListAgent object.
 
         Args:
             data (FilterListInput): An instance of FilterListInput containing 
             the goal, items to filter, max_tokens, and temperature.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
+            prefilter (FilterCascade): Cheap stages that decide clear-cut items. Only
+            the items it cannot decide are sent to the LLM.
+            output_policy (StructuredOutputPolicy): Bounds the retries of invalid
+            responses. Defaults to a policy of its own; pass one to share limits and
+            counters.
         """
         self.goal = data.goal
         self.items = data.items_to_filter
         self.max_tokens = data.max_tokens
         self.temperature = data.temperature
-        self.openai_client = OpenAIClient()
+        self.batch_mode = data.batch_mode
+        self.batch_token_budget = data.batch_token_budget
+        self.batch_output_tokens = data.batch_output_tokens
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.prefilter = prefilter
+        self.output_policy = output_policy or StructuredOutputPolicy()
+        self.layout = PromptLayout(
+            "You are an assistant tasked with filtering a list of items. The goal is: "
+            "{{goal}}. For each item, decide if it should be removed based on whether "
+            "it is a healthy snack.\n"
+            "Respond in the following structured format:\n\n"
+            "Example:\n"
+            "{\"explanation\": \"The apple is a healthy snack option, as it is low in "
+            "calories...\",\n"
+            " \"remove_item\": false}\n\n"
+            "Example:\n"
+            "{\"explanation\": \"A chocolate bar is generally considered an unhealthy "
+            "snack...\",\n"
+            " \"remove_item\": true}\n\n",
+            "Item {{number}}: {{item}}. Should it be removed? Answer with explanation "
+            "and 'remove_item': true/false.",
+            {"goal": self.goal},
+        )
 
+    @traced
     async def filter(self) -> List[Dict]:
         """
         Filters the entire list based on the provided items and goal.
@@ -62,6 +147,7 @@ class FilterListAgent:
         """
         return await self.filter_list(self.items)
 
+    @traced
     async def filter_list(self, items: List[str]) -> List[Dict]:
         """
         Filters a given list of items based on the goal.
@@ -72,30 +158,149 @@ class FilterListAgent:
         Returns:
             List[Dict]: A list of dictionaries with the filtering results.
         """
-        system_prompt = (
-            "You are an assistant tasked with filtering a list of items. The goal is: "
-            f"{self.goal}. For each item, decide if it should be removed based on whether it is a healthy snack.\n"
-            "Respond in the following structured format:\n\n"
-            "Example:\n"
-            "{\"explanation\": \"The apple is a healthy snack option, as it is low in calories...\",\n"
-            " \"remove_item\": false}\n\n"
-            "Example:\n"
-            "{\"explanation\": \"A chocolate bar is generally considered an unhealthy snack...\",\n"
-            " \"remove_item\": true}\n\n"
-        )
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending = list(range(len(items)))
+        if self.prefilter is not None:
+            decided, pending = self.prefilter.partition(items)
+            for index, result in decided.items():
+                results[index] = result
+
+        if not pending:
+            completed = []
+        elif self.batch_mode:
+            completed = await self.filter_list_batched(
+                [items[index] for index in pending], indexes=pending
+            )
+        else:
+            system_prompt = self._system_prompt()
+            tasks = []
+            for index in pending:
+                tasks.append(
+                    self.filter_item(
+                        system_prompt, self._user_prompt(index, items[index])
+                    )
+                )
 
-        tasks = []
-        for index, item in enumerate(items):
-            user_prompt = f"Item {index+1}: {item}. Should it be removed? Answer with explanation and 'remove_item': true/false."
-            tasks.append(self.filter_item(system_prompt, user_prompt))
+            completed = await asyncio.gather(*tasks)
 
-        results = await asyncio.gather(*tasks)
+        for index, result in zip(pending, completed):
+            results[index] = result
 
-        filtered_items = [self.items[i] for i, result in enumerate(results) if not result.get('remove_item', False)]
+        filtered_items = [
+            items[i]
+            for i, result in enumerate(results)
+            if not result.get('remove_item', False)
+        ]
         print("\nFinal Filtered List:", filtered_items)
 
         return results
 
+    @traced
+    async def filter_list_batched(
+        self, items: List[str], indexes: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Filters a given list of items by packing several items into each request.
+
+        Args:
+            items (List[str]): The list of items to filter.
+            indexes (List[int]): The position of each item in the original list, used to
+                number the per-item fallback prompts. Defaults to the items' own
+                positions.
+
+        Returns:
+            List[Dict]: A list of dictionaries with the filtering results.
+        """
+        system_prompt = self._system_prompt()
+        batcher = self._batcher()
+        return await batcher.complete(
+            items,
+            fallback=lambda index: self.filter_item(
+                system_prompt,
+                self._user_prompt(
+                    index if indexes is None else indexes[index], items[index]
+                ),
+            ),
+        )
+
+    async def filter_stream(
+        self, items: Optional[Iterable[str]] = None, max_concurrency: int = 10
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Filters items and yields each result as soon as its request completes.
+
+        At most `max_concurrency` requests are in flight, and new items are only
+        read once the caller has consumed earlier results. Items the prefilter
+        decides complete without a request.
+
+        Args:
+            items (Iterable[str]): The items to filter, which may be a lazy or async
+                iterable. Defaults to the agent's list.
+            max_concurrency (int): The maximum number of requests in flight.
+
+        Yields:
+            Tuple[int, Dict]: The index of each item and its filtering result, in
+            completion order.
+        """
+        system_prompt = self._system_prompt()
+
+        async def filter_one(index: int, item: str) -> Dict:
+            if self.prefilter is not None:
+                result = self.prefilter.decide(item)
+                if result is not None:
+                    return result
+            return await self.filter_item(system_prompt, self._user_prompt(index, item))
+
+        async for index, result in stream_bounded(
+            filter_one,
+            self.items if items is None else items,
+            max_concurrency,
+        ):
+            yield index, result
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens shared by every request of a list run.
+
+        Providers only serve a prefix from their prompt cache once it reaches
+        MIN_CACHED_PREFIX_TOKENS. In batch mode the shared prefix is the batch
+        system prompt; otherwise it is the prompt layout's prefix.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the model's encoding.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if self.batch_mode:
+            return self._batcher().prefix_tokens(encoder)
+        return self.layout.prefix_tokens(encoder)
+
+    def _batcher(self) -> BatchCompleter:
+        return BatchCompleter(
+            self.openai_client,
+            instructions=(
+                "You are an assistant tasked with filtering a list of items. "
+                f"The goal is: {self.goal}. "
+                "For each item, decide if it should be removed."
+            ),
+            value_description='an object with an "explanation" string and a '
+                              '"remove_item" boolean',
+            value_schema=self.schema,
+            token_budget=self.batch_token_budget,
+            output_tokens_per_item=min(self.batch_output_tokens, self.max_tokens),
+            temperature=self.temperature,
+            output_policy=self.output_policy,
+        )
+
+    def _system_prompt(self) -> str:
+        return self.layout.prefix[0]["content"]
+
+    def _user_prompt(self, index: int, item: str) -> str:
+        return self.layout.user_prompt({"number": index + 1, "item": item})
+
+    @traced
     async def filter_item(self, system_prompt: str, user_prompt: str) -> Dict:
         """
         Filters a single item based on the goal.
@@ -107,32 +312,87 @@ class FilterListAgent:
         Returns:
             Dict: A dictionary with the filtering result.
         """
-        response = await self.openai_client.complete_chat([
+        messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
-
-        return await self.process_response(response, system_prompt, user_prompt)
+        ]
+        try:
+            return await self.output_policy.complete(
+                self.openai_client,
+                messages,
+                self.parse_response,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                response_format=self.response_format,
+                accept=self.accept,
+            )
+        except StructuredOutputError as e:
+            return {
+                "error": f"Failed to parse response: {str(e)}",
+                "response": e.response,
+                "item": user_prompt,
+            }
 
     async def process_response(self, response: str, system_prompt: str, user_prompt: str, retry: bool = True) -> Dict:
         """
         Processes and validates the API response.
 
+        An invalid response is repaired through the output policy, which bounds
+        the number of further requests.
+
         Args:
             response (str): The API's response to process.
             system_prompt (str): The system prompt used for the API request.
             user_prompt (str): The user prompt used for the API request.
-            retry (bool): Whether to retry the request if validation fails.
+            retry (bool): Whether to request a corrected response if validation fails.
 
         Returns:
             Dict: A dictionary containing the validated response or an error.
         """
         try:
-            result = json.loads(response)
-            jsonschema.validate(instance=result, schema=self.schema)
-            return result
-        except (json.JSONDecodeError, jsonschema.ValidationError) as e:
-            if retry:
-                return await self.filter_item(system_prompt, user_prompt)
-            else:
-                return {"error": f"Failed to parse response after retry: {str(e)}", "response": response, "item": user_prompt}
+            return self.parse_response(response)
+        except PARSE_ERRORS as e:
+            if not retry:
+                return {
+                    "error": f"Failed to parse response: {str(e)}",
+                    "response": response,
+                    "item": user_prompt,
+                }
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            try:
+                return await self.output_policy.complete(
+                    self.openai_client,
+                    self.output_policy.repair_messages(messages, response, e),
+                    self.parse_response,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    response_format=self.response_format,
+                    accept=self.accept,
+                )
+            except StructuredOutputError as error:
+                return {
+                    "error": f"Failed to parse response: {str(error)}",
+                    "response": error.response,
+                    "item": user_prompt,
+                }
+
+    def parse_response(self, response: str) -> Dict:
+        """
+        Parses and validates the API response.
+
+        Args:
+            response (str): The API's response to process.
+
+        Returns:
+            Dict: The validated filtering result.
+
+        Raises:
+            json.JSONDecodeError: If the response is not JSON.
+            jsonschema.ValidationError: If the response does not match the schema.
+        """
+        result = json.loads(response)
+        self.validator.validate(result)
+        return result
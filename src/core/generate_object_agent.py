@@ -1,6 +1,10 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+import json
+from typing import Any, AsyncIterator, Dict, Optional
 from .openai_api import OpenAIClient
+from .partial_json import PartialJSONParser
+from .structured_output import StructuredOutputPolicy
+from .tracing import traced
 
 class ObjectGenerationInput(BaseModel):
     object_description: str = Field(..., description="A description of the object to generate")
@@ -16,24 +20,40 @@ class GenerateObjectAgent:
         goal (str): The goal of the generation process.
         max_tokens (int): The maximum number of tokens to generate.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        output_policy (StructuredOutputPolicy): Bounds the repairs of a streamed object
+            that is not valid JSON.
 
     Methods:
         generate_object(): Generates an object based on the description and goal.
+        generate_object_stream(): Streams the generated object as it is produced.
+        generate_object_partials(): Streams the object as JSON, yielding each more
+            complete parse.
     """
 
-    def __init__(self, data: ObjectGenerationInput):
+    def __init__(
+        self,
+        data: ObjectGenerationInput,
+        openai_client: Optional[OpenAIClient] = None,
+        output_policy: Optional[StructuredOutputPolicy] = None,
+    ):
         """
         Constructs all the necessary attributes for the GenerateObjectAgent object.
 
         Args:
             data (ObjectGenerationInput): An instance of ObjectGenerationInput containing 
             the object description, goal, and max_tokens.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
+            output_policy (StructuredOutputPolicy): Bounds the repairs of a streamed
+            object that is not valid JSON. Defaults to a policy of its own.
         """
         self.object_description = data.object_description
         self.goal = data.goal
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.output_policy = output_policy or StructuredOutputPolicy()
 
+    @traced
     async def generate_object(self) -> Dict:
         """
         Generates an object based on the given description and goal.
@@ -41,12 +61,83 @@ class GenerateObjectAgent:
         Returns:
             dict: A dictionary containing the original object description and the generated object.
         """
+        response = await self.openai_client.complete_chat(
+            self._messages(), max_tokens=self.max_tokens
+        )
+
+        return {
+            "object_description": self.object_description,
+            "generated_object": response.strip(),
+        }
+
+    async def generate_object_stream(self) -> AsyncIterator[str]:
+        """
+        Generates an object based on the given description and goal, streaming the
+        output.
+
+        Yields:
+            str: Pieces of the generated object as they are produced.
+        """
+        async for delta in self.openai_client.stream_chat(
+            self._messages(), max_tokens=self.max_tokens
+        ):
+            yield delta
+
+    async def generate_object_partials(self) -> AsyncIterator[Any]:
+        """
+        Generates the object as JSON and parses it incrementally while it streams.
+
+        A PartialJSONParser keeps its scan state between deltas, so each delta
+        only scans the text it adds. If the finished stream is not valid JSON
+        (for example because it was cut off), the output policy asks for a
+        repaired object, which is yielded last.
+
+        Yields:
+            Any: The object parsed from the JSON received so far, each time it grows.
+            The last value yielded is the complete object.
+
+        Raises:
+            StructuredOutputError: If the stream and its repairs never produced valid
+                JSON.
+        """
+        messages = self._messages(json_output=True)
+        parser = PartialJSONParser()
+        parts = []
+        last = None
+        async for delta in self.openai_client.stream_chat(
+            messages, max_tokens=self.max_tokens
+        ):
+            parts.append(delta)
+            partial = parser.feed(delta)
+            if partial is not None and partial != last:
+                last = partial
+                yield partial
+
+        response = "".join(parts)
+        try:
+            final = (
+                parser.value
+                if parser.complete and parser.value is not None
+                else json.loads(response)
+            )
+        except ValueError as error:
+            final = await self.output_policy.complete(
+                self.openai_client,
+                self.output_policy.repair_messages(messages, response, error),
+                json.loads,
+                max_tokens=self.max_tokens,
+            )
+        if final != last:
+            yield final
+
+    def _messages(self, json_output: bool = False):
         system_prompt = f"You are an assistant tasked with generating objects based on a given description. The goal is: {self.goal}."
+        if json_output:
+            system_prompt += (
+                " Respond with the object as a single JSON value and nothing else."
+            )
         user_prompt = f"Generate an object based on the following description: {self.object_description}."
-
-        response = await self.openai_client.complete_chat([
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
-
-        return {"object_description": self.object_description, "generated_object": response.strip()}
+        ]
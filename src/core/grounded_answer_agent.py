@@ -2,31 +2,93 @@ from pydantic import BaseModel, Field
 import asyncio
 import json
 import jsonschema
-from typing import Dict
+from typing import Dict, Optional
+from .chunking import Chunk, TextChunker
+from .model_router import json_acceptor
 from .openai_api import OpenAIClient
+from .retrieval import BM25Index
+from .structured_output import (
+    StructuredOutputError,
+    StructuredOutputPolicy,
+    json_schema_format,
+)
+from .tracing import traced
 
 class GroundedAnswerInput(BaseModel):
     question: str = Field(..., description="The question to answer based on the provided context")
-    context: str = Field(..., description="The context information to base the answer on")
+    context: str = Field(
+        '',
+        description="The context information to base the answer on, unless a retrieval "
+                    "index is given",
+    )
     instructions: str = Field('', description="Additional instructions for answering the question")
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
+    long_context_mode: bool = Field(
+        False,
+        description="Whether to answer from token-sized chunks of the context and "
+                    "combine the results",
+    )
+    chunk_tokens: int = Field(
+        2000,
+        description="The maximum number of context tokens per chunk in "
+                    "long-context mode",
+    )
+    chunk_overlap: int = Field(
+        200,
+        description="The number of tokens shared by consecutive chunks in "
+                    "long-context mode",
+    )
+    retrieval_top_k: int = Field(
+        5, description="The number of passages taken from the retrieval index"
+    )
 
 class GroundedAnswerAgent:
     """
     A class to provide grounded answers based on a given context using the OpenAI API.
 
+    In long-context mode the context is split into overlapping token-sized
+    chunks. Notes relevant to the question are extracted from every chunk in
+    parallel, and a final request answers from those notes and cites the
+    chunks, by character offset, that it relied on.
+
+    When a retrieval index is given, only the passages that best match the
+    question are sent as context, so the prompt size no longer grows with
+    the corpus.
+
     Attributes:
         question (str): The question to answer based on the provided context.
         context (str): The context information to base the answer on.
         instructions (str): Additional instructions for answering the question.
         max_tokens (int): The maximum number of tokens to generate.
+        long_context_mode (bool): Whether to answer from chunks of the context.
+        chunk_tokens (int): The maximum number of context tokens per chunk in
+            long-context mode.
+        chunk_overlap (int): The number of tokens shared by consecutive chunks in
+            long-context mode.
+        chunker (TextChunker): Splits the context in long-context mode, or None until it
+            is needed.
+        index (BM25Index): Supplies passages in place of the context, or None.
+        retrieval_top_k (int): The number of passages taken from the index.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        output_policy (StructuredOutputPolicy): Bounds the retries of invalid responses.
         schema (dict): JSON schema to validate the API's response format.
+        validator (jsonschema.Draft7Validator): The schema's validator, compiled once
+            for the class.
+        response_format (dict): Asks the API for output that matches the schema.
+        accept (Callable): Rejects responses that fail the schema, so that a ModelRouter
+            escalates them.
+        extract_schema (dict): JSON schema for the notes extracted from one chunk.
+        cited_schema (dict): JSON schema for an answer that cites chunk numbers.
 
     Methods:
         answer(): Provides a grounded answer based on the context.
         grounded_answer(): Generates the grounded answer using the API.
+        grounded_answer_chunked(): Answers from chunks of the context, with citations.
+        grounded_answer_retrieved(): Answers from the passages retrieved for the
+            question.
         process_response(response): Processes and validates the API response.
+        parse_response(response): Parses and validates the API response, raising on
+            failure.
     """
 
     # JSON schema for validation
@@ -39,30 +101,92 @@ class GroundedAnswerAgent:
         "required": ["explanation", "answer"],
         "additionalProperties": False
     }
+    validator = jsonschema.Draft7Validator(schema)
+    response_format = json_schema_format("grounded_answer", schema)
+    accept = staticmethod(json_acceptor(schema))
 
-    def __init__(self, data: GroundedAnswerInput):
+    extract_schema = {
+        "type": "object",
+        "properties": {
+            "relevant": {"type": "boolean"},
+            "notes": {"type": "string"}
+        },
+        "required": ["relevant", "notes"],
+        "additionalProperties": False
+    }
+    extract_validator = jsonschema.Draft7Validator(extract_schema)
+    extract_response_format = json_schema_format("chunk_notes", extract_schema)
+    extract_accept = staticmethod(json_acceptor(extract_schema))
+
+    cited_schema = {
+        "type": "object",
+        "properties": {
+            "explanation": {"type": "string"},
+            "answer": {"type": "string"},
+            "citations": {"type": "array", "items": {"type": "integer"}}
+        },
+        "required": ["explanation", "answer", "citations"],
+        "additionalProperties": False
+    }
+    cited_validator = jsonschema.Draft7Validator(cited_schema)
+    cited_response_format = json_schema_format("cited_answer", cited_schema)
+    cited_accept = staticmethod(json_acceptor(cited_schema))
+
+    def __init__(
+        self,
+        data: GroundedAnswerInput,
+        openai_client: Optional[OpenAIClient] = None,
+        output_policy: Optional[StructuredOutputPolicy] = None,
+        index: Optional[BM25Index] = None,
+    ):
         """
         Constructs all the necessary attributes for the GroundedAnswerAgent object.
 
         Args:
             data (GroundedAnswerInput): An instance of GroundedAnswerInput containing 
-            the question, context, instructions, and max_tokens.
+            the question, context, instructions, max_tokens and the long-context
+            settings.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
+            output_policy (StructuredOutputPolicy): Bounds the retries of invalid
+            responses. Defaults to a policy of its own; pass one to share limits and
+            counters.
+            index (BM25Index): A retrieval index to take the context from, for example
+            one opened with `BM25Index.load`.
         """
         self.question = data.question
         self.context = data.context
         self.instructions = data.instructions
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.long_context_mode = data.long_context_mode
+        self.chunk_tokens = data.chunk_tokens
+        self.chunk_overlap = data.chunk_overlap
+        self.chunker = (
+            TextChunker(self.chunk_tokens, self.chunk_overlap)
+            if self.long_context_mode
+            else None
+        )
+        self.index = index
+        self.retrieval_top_k = data.retrieval_top_k
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.output_policy = output_policy or StructuredOutputPolicy()
 
+    @traced
     async def answer(self) -> Dict:
         """
         Provides a grounded answer based on the provided context.
 
         Returns:
-            Dict: The grounded answer and explanation.
+            Dict: The grounded answer and explanation, plus citations in long-context
+            mode and the passages used when answering from a retrieval index.
         """
+        if self.index is not None:
+            return await self.grounded_answer_retrieved()
+        if self.long_context_mode:
+            return await self.grounded_answer_chunked()
         return await self.grounded_answer()
 
+    @traced
     async def grounded_answer(self) -> Dict:
         """
         Generates the grounded answer using the API.
@@ -70,8 +194,38 @@ class GroundedAnswerAgent:
         Returns:
             Dict: The grounded answer and explanation.
         """
+        return await self._answer_from(self.context)
+
+    @traced
+    async def grounded_answer_retrieved(self) -> Dict:
+        """
+        Answers from the passages of the retrieval index that best match the question.
+
+        Returns:
+            Dict: The answer and explanation, and "passages" listing the "doc_id",
+            "start" and "end" character offsets and "score" of each passage sent.
+        """
+        results = self.index.search(self.question, self.retrieval_top_k)
+        context = "\n\n".join(
+            f"[{passage.doc_id}, characters {passage.start}-{passage.end}]\n"
+            f"{passage.text}"
+            for _, passage in results
+        )
+        result = await self._answer_from(context)
+        result["passages"] = [
+            {
+                "doc_id": passage.doc_id,
+                "start": passage.start,
+                "end": passage.end,
+                "score": score,
+            }
+            for score, passage in results
+        ]
+        return result
+
+    async def _answer_from(self, context: str) -> Dict:
         system_prompt = (
-            f"<CONTEXT>\n{self.context}\n\n"
+            f"<CONTEXT>\n{context}\n\n"
             "<INSTRUCTIONS>\nBase your answer only on the information provided in the above <CONTEXT>.\n"
             "Return your answer using the JSON <OUTPUT> below.\n"
             "Do not directly mention that you're using the context in your answer.\n\n"
@@ -80,12 +234,115 @@ class GroundedAnswerAgent:
 
         user_prompt = self.question
 
-        response = await self.openai_client.complete_chat([
+        messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
+        ]
+        try:
+            return await self.output_policy.complete(
+                self.openai_client,
+                messages,
+                self.parse_response,
+                max_tokens=self.max_tokens,
+                response_format=self.response_format,
+                accept=self.accept,
+            )
+        except StructuredOutputError as e:
+            return {
+                "error": f"Failed to parse or validate response: {str(e)}",
+                "response": e.response,
+            }
 
-        return await self.process_response(response)
+    @traced
+    async def grounded_answer_chunked(self) -> Dict:
+        """
+        Answers from token-sized chunks of the context, then combines the results.
+
+        Returns:
+            Dict: The answer and explanation, and "citations" listing the "chunk",
+            "start" and "end" character offsets of each chunk the answer relied on.
+        """
+        if self.chunker is None:
+            self.chunker = TextChunker(self.chunk_tokens, self.chunk_overlap)
+        chunks = self.chunker.split(self.context)
+        extracts = await asyncio.gather(*(self._extract(chunk) for chunk in chunks))
+        relevant = [
+            (chunk, extract["notes"]) for chunk, extract in zip(chunks, extracts)
+            if "error" not in extract and extract["relevant"]
+        ]
+
+        notes = "\n\n".join(f"[{chunk.index + 1}] {text}" for chunk, text in relevant)
+        notes = notes or "(No part of the context is relevant to the question.)"
+        system_prompt = (
+            f"<NOTES>\n{notes}\n\n"
+            "<INSTRUCTIONS>\nThe numbered notes above were taken from sections of a "
+            "longer document. Base your answer only on them.\n"
+            "List the numbers of the notes your answer relies on in \"citations\".\n"
+            "Do not directly mention that you're using notes in your answer.\n\n"
+            "<OUTPUT>\n{\"explanation\": \"<explain your reasoning>\", \"answer\": "
+            "\"<the answer>\", "
+            f"\"citations\": [<note numbers>]}}{self.instructions}"
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": self.question}
+        ]
+        try:
+            result = await self.output_policy.complete(
+                self.openai_client,
+                messages,
+                lambda response: self._parse(response, self.cited_validator),
+                max_tokens=self.max_tokens,
+                response_format=self.cited_response_format,
+                accept=self.cited_accept,
+            )
+        except StructuredOutputError as e:
+            return {
+                "error": f"Failed to parse or validate response: {str(e)}",
+                "response": e.response,
+            }
+
+        cited = {chunk.index + 1: chunk for chunk, _ in relevant}
+        result["citations"] = [
+            {"chunk": number, "start": cited[number].start, "end": cited[number].end}
+            for number in dict.fromkeys(result["citations"]) if number in cited
+        ]
+        return result
+
+    async def _extract(self, chunk: Chunk) -> Dict:
+        system_prompt = (
+            f"<CONTEXT>\n{chunk.text}\n\n"
+            "<INSTRUCTIONS>\nThe above <CONTEXT> is one section of a longer document. "
+            "Decide whether it contains information that helps answer the question. If "
+            "it does, set \"relevant\" to true and write down that information in "
+            "\"notes\", quoting figures and names exactly. Otherwise set \"relevant\" "
+            "to false and leave \"notes\" empty.\n\n"
+            "<OUTPUT>\n{\"relevant\": <true or false>, \"notes\": \"<the relevant "
+            "information>\"}"
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": self.question}
+        ]
+        try:
+            return await self.output_policy.complete(
+                self.openai_client,
+                messages,
+                lambda response: self._parse(response, self.extract_validator),
+                max_tokens=self.max_tokens,
+                response_format=self.extract_response_format,
+                accept=self.extract_accept,
+            )
+        except StructuredOutputError as e:
+            self.openai_client.logger.error(
+                f"Skipping chunk {chunk.index + 1}: {str(e)}"
+            )
+            return {"error": str(e)}
+
+    def _parse(self, response: str, validator) -> Dict:
+        result = json.loads(response)
+        validator.validate(result)
+        return result
 
     async def process_response(self, response: str) -> Dict:
         """
@@ -98,8 +355,24 @@ class GroundedAnswerAgent:
             Dict: The validated response or an error.
         """
         try:
-            result = json.loads(response)
-            jsonschema.validate(instance=result, schema=self.schema)
-            return result
+            return self.parse_response(response)
         except (json.JSONDecodeError, jsonschema.ValidationError) as e:
             return {"error": f"Failed to parse or validate response: {str(e)}", "response": response}
+
+    def parse_response(self, response: str) -> Dict:
+        """
+        Parses and validates the API response.
+
+        Args:
+            response (str): The API's response to process.
+
+        Returns:
+            Dict: The validated answer and explanation.
+
+        Raises:
+            json.JSONDecodeError: If the response is not JSON.
+            jsonschema.ValidationError: If the response does not match the schema.
+        """
+        result = json.loads(response)
+        self.validator.validate(result)
+        return result
@@ -12,15 +12,17 @@ class LogCompletePrompt:
         complete_prompt(): Executes the prompt completion and logs the result.
     """
 
-    def __init__(self, complete_prompt_func):
+    def __init__(self, complete_prompt_func, settings_path=None):
         """
         Constructs all the necessary attributes for the LogCompletePrompt object.
 
         Args:
             complete_prompt_func (Callable): The function that completes the prompt.
+            settings_path (str): The settings file that configures the logger.
+                Defaults to config/settings.json.
         """
         self.complete_prompt_func = complete_prompt_func
-        self.logger = Logger()
+        self.logger = Logger(settings_path)
 
     async def complete_prompt(self, *args, **kwargs):
         """
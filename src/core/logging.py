@@ -1,11 +1,135 @@
 import os
+import sys
+import copy
 import json
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
 from datetime import datetime
 
+_settings_cache = {}
+_settings_cache_lock = threading.Lock()
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+class _BatchFileHandler(logging.FileHandler):
+    """
+    A file handler that leaves flushing to its listener, so a batch of records costs one
+    flush.
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """
+    A queue listener that flushes its handlers once per batch of records.
+
+    The listener thread formats and writes every record it dequeues, and
+    flushes when the queue runs empty or `batch_size` records are pending.
+    Handlers with a `flush_batch` method are flushed through it, so they can
+    skip the per-record flush. The trace writer uses it too.
+
+    Attributes:
+        batch_size (int): The number of records written between forced flushes.
+
+    Methods:
+        flush_handlers(): Flushes every handler now.
+    """
+
+    def __init__(self, log_queue, *handlers, batch_size=100):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+        self._pending = 0
+
+    def handle(self, record):
+        super().handle(record)
+        self._pending += 1
+        if self._pending >= self.batch_size or self.queue.empty():
+            self.flush_handlers()
+
+    def flush_handlers(self):
+        for handler in self.handlers:
+            getattr(handler, "flush_batch", handler.flush)()
+        self._pending = 0
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    A queue handler that merges a record's arguments into its message before enqueueing
+    it.
+
+    Like the standard QueueHandler, it formats `msg % args` and any exception
+    when the record is enqueued, so arguments that change later are logged
+    as they were and no traceback frames stay alive in the queue. Records
+    without arguments, such as trace dicts, are enqueued as they are, and
+    the listener thread still applies the file's formatter.
+
+    Methods:
+        prepare(record): Returns the record to enqueue.
+    """
+
+    def prepare(self, record):
+        if not (record.args or record.exc_info or record.stack_info):
+            return record
+        message = self.format(record)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+
+def _backend(log_file_path, level, console, batch_size):
+    """
+    Returns the process-wide queue-backed logger for a log file, starting its listener
+    on first use.
+    """
+    key = os.path.abspath(log_file_path)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            directory = os.path.dirname(log_file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            handlers = [_BatchFileHandler(log_file_path, delay=True)]
+            if console:
+                handlers.append(logging.StreamHandler(sys.stdout))
+            for handler in handlers:
+                handler.setFormatter(formatter)
+
+            log_queue = queue.Queue()
+            listener = BatchQueueListener(log_queue, *handlers, batch_size=batch_size)
+            listener.start()
+            atexit.register(listener.stop)
+
+            logger = logging.getLogger(f"agentm.{key}")
+            logger.propagate = False
+            logger.handlers = [RecordQueueHandler(log_queue)]
+            backend = _backends[key] = (logger, listener)
+        backend[0].setLevel(level)
+        return backend
+
+
 class Logger:
     """
-    A logger class that handles logging messages to a file and the console.
+    A logger class that handles logging messages to a file and, optionally, the console.
+
+    Records are put on a queue and a background listener thread formats and
+    writes them in batches, so logging never blocks the event loop on stdout
+    or disk I/O. Messages use %-style arguments that are only formatted when
+    the level is enabled and the record is written.
 
     Attributes:
         settings (dict): A dictionary containing settings loaded from a JSON file.
@@ -13,13 +137,17 @@ class Logger:
 
     Methods:
         load_settings(settings_path): Loads settings from a specified JSON file.
-        info(message): Logs an informational message.
-        error(message): Logs an error message.
+        debug(message, *args): Logs a debug message.
+        info(message, *args): Logs an informational message.
+        warning(message, *args): Logs a warning message.
+        error(message, *args): Logs an error message.
+        flush(): Waits until every queued record has been written.
     """
 
     def __init__(self, settings_path=None):
         """
-        Constructs the Logger object and initializes the logging configuration.
+        Constructs the Logger object and attaches it to the queue-backed logger for its
+        log file.
 
         Args:
             settings_path (str): The path to the settings JSON file.
@@ -28,42 +156,88 @@ class Logger:
             settings_path = os.path.join(os.path.dirname(__file__), '../../config/settings.json')
         self.settings = self.load_settings(settings_path)
         log_file_path = self.settings.get('log_path', './var/logs/error.log')
-        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
-        logging.basicConfig(filename=log_file_path, level=logging.INFO,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
-        self.logger = logging.getLogger()
+        level = self.settings.get(
+            'log_level', 'DEBUG' if self.settings.get('debug') else 'INFO'
+        )
+        self.logger, self._listener = _backend(
+            log_file_path,
+            logging.getLevelName(level.upper()) if isinstance(level, str) else level,
+            self.settings.get('log_console', False),
+            self.settings.get('log_batch_size', 100),
+        )
 
-    def load_settings(self, settings_path):
+    def load_settings(self, settings_path, reload=False):
         """
         Loads settings from a JSON file.
 
+        Settings are cached per file for the lifetime of the process, so
+        constructing many loggers and clients does not touch the disk again.
+
         Args:
             settings_path (str): The path to the settings JSON file.
+            reload (bool): Whether to bypass the cache and re-read the file.
 
         Returns:
             dict: A dictionary containing the settings.
         """
+        key = os.path.abspath(settings_path)
+        if not reload and key in _settings_cache:
+            return _settings_cache[key]
         if not os.path.exists(settings_path):
             raise FileNotFoundError(f"Settings file not found at {settings_path}")
         with open(settings_path, 'r') as f:
-            return json.load(f)
+            settings = json.load(f)
+        with _settings_cache_lock:
+            _settings_cache[key] = settings
+        return settings
+
+    def debug(self, message, *args):
+        """
+        Logs a debug message.
+
+        Args:
+            message (str): The message to log, with optional %-style placeholders.
+            *args: Values for the placeholders, formatted only if the record is written.
+        """
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args)
 
-    def info(self, message):
+    def info(self, message, *args):
         """
         Logs an informational message.
 
         Args:
-            message (str): The message to log.
+            message (str): The message to log, with optional %-style placeholders.
+            *args: Values for the placeholders, formatted only if the record is written.
+        """
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(message, *args)
+
+    def warning(self, message, *args):
+        """
+        Logs a warning message.
+
+        Args:
+            message (str): The message to log, with optional %-style placeholders.
+            *args: Values for the placeholders, formatted only if the record is written.
         """
-        print(message)
-        self.logger.info(message)
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(message, *args)
 
-    def error(self, message):
+    def error(self, message, *args):
         """
         Logs an error message.
 
         Args:
-            message (str): The message to log.
+            message (str): The message to log, with optional %-style placeholders.
+            *args: Values for the placeholders, formatted only if the record is written.
+        """
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(message, *args)
+
+    def flush(self):
+        """
+        Waits until every queued record has been written and flushed.
         """
-        print(message)
-        self.logger.error(message)
+        self._listener.queue.join()
+        self._listener.flush_handlers()
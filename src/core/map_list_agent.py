@@ -1,12 +1,26 @@
 from pydantic import BaseModel, Field
 import asyncio
-from typing import List
+from typing import List, Optional, AsyncIterator, Iterable, Tuple
 from .openai_api import OpenAIClient
+from .batching import BatchCompleter
+from .concurrency import stream_bounded
+from .compose_prompt import PromptLayout
+from .tracing import traced
 
 class MapListInput(BaseModel):
     list_to_map: List[str] = Field(..., description="The list of items to transform")
     transformation: str = Field(..., description="The transformation rule to apply to each item")
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
+    batch_mode: bool = Field(
+        False, description="Whether to pack several items into each request"
+    )
+    batch_token_budget: int = Field(
+        4000, description="The maximum number of prompt tokens per batched request"
+    )
+    batch_output_tokens: int = Field(
+        100,
+        description="The completion tokens reserved for each item in a batched request",
+    )
 
 class MapListAgent:
     """
@@ -16,26 +30,54 @@ class MapListAgent:
         list_to_map (List[str]): The list of items to transform.
         transformation (str): The transformation rule to apply.
         max_tokens (int): The maximum number of tokens to generate.
+        batch_mode (bool): Whether to pack several items into each request.
+        batch_token_budget (int): The maximum number of prompt tokens per batched
+            request.
+        batch_output_tokens (int): The completion tokens reserved for each item in a
+            batched request.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        layout (PromptLayout): Keeps the rule in the system message shared by every
+            item.
 
     Methods:
         map_list(): Transforms the entire list based on the transformation rule.
+        map_list_batched(): Transforms the list by packing several items into each
+            request.
+        map_list_stream(items, max_concurrency): Transforms items and yields results as
+            they complete.
         apply_transformation(user_prompt): Applies the transformation to a single item.
+        prefix_tokens(encoder): Returns the number of prompt tokens every request of a
+            run shares.
     """
 
-    def __init__(self, data: MapListInput):
+    def __init__(
+        self, data: MapListInput, openai_client: Optional[OpenAIClient] = None
+    ):
         """
         Constructs all the necessary attributes for the MapListAgent object.
 
         Args:
             data (MapListInput): An instance of MapListInput containing 
             the list of items, transformation rule, and max_tokens.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.list_to_map = data.list_to_map
         self.transformation = data.transformation
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.batch_mode = data.batch_mode
+        self.batch_token_budget = data.batch_token_budget
+        self.batch_output_tokens = data.batch_output_tokens
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.layout = PromptLayout(
+            "You are an assistant tasked with transforming list items according to a "
+            "rule. "
+            "The rule is: {{transformation}}",
+            "Transform '{{item}}' as per the rule.",
+            {"transformation": self.transformation},
+        )
 
+    @traced
     async def map_list(self) -> List[str]:
         """
         Transforms the entire list based on the provided items and transformation rule.
@@ -43,28 +85,106 @@ class MapListAgent:
         Returns:
             List[str]: A list of transformed items.
         """
+        if self.batch_mode:
+            return await self.map_list_batched()
+
         tasks = []
         for index, item in enumerate(self.list_to_map):
-            user_prompt = f"Transform '{item}' as per the following rule: {self.transformation}."
-            tasks.append(self.apply_transformation(user_prompt))
+            tasks.append(self.apply_transformation(self._user_prompt(item)))
 
         results = await asyncio.gather(*tasks)
         return results
 
+    @traced
+    async def map_list_batched(self) -> List[str]:
+        """
+        Transforms the list by packing several items into each request.
+
+        Returns:
+            List[str]: A list of transformed items.
+        """
+        batcher = self._batcher()
+        return await batcher.complete(
+            self.list_to_map,
+            fallback=lambda index: self.apply_transformation(
+                self._user_prompt(self.list_to_map[index])
+            ),
+            wrap=lambda index, value: value.strip(),
+        )
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens shared by every request of a list run.
+
+        Providers only serve a prefix from their prompt cache once it reaches
+        MIN_CACHED_PREFIX_TOKENS. In batch mode the shared prefix is the batch
+        system prompt; otherwise it is the prompt layout's prefix.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the model's encoding.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if self.batch_mode:
+            return self._batcher().prefix_tokens(encoder)
+        return self.layout.prefix_tokens(encoder)
+
+    def _batcher(self) -> BatchCompleter:
+        return BatchCompleter(
+            self.openai_client,
+            instructions=(
+                "You are an assistant tasked with transforming list items according to "
+                "a rule. "
+                f"The rule is: {self.transformation}"
+            ),
+            value_description="the transformed item as a string",
+            token_budget=self.batch_token_budget,
+            output_tokens_per_item=min(self.batch_output_tokens, self.max_tokens),
+        )
+
+    def _user_prompt(self, item: str) -> str:
+        return self.layout.user_prompt({"item": item})
+
+    async def map_list_stream(
+        self, items: Optional[Iterable[str]] = None, max_concurrency: int = 10
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Transforms items and yields each result as soon as its request completes.
+
+        At most `max_concurrency` requests are in flight, and new items are only
+        read once the caller has consumed earlier results.
+
+        Args:
+            items (Iterable[str]): The items to transform, which may be a lazy or async
+                iterable. Defaults to the agent's list.
+            max_concurrency (int): The maximum number of requests in flight.
+
+        Yields:
+            Tuple[int, str]: The index of each item and its transformed value, in
+            completion order.
+        """
+        async for index, result in stream_bounded(
+            lambda index, item: self.apply_transformation(self._user_prompt(item)),
+            self.list_to_map if items is None else items,
+            max_concurrency,
+        ):
+            yield index, result
+
+    @traced
     async def apply_transformation(self, user_prompt: str) -> str:
         """
         Applies the transformation to a single item.
 
         Args:
-            user_prompt (str): The prompt describing the transformation rule and item.
+            user_prompt (str): The prompt naming the item, from `_user_prompt`.
 
         Returns:
             str: The transformed item.
         """
-        system_prompt = "You are an assistant tasked with transforming list items according to a rule."
-        response = await self.openai_client.complete_chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
+        response = await self.openai_client.complete_chat(
+            self.layout.messages(user_prompt), max_tokens=self.max_tokens
+        )
 
         return response.strip()
@@ -0,0 +1,341 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+# Latency bucket bounds in seconds: 1 ms to about 2 minutes, each about 19% above
+# the last, so quantiles estimated from the buckets are within a few percent.
+LATENCY_BUCKETS = tuple(0.001 * 2 ** (step / 4) for step in range(68))
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f"{name}{{{pairs}}}"
+
+
+def _escape(value):
+    return (
+        str("" if value is None else value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram that estimates quantiles by interpolating within a bucket.
+
+    Attributes:
+        bounds (Tuple[float, ...]): The upper bound of each bucket; a final bucket
+            catches the rest.
+        counts (List[int]): The number of observations in each bucket.
+        count (int): The number of observations.
+        sum (float): The sum of the observations.
+        min (float): The smallest observation.
+        max (float): The largest observation.
+
+    Methods:
+        observe(value): Records an observation.
+        quantile(q): Estimates a quantile.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        """
+        Constructs an empty Histogram.
+
+        Args:
+            bounds (Tuple[float, ...]): Increasing bucket upper bounds.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        """
+        Records an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile, assuming observations are spread evenly within their
+        bucket.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimate, or 0.0 without observations.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(estimate, self.min), self.max)
+            seen += bucket_count
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms, labelled by agent, model and method.
+
+    All updates take one lock and touch a dict entry, so recording is cheap
+    enough for every completion. `snapshot` returns the current values, with
+    p50/p95/p99 for histograms, and `to_prometheus` renders them in the
+    Prometheus text exposition format. StructuredOutputPolicy also counts
+    agentm_structured_output_retries_total and agentm_structured_output_failures_total
+    here, labelled by agent.
+
+    Methods:
+        shared(): Returns the process-wide registry.
+        inc(name, value, **labels): Adds to a counter.
+        add(name, value, **labels): Adds to a gauge, which may go down.
+        observe(name, value, **labels): Records a histogram observation.
+        record_completion(agent, model, latency, call, error): Records one completion.
+        record_agent_call(agent, method, latency, error): Records one agent entry point
+            call.
+        snapshot(): Returns every metric's current value.
+        to_prometheus(): Renders every metric in the Prometheus text format.
+        reset(): Forgets every metric.
+    """
+
+    def __init__(self):
+        """
+        Constructs an empty MetricsRegistry.
+        """
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the process-wide registry, creating it on first use.
+
+        Returns:
+            MetricsRegistry: The shared registry.
+        """
+        global _shared_registry
+        if _shared_registry is None:
+            with _shared_registry_lock:
+                if _shared_registry is None:
+                    _shared_registry = cls()
+        return _shared_registry
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The metric name.
+            value (float): The amount to add.
+            **labels: The series labels.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """
+        Adds to a gauge. Pass a negative value to decrease it.
+
+        Args:
+            name (str): The metric name.
+            value (float): The amount to add.
+            **labels: The series labels.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Records a histogram observation.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observed value.
+            **labels: The series labels.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def record_completion(self, agent, model, latency, call, error=None):
+        """
+        Records one chat completion.
+
+        Args:
+            agent (str): The agent that made the call, or None.
+            model (str): The model name.
+            latency (float): The call's duration in seconds.
+            call (dict): The call's "prompt_tokens", "completion_tokens", "retries" and
+                "cache_hit".
+            error (str): The exception type name if the call failed.
+        """
+        labels = {"agent": agent or "", "model": model}
+        self.inc("agentm_completions_total", **labels)
+        self.observe("agentm_completion_latency_seconds", latency, **labels)
+        if call["prompt_tokens"]:
+            self.inc("agentm_prompt_tokens_total", call["prompt_tokens"], **labels)
+        if call["completion_tokens"]:
+            self.inc(
+                "agentm_completion_tokens_total", call["completion_tokens"], **labels
+            )
+        if call["retries"]:
+            self.inc("agentm_completion_retries_total", call["retries"], **labels)
+        if call["cache_hit"]:
+            self.inc("agentm_completion_cache_hits_total", **labels)
+        if error is not None:
+            self.inc("agentm_completion_errors_total", error=error, **labels)
+
+    def record_agent_call(self, agent, method, latency, error=None):
+        """
+        Records one call to an agent entry point.
+
+        Args:
+            agent (str): The agent class name.
+            method (str): The method name.
+            latency (float): The call's duration in seconds.
+            error (str): The exception type name if the call failed.
+        """
+        labels = {"agent": agent, "method": method}
+        self.inc("agentm_agent_calls_total", **labels)
+        self.observe("agentm_agent_latency_seconds", latency, **labels)
+        if error is not None:
+            self.inc("agentm_agent_errors_total", error=error, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Returns every metric's current value, keyed by its Prometheus series name.
+
+        Returns:
+            dict: "counters" and "gauges" map series to values; "histograms" map series
+            to their "count", "sum", "p50", "p95", "p99" and "max".
+        """
+        with self._lock:
+            return {
+                "counters": {
+                    _series(*key): value for key, value in self._counters.items()
+                },
+                "gauges": {_series(*key): value for key, value in self._gauges.items()},
+                "histograms": {
+                    _series(*key): {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                        "max": histogram.max,
+                    }
+                    for key, histogram in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (series_name, labels), value in sorted(metrics.items()):
+                        if series_name == name:
+                            lines.append(f"{_series(name, labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), histogram in sorted(
+                    self._histograms.items(), key=lambda item: item[0]
+                ):
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                        cumulative += bucket_count
+                        le = (("le", f"{bound:.6g}"),)
+                        lines.append(
+                            f"{_series(name + '_bucket', labels + le)} {cumulative}"
+                        )
+                    lines.append(
+                        f"{_series(name + '_bucket', labels + (('le', '+Inf'),))} "
+                        f"{histogram.count}"
+                    )
+                    lines.append(f"{_series(name + '_sum', labels)} {histogram.sum}")
+                    lines.append(
+                        f"{_series(name + '_count', labels)} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """
+        Forgets every metric.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def start_prometheus_server(
+    registry: MetricsRegistry, port: int = 9464, host: str = "127.0.0.1"
+):
+    """
+    Serves a registry's metrics in the Prometheus text format from a background thread.
+
+    Args:
+        registry (MetricsRegistry): The registry to expose.
+        port (int): The port to listen on, or 0 for any free port.
+        host (str): The interface to listen on.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Call `shutdown()` to stop it.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
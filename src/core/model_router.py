@@ -0,0 +1,300 @@
+import json
+import time
+import jsonschema
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from .openai_api import track_usage
+
+Accept = Callable[[Optional[str]], bool]
+
+
+def json_acceptor(schema: Optional[Dict] = None, confidence_key: Optional[str] = None,
+                  min_confidence: float = 0.0) -> Accept:
+    """
+    Builds an acceptance check for JSON responses.
+
+    Args:
+        schema (dict): JSON schema the response must satisfy, or None to only require
+            valid JSON.
+        confidence_key (str): A numeric field holding the model's confidence, or None.
+        min_confidence (float): The lowest confidence accepted when confidence_key is
+            set.
+
+    Returns:
+        Callable: Returns True when a response parses, validates and is confident
+        enough.
+    """
+    validator = jsonschema.Draft7Validator(schema) if schema is not None else None
+
+    def accept(response: Optional[str]) -> bool:
+        try:
+            value = json.loads(response)
+        except (TypeError, json.JSONDecodeError):
+            return False
+        if validator is not None and not validator.is_valid(value):
+            return False
+        if confidence_key is not None:
+            confidence = value.get(confidence_key) if isinstance(value, dict) else None
+            if not isinstance(confidence, (int, float)) or confidence < min_confidence:
+                return False
+        return True
+
+    return accept
+
+
+class ModelRoute:
+    """
+    A model the router can send a request to, with its token prices.
+
+    Attributes:
+        model (str): The model name.
+        prompt_price (float): USD per million prompt tokens.
+        completion_price (float): USD per million completion tokens.
+        requests (int): Requests sent to this route.
+        accepted (int): Responses from this route that were returned to the caller.
+        escalated (int): Responses rejected, or calls that failed, and passed to the
+            next route.
+        errors (int): Calls that raised an error.
+        latency (float): Total seconds spent waiting on this route.
+        prompt_tokens (int): Prompt tokens billed on this route.
+        completion_tokens (int): Completion tokens billed on this route.
+
+    Methods:
+        cost(): Returns the USD spent on this route.
+        stats(): Returns the route's counters.
+    """
+
+    def __init__(
+        self, model: str, prompt_price: float = 0.0, completion_price: float = 0.0
+    ):
+        """
+        Constructs the ModelRoute object.
+
+        Args:
+            model (str): The model name.
+            prompt_price (float): USD per million prompt tokens.
+            completion_price (float): USD per million completion tokens.
+        """
+        self.model = model
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self.requests = 0
+        self.accepted = 0
+        self.escalated = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def cost(self) -> float:
+        """
+        Returns the USD spent on this route.
+
+        Returns:
+            float: The cost of the billed prompt and completion tokens.
+        """
+        return (
+            self.prompt_tokens * self.prompt_price
+            + self.completion_tokens * self.completion_price
+        ) / 1_000_000
+
+    def stats(self) -> Dict:
+        """
+        Returns the route's counters.
+
+        Returns:
+            dict: requests, accepted, escalated, errors, mean_latency, prompt_tokens,
+            completion_tokens and cost.
+        """
+        return {
+            "requests": self.requests,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "errors": self.errors,
+            "mean_latency": self.latency / self.requests if self.requests else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": self.cost(),
+        }
+
+
+class ModelRouter:
+    """
+    Sends each request to a cheap model first and escalates to larger models only when
+    needed.
+
+    Routes are tried in order. A response is returned as soon as it passes
+    the acceptance check; otherwise, or if the call fails, the next route is
+    tried. The last route's response is returned whatever it contains, and
+    its errors are raised. The router has the same `complete_chat` signature
+    as OpenAIClient, so it can be handed to any agent as its `openai_client`;
+    a `model` named by the caller is ignored, since the routes decide it.
+
+    Agents that return JSON pass `json_acceptor(schema)` with each request
+    (through StructuredOutputPolicy), so a response that would fail their
+    schema is escalated instead of returned.
+
+    Attributes:
+        openai_client (OpenAIClient): The client used to call the API.
+        routes (List[ModelRoute]): The models to try, cheapest first.
+        accept (Callable): Decides whether a response is good enough to return.
+        logger (Logger): The client's logger.
+
+    Methods:
+        from_settings(openai_client, accept): Builds a router from the "model_routes"
+        setting. complete_chat(messages, model, max_tokens, temperature,
+        response_format, accept): Completes a chat, escalating as needed.
+        stream_chat(messages, model, max_tokens, temperature, response_format): Streams
+            a chat from the first route.
+        stats(): Returns the counters of every route.
+    """
+
+    def __init__(
+        self,
+        openai_client,
+        routes: Sequence[Union[str, ModelRoute]],
+        accept: Optional[Accept] = None,
+    ):
+        """
+        Constructs the ModelRouter object.
+
+        Args:
+            openai_client (OpenAIClient): The client used to call the API.
+            routes (Sequence[str | ModelRoute]): The models to try, cheapest first.
+            accept (Callable): Decides whether a response is good enough to return.
+                Defaults to accepting any non-empty response.
+        """
+        if not routes:
+            raise ValueError("ModelRouter needs at least one route.")
+        self.openai_client = openai_client
+        self.routes: List[ModelRoute] = [
+            route if isinstance(route, ModelRoute) else ModelRoute(route)
+            for route in routes
+        ]
+        self.accept = accept or (lambda response: bool(response))
+        self.logger = openai_client.logger
+
+    @classmethod
+    def from_settings(cls, openai_client, accept: Optional[Accept] = None):
+        """
+        Builds a router from the "model_routes" setting: a list of objects with a
+        "model" and optional "prompt_price" and "completion_price" (USD per million
+        tokens).
+
+        Args:
+            openai_client (OpenAIClient): The client used to call the API.
+            accept (Callable): Decides whether a response is good enough to return.
+
+        Returns:
+            ModelRouter: The configured router.
+        """
+        routes = [
+            ModelRoute(
+                route["model"],
+                route.get("prompt_price", 0.0),
+                route.get("completion_price", 0.0),
+            )
+            for route in openai_client.settings.get(
+                "model_routes", [{"model": "gpt-4o-mini"}]
+            )
+        ]
+        return cls(openai_client, routes, accept)
+
+    async def complete_chat(
+        self,
+        messages,
+        model=None,
+        max_tokens=1500,
+        temperature=None,
+        response_format=None,
+        accept: Optional[Accept] = None,
+    ) -> Optional[str]:
+        """
+        Completes a chat on the first route whose response is accepted.
+
+        Args:
+            messages (list): A list of message dicts for the chat completion.
+            model (str): Ignored; the routes decide the model. Accepted so that callers
+                which name one, such as BatchCompleter, work unchanged.
+            max_tokens (int): The maximum number of tokens to generate.
+            temperature (float): The sampling temperature, or None for the API default.
+            response_format (dict): Constrains the output, passed to every route.
+            accept (Callable): Overrides the router's acceptance check for this request.
+
+        Returns:
+            str: The accepted response, or the last route's response.
+
+        Raises:
+            Exception: The error raised by the last route.
+        """
+        accept = accept or self.accept
+        params = {} if response_format is None else {"response_format": response_format}
+        last = len(self.routes) - 1
+        for index, route in enumerate(self.routes):
+            route.requests += 1
+            started = time.perf_counter()
+            try:
+                with track_usage() as usage:
+                    response = await self.openai_client.complete_chat(
+                        messages,
+                        model=route.model,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **params,
+                    )
+            except Exception as e:
+                route.errors += 1
+                if index == last:
+                    raise
+                route.escalated += 1
+                self.logger.info(f"Escalating from {route.model} after error: {str(e)}")
+                continue
+            finally:
+                route.latency += time.perf_counter() - started
+                route.prompt_tokens += usage["prompt_tokens"]
+                route.completion_tokens += usage["completion_tokens"]
+
+            if index == last or accept(response):
+                route.accepted += 1
+                return response
+            route.escalated += 1
+            self.logger.info(f"Escalating from {route.model} after rejected response.")
+
+    async def stream_chat(
+        self,
+        messages,
+        model=None,
+        max_tokens=1500,
+        temperature=None,
+        response_format=None,
+    ):
+        """
+        Streams a chat completion from the first route. Streamed responses are not
+        escalated.
+
+        Args:
+            messages (list): A list of message dicts for the chat completion.
+            model (str): Ignored; the first route decides the model.
+            max_tokens (int): The maximum number of tokens to generate.
+            temperature (float): The sampling temperature, or None for the API default.
+            response_format (dict): Constrains the output.
+
+        Yields:
+            str: Content deltas in the order they are generated.
+        """
+        route = self.routes[0]
+        route.requests += 1
+        route.accepted += 1
+        async for delta in self.openai_client.stream_chat(
+            messages, model=route.model, max_tokens=max_tokens, temperature=temperature,
+            response_format=response_format
+        ):
+            yield delta
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Returns the counters of every route.
+
+        Returns:
+            Dict[str, dict]: Each route's stats keyed by model name.
+        """
+        return {route.model: route.stats() for route in self.routes}
@@ -1,34 +1,256 @@
-from openai import OpenAI, BadRequestError
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+import weakref
+import httpx
+from openai import AsyncOpenAI, BadRequestError, DefaultAsyncHttpxClient
 from .logging import Logger  # Use the logger abstraction
+from .concurrency import RateLimitScheduler, SingleFlight
+from .retry import RetryPolicy
+from .response_cache import ResponseCache
+from . import tracing
+from .tracing import TraceSink
+from .metrics import MetricsRegistry
+from .backends import MockBackend, OpenAIBackend
 import os
 
+DEFAULT_SETTINGS_PATH = os.path.join(
+    os.path.dirname(__file__), '../../config/settings.json'
+)
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+_usage = contextvars.ContextVar("openai_usage", default=None)
+
+
+@contextlib.contextmanager
+def track_usage():
+    """
+    Collects the token usage of the API calls made by the current task inside the block.
+
+    Responses answered from the cache, or shared with an identical in-flight
+    request started elsewhere, cost nothing and are not counted.
+
+    Yields:
+        dict: "requests", "prompt_tokens" and "completion_tokens", updated as calls
+        complete.
+    """
+    usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _record_usage(usage):
+    totals = _usage.get()
+    if totals is not None and usage is not None:
+        totals["requests"] += 1
+        totals["prompt_tokens"] += usage.prompt_tokens or 0
+        totals["completion_tokens"] += usage.completion_tokens or 0
+
+
 class OpenAIClient:
     """
     A client for interacting with the OpenAI API.
 
+    Requests are sent through the asynchronous SDK client, so awaiting
+    `complete_chat` yields to the event loop while the HTTP request is in
+    flight and concurrent calls (e.g. from `asyncio.gather`) really overlap.
+
+    An HTTP connection pool is tied to the event loop it was first used on,
+    so one SDK client (and pool) is kept per running loop. Use
+    `OpenAIClient.shared()` to reuse a single client, and therefore its warm
+    connections, across every agent in the process.
+
+    Every completion is admitted through a RateLimitScheduler, which keeps
+    the request and token rates within the configured quotas, and transient
+    failures (429, timeouts, 5xx) are retried according to a RetryPolicy.
+    When a ResponseCache is configured, identical requests are answered from
+    it without calling the API, and identical requests that are in flight at
+    the same time share a single API call.
+
+    Requests are sent through a ChatBackend, which is the OpenAI API unless
+    another backend is given, such as a MockBackend for offline load tests.
+
     Attributes:
         logger (Logger): An instance of Logger for logging API interactions and errors.
-        client (OpenAI): An instance of the OpenAI API client.
+        settings (dict): The settings loaded from the settings file.
+        api_key (str): The OpenAI API key.
+        base_url (str): An optional OpenAI-compatible endpoint.
+        limits (httpx.Limits): Connection pool size and keep-alive configuration.
+        scheduler (RateLimitScheduler): Admits requests within the rate limits.
+        retry_policy (RetryPolicy): Retries transient API failures.
+        cache (ResponseCache): Caches completions by request content, or None.
+        single_flight (SingleFlight): Coalesces identical concurrent requests, or None.
+        tracer (TraceSink): Receives one record per completion, or None.
+        metrics (MetricsRegistry): Records completion counts, latencies and tokens, or
+            None.
+        backend (ChatBackend): Runs the chat completion requests.
+        structured_outputs (bool): Whether `response_format` is forwarded to the API.
 
     Methods:
-        complete_chat(messages, model, max_tokens): Sends a chat completion request to the OpenAI API.
+        shared(settings_path): Returns the process-wide client for a settings file.
+        clear_shared(): Forgets all process-wide clients.
+        client: The asynchronous SDK client bound to the running event loop.
+        complete_chat(messages, model, max_tokens, temperature, response_format): Sends
+            a chat completion request to the OpenAI API.
+        stream_chat(messages, model, max_tokens, temperature, response_format): Streams
+            a chat completion as content deltas.
     """
 
-    def __init__(self, settings_path=None):
+    def __init__(
+        self,
+        settings_path=None,
+        max_connections=None,
+        max_keepalive_connections=None,
+        keepalive_expiry=None,
+        scheduler=None,
+        retry_policy=None,
+        cache=None,
+        coalesce_requests=None,
+        tracer=None,
+        metrics=None,
+        backend=None,
+    ):
         """
         Constructs the OpenAIClient object and initializes the API client.
 
         Args:
             settings_path (str): The path to the settings JSON file containing the API key.
+                An optional "openai_base_url" setting points the client at a
+                compatible endpoint (e.g. a local mock server).
+            max_connections (int): Maximum number of open connections. Defaults to
+                the "max_connections" setting, or 100.
+            max_keepalive_connections (int): Maximum number of idle connections kept
+                alive. Defaults to the "max_keepalive_connections" setting, or 20.
+            keepalive_expiry (float): Seconds an idle connection is kept alive.
+                Defaults to the "keepalive_expiry" setting, or 30.
+            scheduler (RateLimitScheduler): The scheduler requests are admitted through.
+                Defaults to one built from the "requests_per_minute",
+                "tokens_per_minute" and "max_concurrent_requests" settings.
+            retry_policy (RetryPolicy): The policy used to retry transient failures.
+                Defaults to one built from the "retry_*" and "request_deadline"
+                settings.
+            cache (ResponseCache): The completion cache. Defaults to one built from the
+                "cache_*" settings, which is disabled unless "cache_enabled" is true.
+            coalesce_requests (bool): Whether identical concurrent requests share one
+                API call. Defaults to the "coalesce_requests" setting, or True.
+            tracer (TraceSink): Receives one record per completion. Defaults to one
+                built from the "trace_*" settings, which is disabled unless "trace_path"
+                is set.
+            metrics (MetricsRegistry): Where completions are recorded. Defaults to the
+                process-wide registry, or None when the "metrics_enabled" setting is
+                false.
+            backend (ChatBackend): Runs the requests. Defaults to a MockBackend when the
+                "mock_backend" setting is present, and to the OpenAI API otherwise.
         """
         if settings_path is None:
-            settings_path = os.path.join(os.path.dirname(__file__), '../../config/settings.json')
+            settings_path = DEFAULT_SETTINGS_PATH
 
         self.logger = Logger(settings_path)
-        settings = self.logger.load_settings(settings_path)
-        self.client = OpenAI(api_key=settings["openai_api_key"])
+        self.settings = self.logger.settings
+        self.api_key = self.settings.get("openai_api_key")
+        self.base_url = self.settings.get("openai_base_url")
+        self.limits = httpx.Limits(
+            max_connections=(
+                max_connections if max_connections is not None
+                else self.settings.get("max_connections", 100)
+            ),
+            max_keepalive_connections=(
+                max_keepalive_connections if max_keepalive_connections is not None
+                else self.settings.get("max_keepalive_connections", 20)
+            ),
+            keepalive_expiry=(
+                keepalive_expiry if keepalive_expiry is not None
+                else self.settings.get("keepalive_expiry", 30.0)
+            ),
+        )
+        self.scheduler = scheduler or RateLimitScheduler.from_settings(self.settings)
+        self.retry_policy = retry_policy or RetryPolicy.from_settings(self.settings)
+        self.cache = (
+            cache if cache is not None else ResponseCache.from_settings(self.settings)
+        )
+        if coalesce_requests is None:
+            coalesce_requests = self.settings.get("coalesce_requests", True)
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        self.structured_outputs = self.settings.get("structured_outputs", True)
+        self.tracer = (
+            tracer if tracer is not None else TraceSink.from_settings(self.settings)
+        )
+        if metrics is None and self.settings.get("metrics_enabled", True):
+            metrics = MetricsRegistry.shared()
+        self.metrics = metrics
+        self.backend = (
+            backend or MockBackend.from_settings(self.settings) or OpenAIBackend(self)
+        )
+        self._clients = weakref.WeakKeyDictionary()
 
-    async def complete_chat(self, messages, model="gpt-4o-mini", max_tokens=1500):
+    @classmethod
+    def shared(cls, settings_path=None):
+        """
+        Returns the process-wide client for a settings file, creating it on first use.
+
+        Args:
+            settings_path (str): The path to the settings JSON file.
+
+        Returns:
+            OpenAIClient: The shared client.
+        """
+        key = os.path.abspath(settings_path or DEFAULT_SETTINGS_PATH)
+        client = _shared_clients.get(key)
+        if client is None:
+            with _shared_clients_lock:
+                client = _shared_clients.get(key)
+                if client is None:
+                    client = _shared_clients[key] = cls(key)
+        return client
+
+    @staticmethod
+    def clear_shared():
+        """
+        Forgets all process-wide clients so the next `shared()` call rebuilds them.
+        """
+        with _shared_clients_lock:
+            _shared_clients.clear()
+
+    @property
+    def client(self):
+        """
+        The asynchronous SDK client bound to the running event loop.
+
+        Returns:
+            AsyncOpenAI: The SDK client, reusing its connection pool across calls.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._create_client()
+
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._create_client()
+        return client
+
+    def _create_client(self):
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=self.limits),
+        )
+
+    async def complete_chat(
+        self,
+        messages,
+        model="gpt-4o-mini",
+        max_tokens=1500,
+        temperature=None,
+        response_format=None,
+    ):
         """
         Sends a chat completion request to the OpenAI API.
 
@@ -36,20 +258,293 @@ class OpenAIClient:
             messages (list): A list of message dicts for the chat completion.
             model (str): The model name to use for the completion.
             max_tokens (int): The maximum number of tokens to generate.
+            temperature (float): The sampling temperature, or None for the API default.
+            response_format (dict): Constrains the output, e.g. {"type": "json_schema",
+                ...}. Dropped when the "structured_outputs" setting is false.
 
         Returns:
             str: The generated content from the chat completion.
-        
+
         Raises:
             BadRequestError: If there is an issue with the request to the OpenAI API.
+            APIError: If a transient failure persists after the retry policy gives up.
         """
+        if not self.structured_outputs:
+            response_format = None
+        params = {} if response_format is None else {"response_format": response_format}
+        key = ResponseCache.make_key(model, messages, max_tokens, temperature, **params)
+        traced = self.tracer is not None and self.tracer.sample()
+        if not traced and self.metrics is None:
+            return await self._complete_keyed(
+                key, messages, model, max_tokens, temperature, response_format
+            )
+
+        call, token = tracing.start_call()
+        agent = tracing.current_agent()
+        if self.metrics is not None:
+            self.metrics.add("agentm_completions_in_flight", 1, model=model)
+        started = time.perf_counter()
+        error = None
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens
+            return await self._complete_keyed(
+                key, messages, model, max_tokens, temperature, response_format
+            )
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            tracing.end_call(token)
+            self._finish_call(key, agent, model, started, call, error, traced)
+
+    def _finish_call(self, key, agent, model, started, call, error, traced):
+        latency = time.perf_counter() - started
+        if self.metrics is not None:
+            self.metrics.add("agentm_completions_in_flight", -1, model=model)
+            self.metrics.record_completion(agent, model, latency, call, error)
+        if traced:
+            record = {
+                "ts": round(time.time(), 3),
+                "agent": agent,
+                "model": model,
+                "prompt_hash": key[:16],
+                "prompt_tokens": call["prompt_tokens"],
+                "completion_tokens": call["completion_tokens"],
+                "latency_ms": round(latency * 1000, 1),
+                "retries": call["retries"],
+                "cache_hit": call["cache_hit"],
+                "coalesced": not call["cache_hit"]
+                and not call["requests"]
+                and error is None,
+            }
+            if error is not None:
+                record["error"] = error
+            self.tracer.record(record)
+
+    async def _complete_keyed(
+        self, key, messages, model, max_tokens, temperature, response_format
+    ):
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                tracing.note_cache_hit()
+                return cached
+
+        if self.single_flight is None:
+            return await self._complete_uncached(
+                key, messages, model, max_tokens, temperature, response_format
+            )
+        return await self.single_flight.call_function(
+            key,
+            self._complete_uncached,
+            key,
+            messages,
+            model,
+            max_tokens,
+            temperature,
+            response_format,
+        )
+
+    async def _complete_uncached(
+        self, key, messages, model, max_tokens, temperature, response_format=None
+    ):
+        try:
+            content = await self.retry_policy.call(
+                self._send_chat,
+                messages,
+                model,
+                max_tokens,
+                temperature,
+                response_format,
+                on_retry=self._log_retry,
             )
-            return response.choices[0].message.content
         except BadRequestError as e:
             self.logger.error(f"Error with OpenAI API: {str(e)}")
             raise
+
+        if self.cache is not None and content is not None:
+            await self.cache.aset(key, content)
+        return content
+
+    async def stream_chat(
+        self,
+        messages,
+        model="gpt-4o-mini",
+        max_tokens=1500,
+        temperature=None,
+        response_format=None,
+    ):
+        """
+        Streams a chat completion from the OpenAI API as it is generated.
+
+        Streams go through the same cache, coalescing, metrics and tracing as
+        `complete_chat`. The request is admitted by the scheduler and retried
+        like `complete_chat` until the stream opens; the concurrency slot is
+        held until the stream ends. A cached response, or one shared with an
+        identical stream already in flight, is yielded as a single delta, and
+        the full streamed content is cached once the stream completes.
+
+        Args:
+            messages (list): A list of message dicts for the chat completion.
+            model (str): The model name to use for the completion.
+            max_tokens (int): The maximum number of tokens to generate.
+            temperature (float): The sampling temperature, or None for the API default.
+            response_format (dict): Constrains the output, e.g. {"type": "json_object"}.
+                Dropped when the "structured_outputs" setting is false.
+
+        Yields:
+            str: Content deltas in the order they are generated.
+
+        Raises:
+            BadRequestError: If there is an issue with the request to the OpenAI API.
+        """
+        if not self.structured_outputs:
+            response_format = None
+        params = {} if response_format is None else {"response_format": response_format}
+        key = ResponseCache.make_key(model, messages, max_tokens, temperature, **params)
+        traced = self.tracer is not None and self.tracer.sample()
+        if not traced and self.metrics is None:
+            async for delta in self._stream_keyed(
+                key,
+                messages,
+                model,
+                max_tokens,
+                temperature,
+                response_format,
+                tracing.new_call(),
+            ):
+                yield delta
+            return
+
+        # The call details are kept locally rather than in the tracing context,
+        # which would leak into the consumer's code between deltas.
+        call = tracing.new_call()
+        agent = tracing.current_agent()
+        if self.metrics is not None:
+            self.metrics.add("agentm_completions_in_flight", 1, model=model)
+        started = time.perf_counter()
+        error = None
+        try:
+            async for delta in self._stream_keyed(
+                key, messages, model, max_tokens, temperature, response_format, call
+            ):
+                yield delta
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._finish_call(key, agent, model, started, call, error, traced)
+
+    async def _stream_keyed(
+        self, key, messages, model, max_tokens, temperature, response_format, call
+    ):
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                call["cache_hit"] = True
+                yield cached
+                return
+
+        if self.single_flight is None:
+            async for delta in self._stream_uncached(
+                key, messages, model, max_tokens, temperature, response_format, call
+            ):
+                yield delta
+            return
+
+        flight = ("stream", key)
+        shared = self.single_flight.join(flight)
+        if shared is not None:
+            content = await shared
+            if content is not None:
+                yield content
+                return
+            # The stream we joined ended early, so run our own.
+            async for delta in self._stream_uncached(
+                key, messages, model, max_tokens, temperature, response_format, call
+            ):
+                yield delta
+            return
+
+        with self.single_flight.lead(flight) as result:
+            parts = []
+            async for delta in self._stream_uncached(
+                key, messages, model, max_tokens, temperature, response_format, call
+            ):
+                parts.append(delta)
+                yield delta
+            result.set_result("".join(parts))
+
+    async def _stream_uncached(
+        self, key, messages, model, max_tokens, temperature, response_format, call
+    ):
+        params = {"stream": True, "stream_options": {"include_usage": True}}
+        if temperature is not None:
+            params["temperature"] = temperature
+        if response_format is not None:
+            params["response_format"] = response_format
+
+        def on_retry(attempt, error, delay):
+            call["retries"] += 1
+            self._log_retry(attempt, error, delay)
+
+        parts = []
+        tokens = self.scheduler.estimate_tokens(messages, max_tokens, model)
+        async with self.scheduler.reserve(tokens) as reservation:
+            try:
+                stream = await self.retry_policy.call(
+                    self.backend.create,
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    on_retry=on_retry,
+                    **params
+                )
+            except BadRequestError as e:
+                self.logger.error(f"Error with OpenAI API: {str(e)}")
+                raise
+
+            call["requests"] += 1
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    reservation.used_tokens = chunk.usage.total_tokens
+                    _record_usage(chunk.usage)
+                    call["prompt_tokens"] += chunk.usage.prompt_tokens or 0
+                    call["completion_tokens"] += chunk.usage.completion_tokens or 0
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+
+        if self.cache is not None:
+            await self.cache.aset(key, "".join(parts))
+
+    async def _send_chat(
+        self, messages, model, max_tokens, temperature, response_format=None
+    ):
+        params = {}
+        if temperature is not None:
+            params["temperature"] = temperature
+        if response_format is not None:
+            params["response_format"] = response_format
+
+        tokens = self.scheduler.estimate_tokens(messages, max_tokens, model)
+        async with self.scheduler.reserve(tokens) as reservation:
+            response = await self.backend.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                **params
+            )
+            if response.usage is not None:
+                reservation.used_tokens = response.usage.total_tokens
+            _record_usage(response.usage)
+            tracing.note_usage(response.usage)
+        return response.choices[0].message.content
+
+    def _log_retry(self, attempt, error, delay):
+        tracing.note_retry()
+        self.logger.info(
+            "Retrying OpenAI request in %.2fs after attempt %d failed: %s",
+            delay,
+            attempt,
+            error,
+        )
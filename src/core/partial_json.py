@@ -0,0 +1,276 @@
+import json
+
+_MISSING = object()
+
+
+def _closers(stack) -> str:
+    return "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def _loads_scalar(fragment: str, in_string: bool = False, escape: bool = False):
+    if in_string:
+        fragment = (fragment[:-1] if escape else fragment) + '"'
+    if not fragment.strip():
+        return _MISSING
+    try:
+        return json.loads(fragment)
+    except json.JSONDecodeError:
+        return _MISSING
+
+
+class _Frame:
+    """
+    An object or array that is still open, with the children parsed so far.
+    """
+
+    __slots__ = (
+        "kind",
+        "values",
+        "child_start",
+        "value_start",
+        "key",
+        "child",
+        "child_end",
+        "needs_child",
+    )
+
+    def __init__(self, kind, start):
+        self.kind = kind
+        self.values = {} if kind == "{" else []
+        self.needs_child = False
+        self._next_child(start)
+
+    def _next_child(self, start):
+        self.child_start = start
+        self.value_start = start if self.kind == "[" else None
+        self.key = _MISSING
+        self.child = _MISSING
+        self.child_end = None
+
+    def finish_child(self, text, end) -> bool:
+        """
+        Adds the child that ends at `end` and prepares for the next one. Returns False
+        if it is invalid.
+        """
+        if self.value_start is None:
+            return False
+        if self.child is not _MISSING:
+            if text[self.child_end:end].strip():
+                return False
+            value = self.child
+        else:
+            value = _loads_scalar(text[self.value_start:end])
+            if value is _MISSING:
+                return False
+        if self.kind == "{":
+            self.values[self.key] = value
+        else:
+            self.values.append(value)
+        self._next_child(end + 1)
+        return True
+
+    def snapshot(self, text, inner, in_string, escape):
+        """
+        Returns a copy of the values with the child in progress added, if it can be
+        completed.
+        """
+        value = inner
+        if value is _MISSING and self.value_start is not None:
+            value = self.child
+            if value is _MISSING:
+                value = _loads_scalar(text[self.value_start:], in_string, escape)
+        if self.kind == "{":
+            values = dict(self.values)
+            if value is not _MISSING and self.key is not _MISSING:
+                values[self.key] = value
+        else:
+            values = list(self.values)
+            if value is not _MISSING:
+                values.append(value)
+        return values
+
+
+class PartialJSONParser:
+    """
+    Parses a JSON document incrementally while it is being streamed.
+
+    Each `feed` scans only the text added since the previous one. Every
+    object and array that is still open keeps the children it has finished,
+    each parsed once, so a snapshot only copies the open containers and
+    parses the value in progress: the cost per delta grows with the width of
+    the open containers rather than with the length of the document.
+    Snapshots share finished children with each other; copy a value before
+    mutating it. Documents that turn out not to be valid JSON fall back to
+    repairing and parsing the whole text on each delta.
+
+    Unterminated strings are closed, open objects and arrays are closed, and
+    trailing fragments that cannot be completed (a key without a value, a
+    half-written literal) are dropped.
+
+    Attributes:
+        text (str): The JSON text received so far, from its first `{` or `[`.
+        value (Any): The value parsed from the text so far, or None.
+        complete (bool): Whether the top-level value has been closed.
+
+    Methods:
+        feed(delta): Adds streamed text and returns the value parsed so far.
+    """
+
+    def __init__(self):
+        """
+        Constructs an empty PartialJSONParser.
+        """
+        self.text = ""
+        self.value = None
+        self.complete = False
+        self._prelude = ""
+        self._scanned = 0
+        self._stack = []
+        self._frames = []
+        self._safe_points = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, delta: str):
+        """
+        Adds streamed text and returns the value parsed so far.
+
+        Args:
+            delta (str): The next piece of the document. Anything before the first
+                `{` or `[` (such as a code fence) is ignored.
+
+        Returns:
+            Any: The parsed value, or None if nothing can be parsed yet. Text fed after
+            the top-level value closes is ignored.
+        """
+        if self.complete:
+            return self.value
+        if self._prelude is not None:
+            self._prelude += delta
+            starts = [
+                i for i in (self._prelude.find("{"), self._prelude.find("[")) if i != -1
+            ]
+            if not starts:
+                try:
+                    self.value = json.loads(self._prelude)
+                except json.JSONDecodeError:
+                    self.value = None
+                return self.value
+            self.text = self._prelude[min(starts):]
+            self._prelude = None
+        else:
+            self.text += delta
+        self.value = self._scan()
+        return self.value
+
+    def _scan(self):
+        text = self.text
+        stack = self._stack
+        frames = self._frames
+        safe_points = self._safe_points
+        in_string = self._in_string
+        escape = self._escape
+        for i in range(self._scanned, len(text)):
+            char = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == "\\":
+                    escape = True
+                elif char == '"':
+                    in_string = False
+                continue
+
+            if char == '"':
+                in_string = True
+            elif char in "{[":
+                if frames:
+                    parent = frames[-1]
+                    if (parent.value_start is None or parent.child is not _MISSING
+                            or text[parent.value_start:i].strip()):
+                        frames = self._frames = None
+                if frames is not None:
+                    frames.append(_Frame(char, i + 1))
+                stack.append(char)
+                safe_points.append((i + 1, tuple(stack)))
+            elif char in "}]":
+                if frames is not None and frames:
+                    frame = frames[-1]
+                    if (char == "}") != (frame.kind == "{"):
+                        frames = self._frames = None
+                    elif text[frame.child_start:i].strip() or frame.needs_child:
+                        if not frame.finish_child(text, i):
+                            frames = self._frames = None
+                if stack:
+                    stack.pop()
+                if not stack:
+                    self.complete = True
+                    self.text = text[:i + 1]
+                    if frames:
+                        return frames.pop().values
+                    try:
+                        return json.loads(self.text)
+                    except json.JSONDecodeError:
+                        return None
+                if frames:
+                    value = frames.pop().values
+                    frames[-1].child = value
+                    frames[-1].child_end = i + 1
+                safe_points.append((i + 1, tuple(stack)))
+            elif char == ",":
+                if frames:
+                    if not frames[-1].finish_child(text, i):
+                        frames = self._frames = None
+                    else:
+                        frames[-1].needs_child = True
+                safe_points.append((i, tuple(stack)))
+            elif char == ":" and frames:
+                frame = frames[-1]
+                key = _MISSING
+                if frame.kind == "{" and frame.value_start is None:
+                    key = _loads_scalar(text[frame.child_start:i])
+                if not isinstance(key, str):
+                    frames = self._frames = None
+                else:
+                    frame.key = key
+                    frame.value_start = i + 1
+        self._scanned = len(text)
+        self._in_string = in_string
+        self._escape = escape
+
+        if frames is not None:
+            value = _MISSING
+            for frame in reversed(frames):
+                value = frame.snapshot(text, value, in_string, escape)
+            return value
+
+        tail = text
+        if in_string:
+            tail = (text[:-1] if escape else text) + '"'
+        try:
+            return json.loads(tail + _closers(stack))
+        except json.JSONDecodeError:
+            pass
+        for cut, snapshot in reversed(safe_points):
+            try:
+                return json.loads(text[:cut] + _closers(snapshot))
+            except json.JSONDecodeError:
+                continue
+        return None
+
+
+def parse_partial_json(text: str):
+    """
+    Parses the longest valid prefix of a JSON document that is still being streamed.
+
+    To parse a stream delta by delta, feed a PartialJSONParser instead of
+    calling this on the growing text, which rescans it every time.
+
+    Args:
+        text (str): The JSON text received so far. Anything before the first
+            `{` or `[` (such as a code fence) is ignored.
+
+    Returns:
+        Any: The parsed value, or None if nothing can be parsed yet.
+    """
+    return PartialJSONParser().feed(text)
@@ -1,12 +1,26 @@
 import asyncio  # <-- Import asyncio here
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Dict, Optional, AsyncIterator, Iterable, Tuple
 from .openai_api import OpenAIClient
+from .batching import BatchCompleter
+from .concurrency import stream_bounded
+from .compose_prompt import PromptLayout
+from .tracing import traced
 
 class ProjectListInput(BaseModel):
     list_to_project: List[str] = Field(..., description="The list of items to project")
     projection_rule: str = Field(..., description="The rule to apply for projection")
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
+    batch_mode: bool = Field(
+        False, description="Whether to pack several items into each request"
+    )
+    batch_token_budget: int = Field(
+        4000, description="The maximum number of prompt tokens per batched request"
+    )
+    batch_output_tokens: int = Field(
+        100,
+        description="The completion tokens reserved for each item in a batched request",
+    )
 
 class ProjectListAgent:
     """
@@ -16,26 +30,54 @@ class ProjectListAgent:
         list_to_project (List[str]): The list of items to project.
         projection_rule (str): The rule to apply for projection.
         max_tokens (int): The maximum number of tokens to generate.
+        batch_mode (bool): Whether to pack several items into each request.
+        batch_token_budget (int): The maximum number of prompt tokens per batched
+            request.
+        batch_output_tokens (int): The completion tokens reserved for each item in a
+            batched request.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        layout (PromptLayout): Keeps the rule in the system message shared by every
+            item.
 
     Methods:
         project_list(): Projects the entire list based on the projection rule.
+        project_list_batched(): Projects the list by packing several items into each
+            request.
+        project_stream(items, max_concurrency): Projects items and yields results as
+            they complete.
         project_item(): Projects a single item based on the projection rule.
+        prefix_tokens(encoder): Returns the number of prompt tokens every request of a
+            run shares.
     """
 
-    def __init__(self, data: ProjectListInput):
+    def __init__(
+        self, data: ProjectListInput, openai_client: Optional[OpenAIClient] = None
+    ):
         """
         Constructs all the necessary attributes for the ProjectListAgent object.
 
         Args:
             data (ProjectListInput): An instance of ProjectListInput containing 
             the list of items, projection rule, and max_tokens.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.list_to_project = data.list_to_project
         self.projection_rule = data.projection_rule
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.batch_mode = data.batch_mode
+        self.batch_token_budget = data.batch_token_budget
+        self.batch_output_tokens = data.batch_output_tokens
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.layout = PromptLayout(
+            "You are an assistant tasked with projecting items based on a specific "
+            "rule. "
+            "The rule is: {{projection_rule}}",
+            "Project the following item based on the rule: {{item}}.",
+            {"projection_rule": self.projection_rule},
+        )
 
+    @traced
     async def project_list(self) -> List[Dict]:
         """
         Projects the entire list based on the given projection rule.
@@ -43,14 +85,98 @@ class ProjectListAgent:
         Returns:
             List[Dict]: A list of dictionaries with the original items and their projections.
         """
+        if self.batch_mode:
+            return await self.project_list_batched()
+
         tasks = []
         for item in self.list_to_project:
-            user_prompt = f"Project the following item based on the rule '{self.projection_rule}': {item}."
-            tasks.append(self.project_item(user_prompt))
+            tasks.append(self.project_item(self._user_prompt(item)))
 
         results = await asyncio.gather(*tasks)
         return results
 
+    @traced
+    async def project_list_batched(self) -> List[Dict]:
+        """
+        Projects the list by packing several items into each request.
+
+        Returns:
+            List[Dict]: A list of dictionaries with the original items and their
+            projections.
+        """
+        batcher = self._batcher()
+        return await batcher.complete(
+            self.list_to_project,
+            fallback=lambda index: self.project_item(
+                self._user_prompt(self.list_to_project[index])
+            ),
+            wrap=lambda index, value: {
+                "item": self._user_prompt(self.list_to_project[index]),
+                "projection": value.strip(),
+            },
+        )
+
+    async def project_stream(
+        self, items: Optional[Iterable[str]] = None, max_concurrency: int = 10
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Projects items and yields each result as soon as its request completes.
+
+        At most `max_concurrency` requests are in flight, and new items are only
+        read once the caller has consumed earlier results.
+
+        Args:
+            items (Iterable[str]): The items to project, which may be a lazy or async
+                iterable. Defaults to the agent's list.
+            max_concurrency (int): The maximum number of requests in flight.
+
+        Yields:
+            Tuple[int, Dict]: The index of each item and its projection, in completion
+            order.
+        """
+        async for index, result in stream_bounded(
+            lambda index, item: self.project_item(self._user_prompt(item)),
+            self.list_to_project if items is None else items,
+            max_concurrency,
+        ):
+            yield index, result
+
+    def prefix_tokens(self, encoder=None) -> int:
+        """
+        Returns the number of prompt tokens shared by every request of a list run.
+
+        Providers only serve a prefix from their prompt cache once it reaches
+        MIN_CACHED_PREFIX_TOKENS. In batch mode the shared prefix is the batch
+        system prompt; otherwise it is the prompt layout's prefix.
+
+        Args:
+            encoder: Provides `encode`, such as a tiktoken encoding. Defaults to
+                the model's encoding.
+
+        Returns:
+            int: The shared prefix length in tokens.
+        """
+        if self.batch_mode:
+            return self._batcher().prefix_tokens(encoder)
+        return self.layout.prefix_tokens(encoder)
+
+    def _batcher(self) -> BatchCompleter:
+        return BatchCompleter(
+            self.openai_client,
+            instructions=(
+                "You are an assistant tasked with projecting items based on a specific "
+                "rule. "
+                f"The rule is: {self.projection_rule}"
+            ),
+            value_description="the projection of the item as a string",
+            token_budget=self.batch_token_budget,
+            output_tokens_per_item=min(self.batch_output_tokens, self.max_tokens),
+        )
+
+    def _user_prompt(self, item: str) -> str:
+        return self.layout.user_prompt({"item": item})
+
+    @traced
     async def project_item(self, user_prompt: str) -> Dict:
         """
         Projects a single item based on the given rule.
@@ -61,10 +187,8 @@ class ProjectListAgent:
         Returns:
             Dict: A dictionary with the original item and its projection.
         """
-        system_prompt = "You are an assistant tasked with projecting items based on a specific rule."
-        response = await self.openai_client.complete_chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ], max_tokens=self.max_tokens)
+        response = await self.openai_client.complete_chat(
+            self.layout.messages(user_prompt), max_tokens=self.max_tokens
+        )
 
         return {"item": user_prompt, "projection": response.strip()}
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from .openai_api import OpenAIClient
+from .tracing import traced
 
 class ReduceListInput(BaseModel):
     list_to_reduce: List[str] = Field(..., description="The list of items to reduce")
@@ -23,19 +24,24 @@ class ReduceListAgent:
         reduce_item(user_prompt): Reduces a single item based on the reduction goal.
     """
 
-    def __init__(self, data: ReduceListInput):
+    def __init__(
+        self, data: ReduceListInput, openai_client: Optional[OpenAIClient] = None
+    ):
         """
         Constructs all the necessary attributes for the ReduceListAgent object.
 
         Args:
             data (ReduceListInput): An instance of ReduceListInput containing 
             the list of items, reduction goal, and max_tokens.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
         """
         self.list_to_reduce = data.list_to_reduce
         self.reduction_goal = data.reduction_goal
         self.max_tokens = data.max_tokens
-        self.openai_client = OpenAIClient()
+        self.openai_client = openai_client or OpenAIClient.shared()
 
+    @traced
     async def reduce_list(self) -> List[Dict]:
         """
         Reduces the entire list based on the provided items and reduction goal.
@@ -51,6 +57,7 @@ class ReduceListAgent:
         results = await asyncio.gather(*tasks)
         return results
 
+    @traced
     async def reduce_item(self, user_prompt: str) -> Dict:
         """
         Reduces a single item based on the reduction goal.
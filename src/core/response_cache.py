@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ResponseCache:
+    """
+    A two-tier, content-addressed cache for chat completions.
+
+    Responses are keyed by a hash of the model, messages, max_tokens and
+    temperature. Lookups hit an in-memory LRU first and then, when a path is
+    given, a SQLite database that survives across runs. Entries expire after
+    `ttl` seconds and the database is pruned to `max_entries`, dropping the
+    least recently used entries first.
+
+    The async methods keep SQLite off the event loop: `aget` answers from
+    memory on the loop and only reads the database in a worker thread, and
+    `aset` stores into memory and queues the database write on a single
+    writer thread without waiting for it.
+
+    Attributes:
+        path (str): The SQLite database path, or None for a memory-only cache.
+        memory_entries (int): The capacity of the in-memory LRU.
+        ttl (float): Seconds an entry stays valid, or None to never expire.
+        max_entries (int): The maximum number of entries kept on disk.
+        hits (int): Lookups answered from either tier.
+        misses (int): Lookups that found nothing.
+        memory_hits (int): Lookups answered from the in-memory tier.
+        disk_hits (int): Lookups answered from the on-disk tier.
+
+    Methods:
+        from_settings(settings): Builds a cache from a settings dict, if enabled.
+        make_key(model, messages, max_tokens, temperature): Hashes a request.
+        get(key): Returns a cached response or None.
+        set(key, value): Stores a response.
+        aget(key): Returns a cached response or None, reading the database in a worker
+            thread.
+        aset(key, value): Stores a response, writing the database on the writer thread.
+        flush(): Waits for queued database writes.
+        prune(): Drops expired entries and trims the database to `max_entries`.
+        stats(): Returns the hit and miss counters.
+        clear(): Removes every entry.
+        close(): Closes the database connection.
+    """
+
+    prune_interval = 100
+
+    def __init__(
+        self,
+        path=None,
+        memory_entries=1024,
+        ttl=None,
+        max_entries=100000,
+        clock=time.time,
+    ):
+        """
+        Constructs the ResponseCache object and creates the database if needed.
+
+        Args:
+            path (str): The SQLite database path, or None for a memory-only cache.
+            memory_entries (int): The capacity of the in-memory LRU.
+            ttl (float): Seconds an entry stays valid, or None to never expire.
+            max_entries (int): The maximum number of entries kept on disk.
+            clock (Callable): Returns the current time in seconds.
+        """
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self._db = None
+        self._writer = None
+
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value "
+                "TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses "
+                "(accessed_at)"
+            )
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a cache from the "cache_enabled", "cache_path", "cache_memory_entries",
+        "cache_ttl" and "cache_max_entries" settings.
+
+        Args:
+            settings (dict): The loaded settings.
+
+        Returns:
+            ResponseCache: The configured cache, or None when caching is disabled.
+        """
+        if not settings.get("cache_enabled", False):
+            return None
+        return cls(
+            path=settings.get("cache_path", "./var/cache/completions.db"),
+            memory_entries=settings.get("cache_memory_entries", 1024),
+            ttl=settings.get("cache_ttl"),
+            max_entries=settings.get("cache_max_entries", 100000),
+        )
+
+    @staticmethod
+    def make_key(model, messages, max_tokens, temperature=None, **params):
+        """
+        Hashes the parts of a request that determine its response.
+
+        Args:
+            model (str): The model name.
+            messages (list): The chat messages.
+            max_tokens (int): The completion token limit.
+            temperature (float): The sampling temperature.
+            **params: Any other request parameters that affect the response.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                **params,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Returns a cached response.
+
+        Args:
+            key (str): A key produced by `make_key`.
+
+        Returns:
+            str: The cached response, or None on a miss.
+        """
+        now = self.clock()
+        value = self._get_memory(key, now)
+        return value if value is not None else self._get_disk(key, now)
+
+    async def aget(self, key):
+        """
+        Returns a cached response without blocking the event loop on the database.
+
+        Args:
+            key (str): A key produced by `make_key`.
+
+        Returns:
+            str: The cached response, or None on a miss.
+        """
+        now = self.clock()
+        value = self._get_memory(key, now)
+        if value is not None or self._db is None:
+            return value if value is not None else self._get_disk(key, now)
+        return await asyncio.to_thread(self._get_disk, key, now)
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+        return None
+
+    def _get_disk(self, key, now):
+        row = None
+        with self._db_lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._db.execute(
+                            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                            (now, key),
+                        )
+                    else:
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """
+        Stores a response in both tiers.
+
+        Args:
+            key (str): A key produced by `make_key`.
+            value (str): The response to cache.
+        """
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+        if self._db is not None:
+            self._write(key, value, now)
+
+    async def aset(self, key, value):
+        """
+        Stores a response in memory and queues its database write on the writer thread.
+
+        Args:
+            key (str): A key produced by `make_key`.
+            value (str): The response to cache.
+        """
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is None:
+                return
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="response-cache-writer"
+                )
+        self._writer.submit(self._write, key, value, now)
+
+    def flush(self):
+        """
+        Waits until every database write queued by `aset` has been made.
+        """
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    def _write(self, key, value, now):
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, "
+                "accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % self.prune_interval == 0:
+                self._prune(now)
+
+    def _prune(self, now):
+        if self.ttl is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def prune(self):
+        """
+        Drops expired entries and trims the database to `max_entries`.
+        """
+        with self._db_lock:
+            if self._db is not None:
+                self._prune(self.clock())
+
+    def stats(self):
+        """
+        Returns the hit and miss counters.
+
+        Returns:
+            dict: hits, misses, memory_hits, disk_hits and hit_rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """
+        Removes every entry from both tiers.
+        """
+        self.flush()
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        """
+        Closes the database connection once queued writes are made.
+        """
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
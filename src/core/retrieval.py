@@ -0,0 +1,318 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from .chunking import TextChunker, WordEncoder
+
+_TERM = re.compile(r"\w+")
+_PASSAGE_FIELDS = 5
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lower-cased index terms.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        List[str]: The terms, in order.
+    """
+    return _TERM.findall(text.lower())
+
+
+def load_corpus(
+    path: str, extensions: Tuple[str, ...] = (".txt", ".md")
+) -> List[Tuple[str, str]]:
+    """
+    Reads the documents of a corpus from a file or a directory tree.
+
+    Args:
+        path (str): A text file, or a directory searched recursively.
+        extensions (Tuple[str, ...]): The file extensions read from a directory.
+
+    Returns:
+        List[Tuple[str, str]]: (document id, text) pairs. The id is the path
+        relative to `path`, or the file name for a single file.
+    """
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            return [(os.path.basename(path), f.read())]
+
+    documents = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(extensions):
+                file_path = os.path.join(root, name)
+                with open(file_path, encoding="utf-8") as f:
+                    documents.append((os.path.relpath(file_path, path), f.read()))
+    return documents
+
+
+class Passage(NamedTuple):
+    """
+    A retrievable slice of a document.
+
+    Attributes:
+        doc_id (str): The document the passage comes from.
+        start (int): The character offset where the passage starts in the document.
+        end (int): The character offset just past the passage's end.
+        text (str): The passage's text.
+    """
+    doc_id: str
+    start: int
+    end: int
+    text: str
+
+
+class BM25Index:
+    """
+    An offline BM25 index over document passages that can be saved and memory-mapped.
+
+    Documents are split into overlapping passages and every passage is
+    indexed by its terms. A query only reads the postings of its own terms,
+    so its cost depends on how common those terms are rather than on the
+    size of the corpus. A saved index keeps its postings, passage table and
+    passage texts in flat binary files that `load` memory-maps instead of
+    reading, so opening a large index is fast and pages are read on demand.
+
+    Attributes:
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 length normalization.
+        doc_ids (List[str]): The indexed documents.
+
+    Methods:
+        build(documents, chunker, k1, b): Indexes (document id, text) pairs.
+        search(query, k): Returns the k best passages with their scores.
+        passage(passage_id): Returns a passage by its number.
+        save(directory): Writes the index to a directory.
+        load(directory): Opens a saved index with memory-mapping.
+        close(): Releases the memory-mapped files.
+    """
+
+    def __init__(
+        self,
+        doc_ids: List[str],
+        vocabulary: dict,
+        postings,
+        passages,
+        texts,
+        total_length: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+        files: Optional[list] = None,
+    ):
+        """
+        Constructs a BM25Index from its parts. Use `build` or `load` instead.
+
+        Args:
+            doc_ids (List[str]): The indexed documents.
+            vocabulary (dict): Maps each term to [first posting, document frequency].
+            postings: Flat unsigned ints, a (passage id, term frequency) pair per
+                posting.
+            passages: Flat unsigned ints, (document, start, end, text offset, length)
+                per passage, where length is the passage's number of terms.
+            texts: The UTF-8 passage texts, concatenated.
+            total_length (int): The number of terms across all passages.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 length normalization.
+            files (list): Open files and maps to release on close.
+        """
+        self.doc_ids = doc_ids
+        self.k1 = k1
+        self.b = b
+        self._vocabulary = vocabulary
+        self._postings = postings
+        self._passages = passages
+        self._texts = texts
+        self._total_length = total_length
+        self._files = files or []
+
+    def __len__(self) -> int:
+        return len(self._passages) // _PASSAGE_FIELDS
+
+    @classmethod
+    def build(
+        cls,
+        documents: Iterable[Tuple[str, str]],
+        chunker: Optional[TextChunker] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        """
+        Splits documents into passages and indexes them.
+
+        Args:
+            documents (Iterable[Tuple[str, str]]): (document id, text) pairs, e.g. from
+                `load_corpus`.
+            chunker (TextChunker): Splits documents into passages. Defaults to passages
+                of 200 words overlapping by 40, which needs no tokenizer files.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 length normalization.
+
+        Returns:
+            BM25Index: The in-memory index.
+        """
+        chunker = chunker or TextChunker(200, 40, encoder=WordEncoder())
+        doc_ids = []
+        postings_by_term = defaultdict(list)
+        passages = array("Q")
+        texts = bytearray()
+        total_length = 0
+        for doc_index, (doc_id, text) in enumerate(documents):
+            doc_ids.append(doc_id)
+            for chunk in chunker.split(text):
+                passage_id = len(passages) // _PASSAGE_FIELDS
+                terms = Counter(tokenize(chunk.text))
+                length = sum(terms.values())
+                encoded = chunk.text.encode("utf-8")
+                passages.extend((doc_index, chunk.start, chunk.end, len(texts), length))
+                texts.extend(encoded)
+                total_length += length
+                for term, frequency in terms.items():
+                    postings_by_term[term].append((passage_id, frequency))
+
+        vocabulary = {}
+        postings = array("I")
+        for term in sorted(postings_by_term):
+            entries = postings_by_term[term]
+            vocabulary[term] = [len(postings) // 2, len(entries)]
+            for passage_id, frequency in entries:
+                postings.extend((passage_id, frequency))
+        return cls(
+            doc_ids, vocabulary, postings, passages, bytes(texts), total_length, k1, b
+        )
+
+    def passage(self, passage_id: int) -> Passage:
+        """
+        Returns a passage by its number.
+
+        Args:
+            passage_id (int): The passage number.
+
+        Returns:
+            Passage: The passage.
+        """
+        base = passage_id * _PASSAGE_FIELDS
+        doc_index, start, end, offset = (self._passages[base + i] for i in range(4))
+        text_end = (self._passages[base + _PASSAGE_FIELDS + 3]
+                    if passage_id + 1 < len(self) else len(self._texts))
+        return Passage(
+            self.doc_ids[doc_index],
+            start,
+            end,
+            bytes(self._texts[offset:text_end]).decode("utf-8"),
+        )
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Passage]]:
+        """
+        Returns the passages that best match a query.
+
+        Args:
+            query (str): The query text.
+            k (int): The maximum number of passages to return.
+
+        Returns:
+            List[Tuple[float, Passage]]: (BM25 score, passage) pairs, best first.
+        """
+        count = len(self)
+        if not count:
+            return []
+        average_length = self._total_length / count or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entry = self._vocabulary.get(term)
+            if entry is None:
+                continue
+            first, frequency = entry
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for position in range(2 * first, 2 * (first + frequency), 2):
+                passage_id = self._postings[position]
+                tf = self._postings[position + 1]
+                length = self._passages[passage_id * _PASSAGE_FIELDS + 4]
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[passage_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passage(passage_id)) for passage_id, score in best]
+
+    def save(self, directory: str):
+        """
+        Writes the index to a directory as meta.json plus flat binary files.
+
+        Args:
+            directory (str): The directory to write to. It is created if needed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, data in (
+            ("postings.bin", self._postings),
+            ("passages.bin", self._passages),
+            ("texts.bin", self._texts),
+        ):
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(bytes(data))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "total_length": self._total_length,
+                "doc_ids": self.doc_ids,
+                "vocabulary": self._vocabulary,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """
+        Opens a saved index, memory-mapping its binary files.
+
+        Args:
+            directory (str): A directory written by `save`.
+
+        Returns:
+            BM25Index: The index. Call `close` when done with it.
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        files = []
+        views = {}
+        for name, kind in (
+            ("postings.bin", "I"),
+            ("passages.bin", "Q"),
+            ("texts.bin", None),
+        ):
+            f = open(os.path.join(directory, name), "rb")
+            files.append(f)
+            if os.fstat(f.fileno()).st_size == 0:
+                views[name] = array(kind) if kind else b""
+                continue
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            files.append(mapped)
+            views[name] = memoryview(mapped).cast(kind) if kind else memoryview(mapped)
+
+        return cls(
+            meta["doc_ids"],
+            meta["vocabulary"],
+            views["postings.bin"],
+            views["passages.bin"],
+            views["texts.bin"],
+            meta["total_length"],
+            meta["k1"],
+            meta["b"],
+            files,
+        )
+
+    def close(self):
+        """
+        Releases the memory-mapped files of a loaded index.
+        """
+        self._postings = self._passages = self._texts = None
+        for handle in reversed(self._files):
+            handle.close()
+        self._files = []
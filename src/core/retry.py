@@ -0,0 +1,264 @@
+import asyncio
+import email.utils
+import random
+import time
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the overall request volume.
+
+    Every first attempt deposits `ratio` tokens and every retry withdraws one,
+    so during an outage retries stop once they would exceed `ratio` of the
+    traffic instead of multiplying the load on the API.
+
+    Attributes:
+        ratio (float): Retry tokens earned per first attempt.
+        capacity (float): The maximum number of banked retry tokens.
+        balance (float): Retry tokens currently available.
+
+    Methods:
+        deposit(): Records a first attempt.
+        withdraw(): Takes a token for a retry, if one is available.
+    """
+
+    def __init__(self, ratio=0.2, initial=10, capacity=100):
+        """
+        Constructs the RetryBudget object.
+
+        Args:
+            ratio (float): Retry tokens earned per first attempt.
+            initial (float): Retry tokens available before any traffic.
+            capacity (float): The maximum number of banked retry tokens.
+        """
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = float(initial)
+
+    def deposit(self):
+        """
+        Records a first attempt.
+        """
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def withdraw(self):
+        """
+        Takes a token for a retry, if one is available.
+
+        Returns:
+            bool: Whether the retry is allowed.
+        """
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """
+    Retries transient API failures with exponential backoff and full jitter.
+
+    Rate-limit (429), timeout, connection and 5xx errors are retried. A
+    `Retry-After` (or `retry-after-ms`) header from the server overrides the
+    computed backoff, capped at `max_delay`. Each call can be bounded by a
+    deadline covering all of its attempts; when the next delay would end past
+    the deadline the error is raised at once instead of sleeping first. All
+    calls share a RetryBudget.
+
+    Attributes:
+        max_attempts (int): The maximum number of attempts per call, including the
+            first.
+        base_delay (float): The backoff ceiling for the first retry, in seconds.
+        max_delay (float): The largest delay between attempts, in seconds.
+        deadline (float): Seconds a call may take across all attempts, or None.
+        budget (RetryBudget): The retry budget shared by all calls, or None.
+        retries (int): The number of retries performed so far.
+
+    Methods:
+        from_settings(settings): Builds a policy from a settings dict.
+        is_retryable(error): Whether an error is worth retrying.
+        retry_after(error): The server-requested delay, if any.
+        backoff(attempt): The jittered delay before a retry.
+        call(func, *args, on_retry, **kwargs): Calls a coroutine function with retries.
+    """
+
+    def __init__(
+        self,
+        max_attempts=5,
+        base_delay=0.5,
+        max_delay=30.0,
+        deadline=None,
+        budget=None,
+        rng=None,
+        sleep=asyncio.sleep,
+        clock=time.monotonic,
+    ):
+        """
+        Constructs the RetryPolicy object.
+
+        Args:
+            max_attempts (int): The maximum number of attempts per call, including the
+                first.
+            base_delay (float): The backoff ceiling for the first retry, in seconds.
+            max_delay (float): The largest delay between attempts, in seconds, including
+                delays requested by the server.
+            deadline (float): Seconds a call may take across all attempts, or None.
+            budget (RetryBudget): The retry budget shared by all calls, or None.
+            rng (random.Random): The source of jitter.
+            sleep (Callable): Coroutine function used to wait between attempts.
+            clock (Callable): Returns the current time in seconds.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget = budget
+        self.rng = rng or random.Random()
+        self.sleep = sleep
+        self.clock = clock
+        self.retries = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a policy from the "retry_max_attempts", "retry_base_delay",
+        "retry_max_delay", "request_deadline" and "retry_budget_ratio" settings.
+
+        Args:
+            settings (dict): The loaded settings.
+
+        Returns:
+            RetryPolicy: The configured policy.
+        """
+        return cls(
+            max_attempts=settings.get("retry_max_attempts", 5),
+            base_delay=settings.get("retry_base_delay", 0.5),
+            max_delay=settings.get("retry_max_delay", 30.0),
+            deadline=settings.get("request_deadline"),
+            budget=RetryBudget(ratio=settings.get("retry_budget_ratio", 0.2)),
+        )
+
+    def is_retryable(self, error):
+        """
+        Determines whether an error is transient and worth retrying.
+
+        Args:
+            error (Exception): The error raised by an attempt.
+
+        Returns:
+            bool: True for timeouts, connection errors, 429s and 5xx responses.
+        """
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return (
+                error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+            )
+        return False
+
+    def retry_after(self, error):
+        """
+        Reads the delay requested by the server, if any.
+
+        Args:
+            error (Exception): The error raised by an attempt.
+
+        Returns:
+            float: The requested delay in seconds, or None.
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            try:
+                return float(value) / 1000.0
+            except ValueError:
+                pass
+
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+    def backoff(self, attempt):
+        """
+        Computes the delay before the next attempt using full jitter.
+
+        Args:
+            attempt (int): The number of attempts made so far (1 after the first
+                failure).
+
+        Returns:
+            float: The delay in seconds.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self.rng.uniform(0, ceiling)
+
+    async def call(self, func, *args, on_retry=None, **kwargs):
+        """
+        Calls a coroutine function, retrying transient failures.
+
+        Args:
+            func (Callable): The coroutine function to call.
+            *args: Positional arguments for the function.
+            on_retry (Callable): Called as on_retry(attempt, error, delay) before each
+                retry.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            Any: The result of the first successful attempt.
+
+        Raises:
+            Exception: The last error, once it is not retryable or the attempts,
+                deadline or retry budget are exhausted.
+            asyncio.TimeoutError: If the deadline expires during an attempt.
+        """
+        started = self.clock()
+        if self.budget is not None:
+            self.budget.deposit()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.deadline is None:
+                    return await func(*args, **kwargs)
+                remaining = self.deadline - (self.clock() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("Request deadline exceeded.")
+                return await asyncio.wait_for(func(*args, **kwargs), remaining)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+
+                delay = self.retry_after(e)
+                if delay is None:
+                    delay = self.backoff(attempt)
+                else:
+                    delay = min(delay, self.max_delay)
+                if (
+                    self.deadline is not None
+                    and self.clock() - started + delay >= self.deadline
+                ):
+                    raise
+                if self.budget is not None and not self.budget.withdraw():
+                    raise
+
+                self.retries += 1
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                await self.sleep(delay)
@@ -0,0 +1,438 @@
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+CompareBatch = Callable[[List[Tuple[str, str]]], Awaitable[List[bool]]]
+RankChunk = Callable[[List[str]], Awaitable[Optional[List[int]]]]
+
+
+class ComparisonCache:
+    """
+    Remembers comparison outcomes and infers new ones through transitivity.
+
+    Outcomes are stored as a directed "comes before" graph over item
+    positions. A lookup first checks for a direct answer and then searches
+    the graph, so after learning a < b and b < c the cache answers a < c
+    without another LLM call.
+
+    Attributes:
+        max_search (int): The maximum number of nodes visited per inference.
+        hits (int): Lookups answered directly.
+        inferred (int): Lookups answered through transitivity.
+
+    Methods:
+        record(a, b, a_first): Stores the outcome of comparing a with b.
+        lookup(a, b): Returns whether a comes before b, if known.
+    """
+
+    def __init__(self, max_search: int = 32):
+        """
+        Constructs an empty ComparisonCache.
+
+        Args:
+            max_search (int): The maximum number of nodes visited per inference.
+        """
+        self.max_search = max_search
+        self.hits = 0
+        self.inferred = 0
+        self._known: Dict[Tuple[int, int], bool] = {}
+        self._before = defaultdict(set)
+
+    def record(self, a: int, b: int, a_first: bool):
+        """
+        Stores the outcome of comparing two items.
+
+        Args:
+            a (int): The position of the first item.
+            b (int): The position of the second item.
+            a_first (bool): Whether a comes before b.
+        """
+        self._known[(a, b)] = a_first
+        self._known[(b, a)] = not a_first
+        if a_first:
+            self._before[a].add(b)
+        else:
+            self._before[b].add(a)
+
+    def lookup(self, a: int, b: int) -> Optional[bool]:
+        """
+        Returns whether a comes before b, if it is known or can be inferred.
+
+        Args:
+            a (int): The position of the first item.
+            b (int): The position of the second item.
+
+        Returns:
+            bool: True if a comes before b, False if after, None if unknown.
+        """
+        known = self._known.get((a, b))
+        if known is not None:
+            self.hits += 1
+            return known
+        if self._reaches(a, b):
+            self.inferred += 1
+            self.record(a, b, True)
+            return True
+        if self._reaches(b, a):
+            self.inferred += 1
+            self.record(a, b, False)
+            return False
+        return None
+
+    def _reaches(self, start: int, target: int) -> bool:
+        if not self._before.get(start):
+            return False
+        seen = {start}
+        frontier = [start]
+        while frontier and len(seen) <= self.max_search:
+            node = frontier.pop()
+            for following in self._before.get(node, ()):
+                if following == target:
+                    return True
+                if following not in seen:
+                    seen.add(following)
+                    frontier.append(following)
+        return False
+
+
+class SortEngine:
+    """
+    Sorts items with as few LLM comparisons and round trips as practical.
+
+    Items are first grouped into sorted runs, either singletons or chunks
+    ranked in one call each by an optional listwise ranker. Runs are then
+    merged pairwise. A merge takes the middle element of the longer run,
+    finds its place in the shorter run by binary search and splits both runs
+    around it into two independent sub-merges, so merging runs of m and n
+    items costs close to m + n comparisons rather than m log n. All merges and
+    sub-merges of a level advance in lockstep and each round's probes are sent
+    together in batched calls. A ComparisonCache answers any probe whose
+    outcome is already known or implied, which matters when a cache is shared
+    between sorts of overlapping items.
+
+    Attributes:
+        compare_batch (Callable): Async function taking (a, b) pairs and returning,
+            for each pair, whether a comes before b.
+        batch_size (int): The maximum number of pairs per compare_batch call.
+        rank_chunk (Callable): Optional async function returning the sorted order of
+            a chunk as a list of positions, or None if it could not rank it.
+        chunk_size (int): The size of chunks handed to rank_chunk.
+        cache (ComparisonCache): Known comparison outcomes.
+        comparisons (int): Pairs sent to compare_batch.
+        calls (int): compare_batch and rank_chunk calls made.
+        rounds (int): Sequential rounds of calls, a proxy for latency.
+
+    For top-k selection a knockout tournament finds the first item with
+    n - 1 comparisons. Each following item is found by a smaller tournament
+    among the candidates whose every known better item has already been
+    selected, mostly the items that lost directly to the last pick. This
+    costs about n + k log n comparisons instead of a full sort.
+
+    Methods:
+        sort(items): Returns the items in sorted order.
+        top_k(items, k): Returns the first k items of the sorted order.
+        stats(): Returns the comparison, call and cache counters.
+    """
+
+    def __init__(
+        self,
+        compare_batch: CompareBatch,
+        batch_size: int = 20,
+        rank_chunk: Optional[RankChunk] = None,
+        chunk_size: int = 8,
+        cache: Optional[ComparisonCache] = None,
+    ):
+        """
+        Constructs the SortEngine object.
+
+        Args:
+            compare_batch (Callable): Async function taking (a, b) pairs and returning,
+                for each pair, whether a comes before b.
+            batch_size (int): The maximum number of pairs per compare_batch call.
+            rank_chunk (Callable): Optional listwise ranker for the initial runs.
+            chunk_size (int): The size of chunks handed to rank_chunk.
+            cache (ComparisonCache): Known comparison outcomes to start from.
+        """
+        self.compare_batch = compare_batch
+        self.batch_size = batch_size
+        self.rank_chunk = rank_chunk
+        self.chunk_size = chunk_size
+        self.cache = cache or ComparisonCache()
+        self.comparisons = 0
+        self.calls = 0
+        self.rounds = 0
+        self._items: Sequence[str] = []
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the comparison, call and cache counters.
+
+        Returns:
+            Dict[str, int]: comparisons, calls, rounds, cache_hits and inferred.
+        """
+        return {
+            "comparisons": self.comparisons,
+            "calls": self.calls,
+            "rounds": self.rounds,
+            "cache_hits": self.cache.hits,
+            "inferred": self.cache.inferred,
+        }
+
+    async def _resolve(
+        self, pairs: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], bool]:
+        """
+        Answers comparisons between item positions, asking the LLM only for unknown
+        ones.
+        """
+        results = {}
+        unknown = []
+        asked = set()
+        for a, b in pairs:
+            if (a, b) in results:
+                continue
+            known = self.cache.lookup(a, b)
+            results[(a, b)] = known
+            if known is None and (a, b) not in asked and (b, a) not in asked:
+                asked.add((a, b))
+                unknown.append((a, b))
+
+        if unknown:
+            batches = [
+                unknown[i : i + self.batch_size]
+                for i in range(0, len(unknown), self.batch_size)
+            ]
+            answers = await asyncio.gather(
+                *(
+                    self.compare_batch(
+                        [(self._items[a], self._items[b]) for a, b in batch]
+                    )
+                    for batch in batches
+                )
+            )
+            self.calls += len(batches)
+            self.comparisons += len(unknown)
+            self.rounds += 1
+
+            learned = {}
+            for batch, batch_answers in zip(batches, answers):
+                for (a, b), a_first in zip(batch, batch_answers):
+                    self.cache.record(a, b, bool(a_first))
+                    learned[(a, b)] = bool(a_first)
+                    learned[(b, a)] = not a_first
+            for pair, known in results.items():
+                if known is None:
+                    results[pair] = learned[pair]
+        return results
+
+    async def _initial_runs(self, positions: List[int]) -> List[List[int]]:
+        if self.rank_chunk is None or self.chunk_size < 2:
+            return [[position] for position in positions]
+
+        chunks = [
+            positions[i : i + self.chunk_size]
+            for i in range(0, len(positions), self.chunk_size)
+        ]
+        orders = await asyncio.gather(
+            *(
+                self.rank_chunk([self._items[position] for position in chunk])
+                for chunk in chunks
+                if len(chunk) > 1
+            )
+        )
+        self.calls += len(orders)
+        if orders:
+            self.rounds += 1
+
+        runs = []
+        ranked = iter(orders)
+        for chunk in chunks:
+            order = next(ranked) if len(chunk) > 1 else [0]
+            if order is not None and sorted(order) == list(range(len(chunk))):
+                run = [chunk[i] for i in order]
+                for first, second in zip(run, run[1:]):
+                    self.cache.record(first, second, True)
+                runs.append(run)
+            else:
+                runs.extend([position] for position in chunk)
+        return runs
+
+    async def _merge_level(
+        self, merges: List[Tuple[List[int], List[int]]]
+    ) -> List[List[int]]:
+        """
+        Merges several pairs of sorted runs at once, batching their probes per round.
+        """
+        ranks = [([0] * len(left), [0] * len(right)) for left, right in merges]
+        pending = [
+            (k, 0, len(left), 0, len(right)) for k, (left, right) in enumerate(merges)
+        ]
+        searches = []
+        while True:
+            for k, a_lo, a_hi, b_lo, b_hi in pending:
+                left_ranks, right_ranks = ranks[k]
+                if a_lo == a_hi:
+                    right_ranks[b_lo:b_hi] = [a_lo] * (b_hi - b_lo)
+                elif b_lo == b_hi:
+                    left_ranks[a_lo:a_hi] = [b_lo] * (a_hi - a_lo)
+                elif a_hi - a_lo >= b_hi - b_lo:
+                    searches.append(
+                        (
+                            k,
+                            a_lo,
+                            a_hi,
+                            b_lo,
+                            b_hi,
+                            True,
+                            (a_lo + a_hi) // 2,
+                            b_lo,
+                            b_hi,
+                        )
+                    )
+                else:
+                    searches.append(
+                        (
+                            k,
+                            a_lo,
+                            a_hi,
+                            b_lo,
+                            b_hi,
+                            False,
+                            (b_lo + b_hi) // 2,
+                            a_lo,
+                            a_hi,
+                        )
+                    )
+            pending = []
+            if not searches:
+                break
+
+            probes = []
+            for k, _, _, _, _, from_left, pivot, low, high in searches:
+                left, right = merges[k]
+                middle = (low + high) // 2
+                probes.append(
+                    (left[pivot], right[middle])
+                    if from_left
+                    else (left[middle], right[pivot])
+                )
+            answers = await self._resolve(probes)
+
+            narrowed = []
+            for search, probe in zip(searches, probes):
+                k, a_lo, a_hi, b_lo, b_hi, from_left, pivot, low, high = search
+                middle = (low + high) // 2
+                if answers[probe] == from_left:
+                    high = middle
+                else:
+                    low = middle + 1
+                if low < high:
+                    narrowed.append(
+                        (k, a_lo, a_hi, b_lo, b_hi, from_left, pivot, low, high)
+                    )
+                elif from_left:
+                    ranks[k][0][pivot] = low
+                    pending.extend(
+                        [(k, a_lo, pivot, b_lo, low), (k, pivot + 1, a_hi, low, b_hi)]
+                    )
+                else:
+                    ranks[k][1][pivot] = low
+                    pending.extend(
+                        [(k, a_lo, low, b_lo, pivot), (k, low, a_hi, pivot + 1, b_hi)]
+                    )
+            searches = narrowed
+
+        merged_runs = []
+        for (left, right), (left_ranks, right_ranks) in zip(merges, ranks):
+            merged = [0] * (len(left) + len(right))
+            for i, position in enumerate(left):
+                merged[i + left_ranks[i]] = position
+            for j, position in enumerate(right):
+                merged[j + right_ranks[j]] = position
+            merged_runs.append(merged)
+        return merged_runs
+
+    async def _sorted_positions(self, positions: List[int]) -> List[int]:
+        runs = await self._initial_runs(positions)
+        while len(runs) > 1:
+            pairs = [(runs[i], runs[i + 1]) for i in range(0, len(runs) - 1, 2)]
+            merged = await self._merge_level(pairs)
+            if len(runs) % 2:
+                merged.append(runs[-1])
+            runs = merged
+        return runs[0] if runs else []
+
+    async def sort(self, items: Sequence[str]) -> List[str]:
+        """
+        Returns the items in sorted order.
+
+        Args:
+            items (Sequence[str]): The items to sort.
+
+        Returns:
+            List[str]: The sorted items.
+        """
+        self._items = items
+        order = await self._sorted_positions(list(range(len(items))))
+        return [items[position] for position in order]
+
+    async def top_k(self, items: Sequence[str], k: int) -> List[str]:
+        """
+        Returns the first k items of the sorted order without sorting the rest.
+
+        Args:
+            items (Sequence[str]): The items to select from.
+            k (int): The number of items to return.
+
+        Returns:
+            List[str]: The first k items, in sorted order.
+        """
+        if k >= len(items):
+            return await self.sort(items)
+
+        self._items = items
+        beaten_by = defaultdict(set)
+        beats = defaultdict(set)
+        selected = []
+        done = set()
+        candidates = list(range(len(items)))
+        while candidates and len(selected) < k:
+            best = await self._knockout(candidates, beaten_by, beats)
+            selected.append(best)
+            done.add(best)
+            remaining = {
+                position
+                for position in candidates
+                if position != best and beaten_by[position] <= done
+            }
+            remaining.update(
+                position
+                for position in beats[best]
+                if position not in done and beaten_by[position] <= done
+            )
+            if not remaining:
+                # Inconsistent answers can leave every item behind an unselected one.
+                remaining = set(range(len(items))) - done
+            candidates = sorted(remaining)
+        return [items[position] for position in selected]
+
+    async def _knockout(self, positions: List[int], beaten_by, beats) -> int:
+        """
+        Runs a knockout tournament and returns the position that comes first.
+        """
+        while len(positions) > 1:
+            pairs = [
+                (positions[i], positions[i + 1])
+                for i in range(0, len(positions) - 1, 2)
+            ]
+            answers = await self._resolve(pairs)
+            winners = []
+            for a, b in pairs:
+                winner, loser = (a, b) if answers[(a, b)] else (b, a)
+                beaten_by[loser].add(winner)
+                beats[winner].add(loser)
+                winners.append(winner)
+            if len(positions) % 2:
+                winners.append(positions[-1])
+            positions = winners
+        return positions[0]
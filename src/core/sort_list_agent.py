@@ -1,7 +1,11 @@
 from pydantic import BaseModel, Field
-import asyncio
-from typing import List
+import json
+from typing import Dict, List, Optional, Tuple
 from .openai_api import OpenAIClient
+from .batching import BatchCompleter
+from .structured_output import StructuredOutputError, StructuredOutputPolicy
+from .sort_engine import SortEngine
+from .tracing import traced
 
 class SortListInput(BaseModel):
     goal: str = Field(..., description="The goal for sorting the list")
@@ -9,152 +13,229 @@ class SortListInput(BaseModel):
     max_tokens: int = Field(1000, description="The maximum number of tokens to generate")
     temperature: float = Field(0.0, description="Sampling temperature for the OpenAI model")
     log_explanations: bool = Field(False, description="Whether to log explanations of sorting decisions")
+    batch_size: int = Field(
+        20, description="The maximum number of comparisons sent in one request"
+    )
+    chunk_size: int = Field(
+        0,
+        description="Items ranked together in one request to seed the sort, or 0 to "
+                    "only compare pairs",
+    )
+    top_k: Optional[int] = Field(
+        None,
+        description="Return only the first k items of the sorted order, or None for "
+                    "the whole list",
+    )
 
 class SortListAgent:
     """
     A class to sort items in a list based on a given goal using the OpenAI API.
 
+    Sorting is delegated to a SortEngine, which batches independent comparisons
+    into shared requests and never asks for an order it already knows or can
+    infer. With top_k set, only the first k items are selected, which costs
+    about n + k log n comparisons instead of n log n.
+
+    Pairs and chunks are sent as JSON objects keyed by their index, so items
+    that contain newlines, "|" or text that looks like another index cannot
+    be confused with each other. Responses that are not valid JSON, or
+    rankings that are not a permutation, are repaired through a
+    StructuredOutputPolicy. Comparison outcomes are cached per sort, since
+    they are keyed by list position.
+
     Attributes:
         goal (str): The goal for sorting the list.
         list (List[str]): The list of items to sort.
         max_tokens (int): The maximum number of tokens to generate.
         temperature (float): Sampling temperature for the OpenAI model.
         log_explanations (bool): Whether to log explanations of sorting decisions.
+        batch_size (int): The maximum number of comparisons sent in one request.
+        chunk_size (int): Items ranked together in one request to seed the sort, or 0.
+        top_k (int): Return only the first k items of the sorted order, or None.
         openai_client (OpenAIClient): An instance of OpenAIClient to interact with the API.
+        output_policy (StructuredOutputPolicy): Bounds the retries of invalid responses.
+        comparisons (int): The number of comparisons sent to the API by the last sort.
+        stats (Dict[str, int]): The engine counters from the last sort.
 
     Methods:
-        sort(): Sorts the entire list of items.
-        batch_compare(pairs): Sends multiple comparison pairs to the API in one request to reduce API calls.
-        merge_sort(items): Recursively sorts the items using merge sort.
-        merge(left, right): Merges two sorted lists into one.
+        sort(): Sorts the list of items, or selects its first top_k items.
+        batch_compare(pairs): Compares several pairs of items in one request.
+        rank_chunk(chunk): Ranks a small group of items in one request.
     """
 
-    def __init__(self, data: SortListInput):
+    def __init__(
+        self,
+        data: SortListInput,
+        openai_client: Optional[OpenAIClient] = None,
+        output_policy: Optional[StructuredOutputPolicy] = None,
+    ):
         """
         Constructs all the necessary attributes for the SortListAgent object.
 
         Args:
-            data (SortListInput): An instance of SortListInput containing 
-            the goal, list of items, max_tokens, temperature, and log_explanations.
+            data (SortListInput): An instance of SortListInput containing
+            the goal, list of items, max_tokens, temperature, log_explanations,
+            batch_size, chunk_size and top_k.
+            openai_client (OpenAIClient): The client used to call the API. Defaults to
+            the process-wide shared client.
+            output_policy (StructuredOutputPolicy): Bounds the retries of invalid
+            responses. Defaults to a policy of its own; pass one to share limits and
+            counters.
         """
         self.goal = data.goal
         self.list = data.list_to_sort
         self.max_tokens = data.max_tokens
         self.temperature = data.temperature
         self.log_explanations = data.log_explanations
-        self.openai_client = OpenAIClient()
-
-    async def sort(self):
+        self.batch_size = data.batch_size
+        self.chunk_size = data.chunk_size
+        self.top_k = data.top_k
+        self.openai_client = openai_client or OpenAIClient.shared()
+        self.output_policy = output_policy or StructuredOutputPolicy()
+        self.comparisons = 0
+        self.stats: Dict[str, int] = {}
+
+    @traced
+    async def sort(self) -> List[str]:
         """
-        Sorts the entire list based on the provided items and goal.
+        Sorts the list based on the provided items and goal. When top_k is set,
+        only the first top_k items are selected and returned.
 
         Returns:
-            List[str]: The sorted list of items.
+            List[str]: The sorted list of items, or its first top_k items.
         """
-        return await self.merge_sort(self.list)
+        engine = SortEngine(
+            self._compare_batch,
+            batch_size=self.batch_size,
+            rank_chunk=self.rank_chunk if self.chunk_size > 1 else None,
+            chunk_size=self.chunk_size,
+        )
+        if self.top_k is not None:
+            result = await engine.top_k(self.list, self.top_k)
+        else:
+            result = await engine.sort(self.list)
+        self.comparisons = engine.comparisons
+        self.stats = engine.stats()
+        if self.log_explanations:
+            self.openai_client.logger.info(
+                "Sorted %d of %d items: %s", len(result), len(self.list), self.stats
+            )
+        return result
 
-    async def batch_compare(self, pairs):
+    @traced
+    async def batch_compare(self, pairs: List[Tuple[str, str]]) -> List[str]:
         """
-        Sends multiple comparison pairs to the API in one request to reduce API calls.
+        Compares several pairs of items in one request.
+
+        Pairs the model leaves out of its answer are asked again once; any still
+        missing keep their current order.
 
         Args:
             pairs (List[Tuple[str, str]]): A list of pairs of items to compare.
 
         Returns:
-            List[str]: A list of results for each comparison.
+            List[str]: "BEFORE" if the first item of the pair should come first,
+            otherwise "AFTER", one per pair.
         """
-        batch_prompt = "\n".join([f"Compare {a} and {b} and return the items in the correct order as 'item1,item2'." for a, b in pairs])
-        system_prompt = f"You are tasked with sorting items. Goal: {self.goal}.\nCompare the following pairs and return the correct order."
-
-        if self.log_explanations:
-            self.openai_client.logger.info(f"Sending batch comparison request with prompt: {batch_prompt}")
-
-        response = await self.openai_client.complete_chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": batch_prompt}
-        ], max_tokens=self.max_tokens)
-
-        if self.log_explanations:
-            self.openai_client.logger.info(f"Received response: {response}")
-
-        comparisons = response.split("\n")
-
-        if not comparisons:
-            self.openai_client.logger.error("Empty response received from API.")
-
-        parsed_comparisons = []
-        for comparison in comparisons:
-            individual_comparisons = comparison.split(" ")
-            for comp in individual_comparisons:
-                comp = comp.strip()
-                if not comp:
-                    continue
-                try:
-                    first, second = comp.split(",")
-                    if first.strip() == pairs[0][0]:
-                        parsed_comparisons.append("BEFORE")
-                    else:
-                        parsed_comparisons.append("AFTER")
-                except ValueError:
-                    self.openai_client.logger.info(f"Ignoring unexpected comparison result: {comp}")
-
-        return parsed_comparisons
-
-    async def merge_sort(self, items):
+        results = await self._ask_pairs(pairs)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            retried = await self._ask_pairs([pairs[index] for index in missing])
+            for index, result in zip(missing, retried):
+                results[index] = result
+
+        for index, result in enumerate(results):
+            if result is None:
+                self.openai_client.logger.info(
+                    "No comparison result for pair %s; keeping input order.",
+                    pairs[index],
+                )
+                results[index] = "BEFORE"
+        return results
+
+    @traced
+    async def rank_chunk(self, chunk: List[str]) -> Optional[List[int]]:
         """
-        Recursively sorts the items using merge sort.
+        Ranks a small group of items in one request.
 
         Args:
-            items (List[str]): The list of items to sort.
+            chunk (List[str]): The items to rank.
 
         Returns:
-            List[str]: The sorted list of items.
+            List[int]: The positions of the items in sorted order, or None if no
+            response within the output policy's bounds was a permutation of the
+            positions.
         """
-        if len(items) < 2:
-            return items
-
-        mid = len(items) // 2
-        left_half, right_half = await asyncio.gather(self.merge_sort(items[:mid]), self.merge_sort(items[mid:]))
-        return await self.merge(left_half, right_half)
-
-    async def merge(self, left, right):
-        """
-        Merges two sorted lists into one.
+        system_prompt = (
+            f"You are tasked with sorting items. Goal: {self.goal}.\n"
+            "You will receive a JSON object whose keys are item numbers (as strings) "
+            "and whose values are the items. Respond with a single JSON object of the "
+            "form {\"order\": [...]}, where the array holds every item number exactly "
+            "once, ordered so that the items are sorted according to the goal."
+        )
+        user_prompt = json.dumps(
+            {str(index): item for index, item in enumerate(chunk)}, ensure_ascii=False
+        )
+
+        def parse(response: Optional[str]) -> List[int]:
+            order = BatchCompleter.parse_object(response).get("order")
+            if not isinstance(order, list):
+                raise ValueError('Expected an "order" array.')
+            order = [int(position) for position in order]
+            if sorted(order) != list(range(len(chunk))):
+                raise ValueError(
+                    "The order must list every item number from 0 to "
+                    f"{len(chunk) - 1} once."
+                )
+            return order
+
+        try:
+            return await self._complete(system_prompt, user_prompt, parse)
+        except StructuredOutputError:
+            return None
+
+    async def _compare_batch(self, pairs: List[Tuple[str, str]]) -> List[bool]:
+        return [result == "BEFORE" for result in await self.batch_compare(pairs)]
+
+    async def _ask_pairs(self, pairs: List[Tuple[str, str]]) -> List[Optional[str]]:
+        system_prompt = (
+            f"You are tasked with sorting items. Goal: {self.goal}.\n"
+            "You will receive a JSON object whose keys are pair numbers (as strings) "
+            "and whose values are pairs of items [A, B]. For each pair, decide whether "
+            "A should come before B according to the goal. Respond with a single JSON "
+            "object whose keys are the pair numbers and whose values are \"BEFORE\" if "
+            "A comes first or \"AFTER\" if B comes first. Include every pair number "
+            "exactly once and nothing else."
+        )
+        user_prompt = json.dumps(
+            {str(index): [a, b] for index, (a, b) in enumerate(pairs)},
+            ensure_ascii=False,
+        )
+        try:
+            answers = await self._complete(
+                system_prompt, user_prompt, BatchCompleter.parse_object
+            )
+        except StructuredOutputError:
+            answers = {}
+        results = []
+        for index in range(len(pairs)):
+            answer = answers.get(str(index))
+            answer = answer.strip().upper() if isinstance(answer, str) else None
+            results.append(answer if answer in ("BEFORE", "AFTER") else None)
+        return results
+
+    async def _complete(self, system_prompt: str, user_prompt: str, parse):
+        if self.log_explanations:
+            self.openai_client.logger.info(
+                "Sending sort request with prompt: %s", user_prompt
+            )
 
-        Args:
-            left (List[str]): The left half of the list.
-            right (List[str]): The right half of the list.
+        result = await self.output_policy.complete(self.openai_client, [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ], parse, max_tokens=self.max_tokens, temperature=self.temperature,
+            response_format={"type": "json_object"}, accept=BatchCompleter.accept)
 
-        Returns:
-            List[str]: The merged and sorted list of items.
-        """
-        result = []
-        i, j = 0, 0
-        comparisons_to_make = []
-
-        while i < len(left) and j < len(right):
-            comparisons_to_make.append((left[i], right[j]))
-            i += 1
-            j += 1
-
-        comparison_results = await self.batch_compare(comparisons_to_make)
-
-        if not comparison_results:
-            self.openai_client.logger.info("Final comparison complete.")
-            result.extend(left[i:])
-            result.extend(right[j:])
-            return result
-
-        i = 0
-        j = 0
-        while i < len(left) and j < len(right) and comparison_results:
-            if comparison_results.pop(0) == "BEFORE":
-                result.append(left[i])
-                i += 1
-            else:
-                result.append(right[j])
-                j += 1
-
-        result.extend(left[i:])
-        result.extend(right[j:])
+        if self.log_explanations:
+            self.openai_client.logger.info("Received response: %s", result)
         return result
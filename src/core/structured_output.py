@@ -0,0 +1,243 @@
+import asyncio
+import time
+import jsonschema
+from typing import Any, Callable, Dict, List, Optional
+from .model_router import ModelRouter
+from .tracing import current_agent
+
+PARSE_ERRORS = (ValueError, TypeError, jsonschema.ValidationError)
+
+
+def json_schema_format(name: str, schema: Dict) -> Dict:
+    """
+    Builds a `response_format` that makes the API return JSON matching a schema.
+
+    Args:
+        name (str): A short identifier for the schema.
+        schema (dict): The JSON schema. Strict mode requires every property to be
+            listed in "required" and "additionalProperties" to be false.
+
+    Returns:
+        dict: The response_format to pass to `complete_chat`.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": True},
+    }
+
+
+class StructuredOutputError(Exception):
+    """
+    Raised when no valid structured response was received within the attempt or time
+    budget.
+
+    Attributes:
+        response (str): The last response received, or None.
+        attempts (int): The number of requests made.
+    """
+
+    def __init__(self, message: str, response: Optional[str], attempts: int):
+        super().__init__(message)
+        self.response = response
+        self.attempts = attempts
+
+
+class StructuredOutputPolicy:
+    """
+    Requests a chat completion until its response parses and validates, within fixed
+    bounds.
+
+    When a response fails to parse, the next attempt repeats the request with
+    the bad output and the parse error appended, asking the model to repair
+    it. Attempts stop after `max_attempts` or once `time_budget` seconds have
+    passed since the first one. When the client has a metrics registry,
+    repair requests and failed calls are also counted there, per agent.
+    When the client is a ModelRouter, the request's acceptance check is
+    passed on so that invalid responses escalate to a larger model first.
+
+    Attributes:
+        max_attempts (int): The maximum number of requests per call, including the
+            first.
+        time_budget (float): Seconds a call may take across all attempts, or None.
+        calls (int): Calls made through the policy.
+        retries (int): Repair requests sent after an invalid response.
+        failures (int): Calls that ended without a valid response.
+
+    Methods:
+        complete(openai_client, messages, parse, max_tokens, temperature,
+            response_format, accept, model): Returns the parsed response.
+        repair_messages(messages, response, error): Builds the follow-up request for a
+            bad response.
+        stats(): Returns the call, retry and failure counters.
+    """
+
+    def __init__(self, max_attempts: int = 3, time_budget: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Constructs the StructuredOutputPolicy object.
+
+        Args:
+            max_attempts (int): The maximum number of requests per call, including the
+                first.
+            time_budget (float): Seconds a call may take across all attempts, or None.
+            clock (Callable): Returns the current time in seconds.
+
+        Raises:
+            ValueError: If max_attempts is less than 1.
+        """
+        if max_attempts < 1:
+            raise ValueError("StructuredOutputPolicy needs max_attempts of at least 1.")
+        self.max_attempts = max_attempts
+        self.time_budget = time_budget
+        self.clock = clock
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def repair_messages(
+        self, messages: List[Dict], response: Optional[str], error: Exception
+    ) -> List[Dict]:
+        """
+        Builds the follow-up request for a response that failed to parse.
+
+        Args:
+            messages (List[Dict]): The original request.
+            response (str): The invalid response.
+            error (Exception): Why the response was rejected.
+
+        Returns:
+            List[Dict]: The original messages followed by the bad output and a repair
+            instruction.
+        """
+        return messages + [
+            {"role": "assistant", "content": response or ""},
+            {
+                "role": "user",
+                "content": (
+                    f"That response could not be used: {str(error).splitlines()[0]}\n"
+                    "Reply again with only the corrected JSON, following the required "
+                    "format exactly."
+                ),
+            },
+        ]
+
+    async def complete(
+        self,
+        openai_client,
+        messages: List[Dict],
+        parse: Callable[[Optional[str]], Any],
+        max_tokens: int = 1500,
+        temperature: Optional[float] = None,
+        response_format: Optional[Dict] = None,
+        accept: Optional[Callable[[Optional[str]], bool]] = None,
+        model: Optional[str] = None,
+    ) -> Any:
+        """
+        Requests a completion and returns its parsed value, repairing invalid responses.
+
+        Args:
+            openai_client (OpenAIClient): The client used to call the API.
+            messages (List[Dict]): The chat messages.
+            parse (Callable): Turns a response into a value, raising ValueError,
+                TypeError or jsonschema.ValidationError when it is invalid.
+            max_tokens (int): The maximum number of tokens to generate.
+            temperature (float): The sampling temperature, or None for the API default.
+            response_format (dict): Constrains the output so that it parses on the first
+                attempt, e.g. from `json_schema_format`.
+            accept (Callable): Tells a ModelRouter client which responses to return
+                rather than escalate, e.g. from `json_acceptor`. Ignored by other
+                clients.
+            model (str): The model to request, or None for the client's default.
+
+        Returns:
+            Any: The value returned by parse for the first valid response.
+
+        Raises:
+            StructuredOutputError: If no valid response arrives within the attempts or
+                time budget.
+        """
+        self.calls += 1
+        metrics = getattr(openai_client, "metrics", None)
+        started = self.clock()
+        request = messages
+        response = None
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                self.retries += 1
+                if metrics is not None:
+                    metrics.inc(
+                        "agentm_structured_output_retries_total",
+                        agent=current_agent() or "",
+                    )
+            try:
+                response = await self._request(
+                    openai_client,
+                    request,
+                    max_tokens,
+                    temperature,
+                    response_format,
+                    accept,
+                    model,
+                    started,
+                )
+            except asyncio.TimeoutError:
+                self._fail(metrics, "timeout")
+                raise StructuredOutputError("Time budget exceeded.", response, attempt)
+
+            try:
+                return parse(response)
+            except PARSE_ERRORS as e:
+                error = e
+            request = self.repair_messages(messages, response, error)
+
+        self._fail(metrics, "invalid")
+        raise StructuredOutputError(
+            f"No valid response after {self.max_attempts} attempts: {error}",
+            response,
+            self.max_attempts,
+        )
+
+    def _fail(self, metrics, reason):
+        self.failures += 1
+        if metrics is not None:
+            metrics.inc(
+                "agentm_structured_output_failures_total",
+                agent=current_agent() or "",
+                reason=reason,
+            )
+
+    async def _request(
+        self,
+        openai_client,
+        messages,
+        max_tokens,
+        temperature,
+        response_format,
+        accept,
+        model,
+        started,
+    ):
+        params = {} if response_format is None else {"response_format": response_format}
+        if accept is not None and isinstance(openai_client, ModelRouter):
+            params["accept"] = accept
+        if model is not None:
+            params["model"] = model
+        request = openai_client.complete_chat(
+            messages, max_tokens=max_tokens, temperature=temperature, **params
+        )
+        if self.time_budget is None:
+            return await request
+        remaining = self.time_budget - (self.clock() - started)
+        if remaining <= 0:
+            request.close()
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(request, remaining)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the call, retry and failure counters.
+
+        Returns:
+            Dict[str, int]: calls, retries and failures.
+        """
+        return {"calls": self.calls, "retries": self.retries, "failures": self.failures}
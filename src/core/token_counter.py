@@ -1,39 +1,227 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import tiktoken
 
+# Tokens the chat format adds around every message for its role and delimiters.
+MESSAGE_OVERHEAD_TOKENS = 3
+# Tokens that prime every chat completion's reply.
+REPLY_PRIMING_TOKENS = 3
+# Encoding for models tiktoken does not know yet; newer OpenAI models use it.
+DEFAULT_ENCODING = "o200k_base"
+
+_shared_counters = {}
+_shared_counters_lock = threading.Lock()
+
+
+def encoding_name_for_model(model: str) -> str:
+    """
+    Returns the name of the tiktoken encoding a model uses.
+
+    Args:
+        model (str): The model name, such as "gpt-4o-mini" or "gpt-3.5-turbo".
+
+    Returns:
+        str: The encoding name, falling back to DEFAULT_ENCODING for unknown models.
+    """
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
 class TokenCounter:
     """
     A class to count the number of tokens in a list of messages using the tiktoken library.
 
+    Counts are memoized in an LRU keyed by a hash of the text, so repeated
+    prompts and shared instructions are only encoded once. Batches of texts
+    are encoded with tiktoken's multithreaded batch API. In approximate mode
+    no encoder is loaded at all and counts are estimated from the text length,
+    which is enough for admission control.
+
     Attributes:
-        encoder (tiktoken.Encoding): An instance of the tiktoken encoder to encode messages.
+        model (str): The model whose encoding is used.
+        encoding_name (str): The tiktoken encoding for the model.
+        encoder (tiktoken.Encoding): The encoder, loaded on first use.
+        approximate (bool): Whether counts are estimated instead of encoded.
+        cache_size (int): The capacity of the count cache.
+        num_threads (int): Threads used to encode a batch.
+        hits (int): Counts answered from the cache.
+        misses (int): Counts that needed encoding.
 
     Methods:
-        count_tokens(messages): Counts the total number of tokens in a list of messages.
+        shared(model): Returns the process-wide counter for a model.
+        count_text(text): Counts the tokens in one text.
+        count_batch(texts): Counts the tokens in several texts.
+        count_tokens(messages): Counts the tokens a list of chat messages uses.
+        estimate(text): Estimates the tokens in a text without encoding it.
     """
 
-    def __init__(self, model="gpt-3.5-turbo"):
+    def __init__(
+        self,
+        model="gpt-4o-mini",
+        approximate=False,
+        cache_size=4096,
+        num_threads=8,
+        encoder=None,
+    ):
+        """
+        Constructs the TokenCounter object.
+
+        Args:
+            model (str): The model name, used to pick the encoding.
+            approximate (bool): Whether to estimate counts from text length instead of
+                encoding.
+            cache_size (int): The capacity of the count cache, or 0 to disable it.
+            num_threads (int): Threads used to encode a batch.
+            encoder: Provides `encode`, and optionally `encode_ordinary` and
+                `encode_ordinary_batch`. Defaults to the model's tiktoken encoding.
+        """
+        self.model = model
+        self.encoding_name = encoding_name_for_model(model)
+        self.approximate = approximate
+        self.cache_size = cache_size
+        self.num_threads = num_threads
+        self.hits = 0
+        self.misses = 0
+        self._encoder = encoder
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, model="gpt-4o-mini"):
+        """
+        Returns the process-wide counter for a model, creating it on first use.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            TokenCounter: The shared counter, whose cache every caller benefits from.
+        """
+        counter = _shared_counters.get(model)
+        if counter is None:
+            with _shared_counters_lock:
+                counter = _shared_counters.get(model)
+                if counter is None:
+                    counter = _shared_counters[model] = cls(model)
+        return counter
+
+    @property
+    def encoder(self):
+        """
+        The tiktoken encoding for the model, loaded on first use.
+
+        Returns:
+            tiktoken.Encoding: The encoder.
+        """
+        if self._encoder is None:
+            self._encoder = tiktoken.get_encoding(self.encoding_name)
+        return self._encoder
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """
+        Estimates the tokens in a text as one per four characters.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        return (len(text) + 3) // 4
+
+    def count_text(self, text: str) -> int:
+        """
+        Counts the tokens in one text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            int: The number of tokens.
         """
-        Constructs the TokenCounter object and initializes the encoder.
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts) -> list:
+        """
+        Counts the tokens in several texts, encoding the uncached ones in one batch.
 
         Args:
-            model (str): The model name to use for token encoding.
-                        Note: tiktoken does not directly support "gpt-4o-mini" at the moment,
-                        so "cl100k_base" is used as a workaround.
+            texts (list): The texts.
+
+        Returns:
+            list: The number of tokens in each text, in order.
         """
-        self.encoder = tiktoken.get_encoding("cl100k_base")
+        if self.approximate:
+            return [self.estimate(text) for text in texts]
+
+        keys = [
+            hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            for text in texts
+        ]
+        counts = [None] * len(texts)
+        pending = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                count = self._cache.get(key)
+                if count is None:
+                    pending.setdefault(key, []).append(position)
+                else:
+                    self._cache.move_to_end(key)
+                    counts[position] = count
+            self.hits += len(texts) - len(pending)
+            self.misses += len(pending)
+
+        if pending:
+            encoded = self._encode_lengths(
+                [texts[positions[0]] for positions in pending.values()]
+            )
+            with self._lock:
+                for (key, positions), count in zip(pending.items(), encoded):
+                    for position in positions:
+                        counts[position] = count
+                    if self.cache_size:
+                        self._cache[key] = count
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def _encode_lengths(self, texts):
+        encode_batch = getattr(self.encoder, "encode_ordinary_batch", None)
+        if encode_batch is not None and len(texts) > 1:
+            return [
+                len(tokens)
+                for tokens in encode_batch(texts, num_threads=self.num_threads)
+            ]
+        encode = getattr(self.encoder, "encode_ordinary", self.encoder.encode)
+        return [len(encode(text)) for text in texts]
 
     def count_tokens(self, messages):
         """
-        Counts the total number of tokens in a list of messages.
+        Counts the tokens a list of chat messages uses, including the chat format's
+        overhead.
+
+        Every message costs its content and role plus a fixed framing overhead,
+        and the request as a whole costs the tokens that prime the reply.
 
         Args:
             messages (list): A list of message dicts containing the "content" key.
 
         Returns:
-            int: The total number of tokens in all the messages.
+            int: The total number of prompt tokens.
         """
-        total_tokens = 0
+        if not messages:
+            return 0
+        texts = []
         for message in messages:
-            total_tokens += len(self.encoder.encode(message["content"]))
-        return total_tokens
-
+            texts.append(message.get("content") or "")
+            texts.append(message.get("role") or "")
+        return (
+            sum(self.count_batch(texts))
+            + MESSAGE_OVERHEAD_TOKENS * len(messages)
+            + REPLY_PRIMING_TOKENS
+        )
@@ -0,0 +1,393 @@
+import atexit
+import contextvars
+import functools
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+from .logging import BatchQueueListener, RecordQueueHandler
+
+_agent = contextvars.ContextVar("trace_agent", default=None)
+_call = contextvars.ContextVar("trace_call", default=None)
+_writers = {}
+_writer_refs = {}
+_writers_lock = threading.Lock()
+
+
+def traced(method):
+    """
+    Marks an async agent method as an entry point.
+
+    Completions made inside it are attributed to the agent, keeping the
+    outermost agent's name for nested entry points. When the agent's client
+    has a metrics registry, every call's latency and errors are recorded
+    under the agent and method names.
+
+    Args:
+        method (Callable): The async method to wrap.
+
+    Returns:
+        Callable: The wrapped method.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        agent = type(self).__name__
+        token = _agent.set(agent) if _agent.get() is None else None
+        metrics = getattr(getattr(self, "openai_client", None), "metrics", None)
+        if metrics is not None:
+            metrics.add("agentm_agent_calls_in_flight", 1, agent=agent)
+        started = time.perf_counter()
+        error = None
+        try:
+            return await method(self, *args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if metrics is not None:
+                metrics.add("agentm_agent_calls_in_flight", -1, agent=agent)
+                metrics.record_agent_call(
+                    agent, method.__name__, time.perf_counter() - started, error
+                )
+            if token is not None:
+                _agent.reset(token)
+    return wrapper
+
+
+def current_agent():
+    """
+    Returns the name of the agent whose entry point the current task is running, or
+    None.
+    """
+    return _agent.get()
+
+
+def new_call():
+    """
+    Returns an empty record of one completion's details.
+
+    Returns:
+        dict: "requests", "prompt_tokens", "completion_tokens", "retries" and
+        "cache_hit".
+    """
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "retries": 0,
+        "cache_hit": False,
+    }
+
+
+def start_call():
+    """
+    Starts collecting the details of one completion in the current task.
+
+    Returns:
+        Tuple[dict, contextvars.Token]: The details, filled in by the note_* functions,
+        and the token to pass to `end_call`.
+    """
+    call = new_call()
+    return call, _call.set(call)
+
+
+def end_call(token):
+    """
+    Stops collecting completion details started by `start_call`.
+    """
+    _call.reset(token)
+
+
+def note_usage(usage):
+    """
+    Adds an API response's token usage to the completion being traced, if any.
+    """
+    call = _call.get()
+    if call is not None:
+        call["requests"] += 1
+        if usage is not None:
+            call["prompt_tokens"] += usage.prompt_tokens or 0
+            call["completion_tokens"] += usage.completion_tokens or 0
+
+
+def note_retry():
+    """
+    Counts a retry against the completion being traced, if any.
+    """
+    call = _call.get()
+    if call is not None:
+        call["retries"] += 1
+
+
+def note_cache_hit():
+    """
+    Marks the completion being traced, if any, as answered from the cache.
+    """
+    call = _call.get()
+    if call is not None:
+        call["cache_hit"] = True
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, separators=(",", ":"), ensure_ascii=False)
+
+
+def _gzip_rotator(source, destination):
+    with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class _BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    A rotating file handler that leaves flushing to its listener and tracks the file
+    size itself.
+
+    The stock handler seeks to the end of the file before every record to
+    decide whether to rotate, which flushes the write buffer each time.
+    """
+
+    def _open(self):
+        stream = super()._open()
+        self._size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def emit(self, record):
+        try:
+            message = self.format(record) + self.terminator
+            size = len(message.encode(self.encoding or "utf-8"))
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._size and self._size + size >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(message)
+            self._size += size
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+def _writer(path, max_bytes, backup_count, compress):
+    """
+    Returns the process-wide queue-backed trace writer for a file, starting its listener
+    on first use. Every call takes a reference that `_release_writer` gives back.
+    """
+    key = os.path.abspath(path)
+    with _writers_lock:
+        _writer_refs[key] = _writer_refs.get(key, 0) + 1
+        writer = _writers.get(key)
+        if writer is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = _BatchRotatingFileHandler(
+                path,
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+            handler.setFormatter(_JsonFormatter())
+            if compress:
+                handler.namer = lambda name: name + ".gz"
+                handler.rotator = _gzip_rotator
+            listener = BatchQueueListener(queue.Queue(), handler)
+            listener.start()
+            atexit.register(listener.stop)
+
+            logger = logging.getLogger(f"agentm.trace.{key}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.handlers = [RecordQueueHandler(listener.queue)]
+            writer = _writers[key] = (logger, listener)
+        return writer
+
+
+def _release_writer(path):
+    """
+    Gives back a reference taken by `_writer`, stopping the listener and closing the
+    file once no sink uses it.
+    """
+    key = os.path.abspath(path)
+    with _writers_lock:
+        _writer_refs[key] -= 1
+        if _writer_refs[key]:
+            return
+        del _writer_refs[key]
+        _, listener = _writers.pop(key)
+    atexit.unregister(listener.stop)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+class TraceSink:
+    """
+    Writes one compact JSON line per completion, for offline throughput and cost
+    analysis.
+
+    Records are queued and written in batches by a background thread, like
+    log records. Every sink for the same file shares that thread, and records
+    still queued at exit are written before the process ends. The file
+    rotates once it reaches `max_bytes`, keeping `backup_count` old files,
+    which are gzipped when `compress` is set. With head sampling the
+    decision to trace is made before the request, so unsampled requests do no
+    tracing work at all. With tail sampling every request is measured and the
+    decision is made on the outcome: errors, retried requests and requests
+    slower than `slow_ms` are always kept, and the rest are kept at `sample_rate`.
+
+    Attributes:
+        path (str): The trace file.
+        sample_rate (float): The fraction of (ordinary, for tail sampling) completions
+            kept.
+        sampling (str): "head" or "tail".
+        slow_ms (float): The latency from which tail sampling keeps every completion, or
+            None.
+        written (int): Records queued for writing.
+        dropped (int): Records discarded by tail sampling.
+
+    Methods:
+        from_settings(settings): Builds a sink from a settings dict, if enabled.
+        sample(): Decides whether to trace a completion before it starts.
+        record(record): Writes a completion record, subject to tail sampling.
+        flush(): Waits until every queued record has been written.
+        close(): Flushes and releases the trace file, closing it with its last sink.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_bytes=10_000_000,
+        backup_count=5,
+        compress=False,
+        sample_rate=1.0,
+        sampling="head",
+        slow_ms=None,
+        random_source=random.random,
+    ):
+        """
+        Constructs the TraceSink object, starting the file's writer thread if no other
+        sink has.
+
+        Args:
+            path (str): The trace file. Its directory is created if needed.
+            max_bytes (int): The size at which the file rotates, or 0 to never rotate.
+                Only the first sink opened for a file sets this and the next two
+                options.
+            backup_count (int): The number of rotated files kept.
+            compress (bool): Whether rotated files are gzipped.
+            sample_rate (float): The fraction of completions kept.
+            sampling (str): "head" to decide before a request, "tail" to decide on its
+                outcome.
+            slow_ms (float): With tail sampling, completions at least this slow are
+                always kept.
+            random_source (Callable): Returns a float in [0, 1).
+
+        Raises:
+            ValueError: If sampling is neither "head" nor "tail".
+        """
+        if sampling not in ("head", "tail"):
+            raise ValueError('sampling must be "head" or "tail".')
+        self.path = path
+        self.sample_rate = sample_rate
+        self.sampling = sampling
+        self.slow_ms = slow_ms
+        self.random_source = random_source
+        self.written = 0
+        self.dropped = 0
+
+        self._logger, self._listener = _writer(path, max_bytes, backup_count, compress)
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Builds a sink from the "trace_path", "trace_max_bytes", "trace_backup_count",
+        "trace_compress", "trace_sample_rate", "trace_sampling" and "trace_slow_ms"
+        settings.
+
+        Args:
+            settings (dict): The loaded settings.
+
+        Returns:
+            TraceSink: The configured sink, or None when "trace_path" is not set.
+        """
+        path = settings.get("trace_path")
+        if not path:
+            return None
+        return cls(
+            path,
+            max_bytes=settings.get("trace_max_bytes", 10_000_000),
+            backup_count=settings.get("trace_backup_count", 5),
+            compress=settings.get("trace_compress", False),
+            sample_rate=settings.get("trace_sample_rate", 1.0),
+            sampling=settings.get("trace_sampling", "head"),
+            slow_ms=settings.get("trace_slow_ms"),
+        )
+
+    def sample(self) -> bool:
+        """
+        Decides whether to trace a completion before it starts.
+
+        Returns:
+            bool: False only when head sampling skips the completion.
+        """
+        return (
+            self.sampling == "tail"
+            or self.sample_rate >= 1
+            or self.random_source() < self.sample_rate
+        )
+
+    def record(self, record: dict):
+        """
+        Queues a completion record for writing, unless tail sampling drops it.
+
+        Args:
+            record (dict): The record; "error", "retries" and "latency_ms" drive tail
+                sampling.
+        """
+        if self.sampling == "tail" and not self._keep(record):
+            self.dropped += 1
+            return
+        self.written += 1
+        self._logger.info(record)
+
+    def _keep(self, record):
+        if record.get("error") or record.get("retries"):
+            return True
+        if self.slow_ms is not None and record.get("latency_ms", 0) >= self.slow_ms:
+            return True
+        return self.sample_rate >= 1 or self.random_source() < self.sample_rate
+
+    def flush(self):
+        """
+        Waits until every queued record has been written and flushed.
+        """
+        self._listener.queue.join()
+        self._listener.flush_handlers()
+
+    def close(self):
+        """
+        Flushes this sink's records and releases the trace file. The file's writer
+        thread stops, and the file is closed, once every sink for it has been closed.
+        The sink cannot be used afterwards; closing it again does nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        _release_writer(self.path)
@@ -0,0 +1,50 @@
+import json
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class FakeClock:
+    """
+    A clock that only moves when a test sets `now` or awaits `sleep`.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def write_settings(tmp_path):
+    """
+    Returns a function that writes a settings file with the given overrides and returns
+    its path. Logs go under tmp_path, so tests never write to the repository.
+    """
+    def write(**settings):
+        path = tmp_path / "settings.json"
+        path.write_text(json.dumps({
+            "openai_api_key": "sk-test-key",
+            "log_path": str(tmp_path / "logs" / "error.log"),
+            **settings,
+        }))
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def settings_path(write_settings):
+    return write_settings()
+
@@ -0,0 +1,107 @@
+import pytest
+from openai import InternalServerError, RateLimitError
+from core.backends import ChatBackend, Latency, MockBackend
+from core.filter_list_agent import FilterListAgent, FilterListInput
+from core.openai_api import OpenAIClient
+from core.retry import RetryPolicy
+
+
+def messages(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.mark.anyio
+async def test_script_then_rules_then_echo():
+    scripted = MockBackend(script=["first", "last"])
+    ruled = MockBackend(
+        rules=[
+            (r"item (\d+)", lambda messages, match: f"saw {match.group(1)}"),
+            ("hello", "hi"),
+        ]
+    )
+
+    replies = [await scripted.create("m", messages("x"), 10) for _ in range(3)]
+
+    assert [reply.choices[0].message.content for reply in replies] == [
+        "first",
+        "last",
+        "last",
+    ]
+    assert (await ruled.create("m", messages("item 7"), 10)).choices[
+        0
+    ].message.content == "saw 7"
+    assert (await ruled.create("m", messages("hello there"), 10)).choices[
+        0
+    ].message.content == "hi"
+    echoed = await ruled.create("m", messages("anything"), 10)
+    assert echoed.choices[0].message.content == "anything"
+    assert echoed.usage.prompt_tokens > 0 and echoed.usage.completion_tokens == 2
+
+
+def test_backends_must_implement_create():
+    class Incomplete(ChatBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_latency_distributions_are_seeded():
+    import random
+    lognormal = Latency.lognormal(median=0.5, sigma=0.5)
+    heavy = Latency.heavy_tail(minimum=0.1, alpha=1.2, cap=5.0)
+
+    first = [lognormal.sample(random.Random(3)) for _ in range(3)]
+    samples = [heavy.sample(random.Random(seed)) for seed in range(200)]
+
+    assert first == [lognormal.sample(random.Random(3))] * 3
+    assert Latency.fixed(0.25).sample(random.Random()) == 0.25
+    assert min(samples) >= 0.1 and max(samples) <= 5.0
+    assert (
+        Latency.from_settings({"kind": "lognormal", "median": 0.2}).kind == "lognormal"
+    )
+
+
+@pytest.mark.anyio
+async def test_injected_errors_and_rate_limits(clock):
+    failing = MockBackend(error_rates={503: 1.0}, clock=clock, sleep=clock.sleep)
+    limited = MockBackend(
+        requests_per_minute=2,
+        latency=Latency.fixed(1.0),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    with pytest.raises(InternalServerError):
+        await failing.create("m", messages("x"), 10)
+    await limited.create("m", messages("x"), 10)
+    await limited.create("m", messages("x"), 10)
+    with pytest.raises(RateLimitError) as error:
+        await limited.create("m", messages("x"), 10)
+
+    assert RetryPolicy().retry_after(error.value) == pytest.approx(58.0)
+    clock.now += 60
+    await limited.create("m", messages("x"), 10)
+    assert limited.stats() == {"requests": 4, "completed": 3, "errors": {429: 1}}
+
+
+@pytest.mark.anyio
+async def test_agent_runs_against_the_mock_configured_in_settings(write_settings):
+    settings_path = write_settings(retry_base_delay=0.001, mock_backend={
+        "rules": [["Chips", '{"explanation": "Fried.", "remove_item": true}'],
+                  [".", '{"explanation": "Fine.", "remove_item": false}']],
+        "error_rates": {"429": 0.3},
+        "seed": 7,
+    })
+    client = OpenAIClient(settings_path)
+    agent = FilterListAgent(
+        FilterListInput(
+            goal="Remove unhealthy snacks.", items_to_filter=["Apple", "Chips"]
+        ),
+        openai_client=client,
+    )
+
+    results = await agent.filter()
+
+    assert [result["remove_item"] for result in results] == [False, True]
+    assert isinstance(client.backend, MockBackend)
@@ -0,0 +1,143 @@
+import json
+import pytest
+from core.batching import BatchCompleter
+from core.binary_classify_list_agent import (
+    BinaryClassifyListAgent,
+    BinaryClassifyListInput,
+)
+from core.chunking import WordEncoder
+from core.map_list_agent import MapListAgent, MapListInput
+from core.openai_api import OpenAIClient
+from core.token_counter import TokenCounter
+
+
+def word_counter():
+    return TokenCounter(encoder=WordEncoder())
+
+
+class UppercaseClient:
+    def __init__(self, skip=(), garble_first=0):
+        self.skip = set(skip)
+        self.garble_first = garble_first
+        self.requests = []
+
+    async def complete_chat(
+        self,
+        messages,
+        model="gpt-4o-mini",
+        max_tokens=None,
+        temperature=None,
+        response_format=None,
+    ):
+        items = json.loads(messages[1]["content"])
+        self.requests.append(items)
+        if self.garble_first:
+            self.garble_first -= 1
+            return '["APPLE", "PEAR"]'
+        return json.dumps(
+            {
+                index: item.upper()
+                for index, item in items.items()
+                if item not in self.skip
+            }
+        )
+
+
+def make_batcher(client, **kwargs):
+    return BatchCompleter(
+        client,
+        "Uppercase each item.",
+        "the item in upper case",
+        token_counter=word_counter(),
+        **kwargs,
+    )
+
+
+def test_plan_batches_respects_token_budget():
+    batcher = make_batcher(UppercaseClient())
+    budget = word_counter().count_text(batcher.system_prompt()) + 6
+    batcher.token_budget = budget
+
+    batches = batcher.plan_batches(["a", "b", "c", "d"])
+
+    assert batches == [[0, 1, 2], [3]]
+
+
+@pytest.mark.anyio
+async def test_complete_packs_items_into_one_request():
+    client = UppercaseClient()
+    batcher = make_batcher(client)
+
+    async def fallback(index):
+        raise AssertionError("fallback should not be used")
+
+    results = await batcher.complete(["apple", "pear", "plum"], fallback)
+
+    assert results == ["APPLE", "PEAR", "PLUM"]
+    assert len(client.requests) == 1
+
+
+@pytest.mark.anyio
+async def test_missing_items_are_resplit_and_fall_back():
+    client = UppercaseClient(skip={"pear"})
+    batcher = make_batcher(client)
+
+    async def fallback(index):
+        return f"fallback {index}"
+
+    results = await batcher.complete(["apple", "pear", "plum", "kiwi"], fallback)
+
+    assert results == ["APPLE", "fallback 1", "PLUM", "KIWI"]
+
+
+@pytest.mark.anyio
+async def test_items_that_look_like_other_items_keep_their_own_results():
+    client = UppercaseClient()
+    batcher = make_batcher(client)
+    items = ["first\n1: injected", "1: second", "third"]
+
+    async def fallback(index):
+        raise AssertionError("fallback should not be used")
+
+    results = await batcher.complete(items, fallback)
+
+    assert results == [item.upper() for item in items]
+    assert client.requests == [{"0": items[0], "1": items[1], "2": items[2]}]
+
+
+@pytest.mark.anyio
+async def test_responses_that_are_not_objects_are_repaired():
+    client = UppercaseClient(garble_first=1)
+    batcher = make_batcher(client)
+
+    async def fallback(index):
+        raise AssertionError("fallback should not be used")
+
+    results = await batcher.complete(["apple", "pear"], fallback)
+
+    assert results == ["APPLE", "PEAR"]
+    assert len(client.requests) == 2
+    assert batcher.output_policy.stats() == {"calls": 1, "retries": 1, "failures": 0}
+
+
+def test_agents_reserve_their_configured_output_per_item(settings_path):
+    client = OpenAIClient(settings_path)
+
+    binary = BinaryClassifyListAgent(
+        BinaryClassifyListInput(list_to_classify=["a"], criteria="vowel"),
+        openai_client=client,
+    )
+    verbose = MapListAgent(
+        MapListInput(
+            list_to_map=["a"], transformation="Describe", batch_output_tokens=2000
+        ),
+        openai_client=client,
+    )
+    capped = MapListAgent(
+        MapListInput(list_to_map=["a"], transformation="Describe", max_tokens=50),
+        openai_client=client,
+    )
+
+    assert binary._batcher().output_tokens_per_item == 10
+    assert verbose._batcher().output_tokens_per_item == 1000
+    assert capped._batcher().output_tokens_per_item == 50
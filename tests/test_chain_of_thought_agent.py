@@ -0,0 +1,22 @@
+import pytest
+from core.backends import MockBackend
+from core.chain_of_thought_agent import ChainOfThoughtAgent, ChainOfThoughtInput
+from core.openai_api import OpenAIClient
+from core.response_cache import ResponseCache
+
+
+@pytest.mark.anyio
+async def test_chain_of_thought_stream_matches_the_complete_answer(settings_path):
+    backend = MockBackend(script=["6 times 7 is 42."])
+    client = OpenAIClient(
+        settings_path, cache=ResponseCache(path=None), backend=backend
+    )
+    agent = ChainOfThoughtAgent(
+        ChainOfThoughtInput(question="What is 6 times 7?"), openai_client=client
+    )
+
+    deltas = [delta async for delta in agent.chain_of_thought_stream()]
+
+    assert deltas == ["6", " times", " 7", " is", " 42."]
+    assert await agent.chain_of_thought() == "".join(deltas)
+    assert backend.requests == 1
@@ -0,0 +1,56 @@
+import pytest
+from core.chunking import TextChunker, WordEncoder
+
+
+def test_chunks_overlap_and_record_offsets():
+    text = "one two three four five six seven"
+    chunker = TextChunker(chunk_tokens=3, overlap_tokens=1, encoder=WordEncoder())
+
+    chunks = chunker.split(text)
+
+    assert [chunk.text.split() for chunk in chunks] == [
+        ["one", "two", "three"], ["three", "four", "five"], ["five", "six", "seven"]
+    ]
+    assert all(text[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+    assert [chunk.index for chunk in chunks] == [0, 1, 2]
+
+
+def test_short_and_empty_text():
+    chunker = TextChunker(chunk_tokens=10, overlap_tokens=2, encoder=WordEncoder())
+
+    assert chunker.split("") == []
+    assert [chunk.text for chunk in chunker.split("just a few words")] == [
+        "just a few words"
+    ]
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_tokens=5, overlap_tokens=5)
+
+
+class StrictSpecialTokenEncoder(WordEncoder):
+    """Mimics tiktoken: `encode` rejects special tokens, `encode_ordinary` does not."""
+
+    def encode(self, text):
+        if "<|endoftext|>" in text:
+            raise ValueError(
+                "Encountered text corresponding to disallowed special token "
+                "'<|endoftext|>'."
+            )
+        return super().encode(text)
+
+    def encode_ordinary(self, text):
+        return super().encode(text)
+
+
+def test_special_token_text_is_chunked_as_plain_text():
+    text = "a document that mentions <|endoftext|> in its body"
+    chunker = TextChunker(
+        chunk_tokens=4, overlap_tokens=1, encoder=StrictSpecialTokenEncoder()
+    )
+
+    chunks = chunker.split(text)
+
+    assert any("<|endoftext|>" in chunk.text for chunk in chunks)
+    assert text.endswith(chunks[-1].text)
@@ -1,4 +1,10 @@
-from core.compose_prompt import compose_prompt
+import pytest
+from core.classify_list_agent import ClassifyListAgent, ClassifyListInput
+from core.filter_list_agent import FilterListAgent, FilterListInput
+from core.summarize_list_agent import SummarizeListAgent, SummarizeListInput
+from core.chunking import WordEncoder
+from core.compose_prompt import PromptLayout, PromptTemplate, compose_prompt
+from core.token_counter import MESSAGE_OVERHEAD_TOKENS
 
 
 def test_compose_prompt():
@@ -8,3 +14,127 @@ def test_compose_prompt():
     result = compose_prompt(template, variables)
 
     assert result == "Hello, John!"
+
+
+def test_prompt_layout_keeps_shared_variables_in_the_prefix():
+    layout = PromptLayout(
+        "Classify by: {{criteria}}", "Item: {{item}}", {"criteria": "is it a fruit"}
+    )
+
+    first = layout.messages(layout.user_prompt({"item": "Apple"}))
+    second = layout.messages(layout.user_prompt({"item": "Carrot"}))
+
+    assert (
+        first[0]
+        == second[0]
+        == {"role": "system", "content": "Classify by: is it a fruit"}
+    )
+    assert first[1] == {"role": "user", "content": "Item: Apple"}
+
+
+def test_prompt_layout_rejects_shared_variables_in_the_item_template():
+    with pytest.raises(ValueError):
+        PromptLayout(
+            "Classify items.",
+            "Classify {{item}} by {{criteria}}",
+            {"criteria": "colour"},
+        )
+
+
+def test_prompt_layout_counts_the_shared_prefix():
+    layout = PromptLayout("one two three", "four five {{item}}")
+
+    assert (
+        layout.prefix_tokens(WordEncoder())
+        == 3 + MESSAGE_OVERHEAD_TOKENS + MESSAGE_OVERHEAD_TOKENS + 2
+    )
+
+
+def test_classify_agent_shares_its_criteria_across_items():
+    data = ClassifyListInput(
+        list_to_classify=["Apple", "Carrot"],
+        classification_criteria="fruit or vegetable",
+    )
+    agent = ClassifyListAgent(data, openai_client=object())
+
+    first, second = (
+        agent.layout.messages(agent._user_prompt(item))
+        for item in data.list_to_classify
+    )
+
+    assert first[0] == second[0]
+    assert "fruit or vegetable" in first[0]["content"]
+    assert "fruit or vegetable" not in first[1]["content"]
+
+
+@pytest.mark.parametrize("batch_mode", [False, True])
+def test_list_agents_report_their_shared_prefix(batch_mode):
+    encoder = WordEncoder()
+    agents = [
+        FilterListAgent(
+            FilterListInput(
+                goal="Keep fruit", items_to_filter=["Apple"], batch_mode=batch_mode
+            ),
+            openai_client=object(),
+        ),
+        SummarizeListAgent(
+            SummarizeListInput(list_to_summarize=["Apple"], batch_mode=batch_mode),
+            openai_client=object(),
+        ),
+        ClassifyListAgent(
+            ClassifyListInput(
+                list_to_classify=["Apple"],
+                classification_criteria="fruit",
+                batch_mode=batch_mode,
+            ),
+            openai_client=object(),
+        ),
+    ]
+
+    for agent in agents:
+        system_prompt = (
+            agent._batcher().system_prompt()
+            if batch_mode
+            else agent.layout.prefix[0]["content"]
+        )
+        assert (
+            agent.prefix_tokens(encoder)
+            >= len(encoder.encode(system_prompt)) + MESSAGE_OVERHEAD_TOKENS
+        )
+
+
+def test_filter_agent_shares_its_goal_across_items():
+    agent = FilterListAgent(
+        FilterListInput(goal="Keep fruit", items_to_filter=["Apple"]),
+        openai_client=object(),
+    )
+
+    assert agent._system_prompt() == agent.layout.prefix[0]["content"]
+    assert "Keep fruit" in agent._system_prompt()
+    assert agent._user_prompt(0, "Apple").startswith("Item 1: Apple.")
+
+
+def test_prompt_template_matches_compose_prompt():
+    template = "Item {{ index }}: {{item}} ({{missing}}) {{item}}"
+    variables = {"index": 3, "item": "Apple"}
+
+    compiled = PromptTemplate(template)
+
+    assert compiled.variables == ["index", "item", "missing", "item"]
+    assert (
+        compiled.render(variables)
+        == compose_prompt(template, variables)
+        == "Item 3: Apple () Apple"
+    )
+    assert compiled.missing_variables(variables) == ["missing"]
+
+
+def test_prompt_template_renders_many_and_counts_static_tokens():
+    compiled = PromptTemplate("Classify {{item}} as a fruit or vegetable.")
+
+    assert compiled.render_many([{"item": "Apple"}, {"item": "Carrot"}]) == [
+        "Classify Apple as a fruit or vegetable.",
+        "Classify Carrot as a fruit or vegetable.",
+    ]
+    assert PromptTemplate("No slots here.").render({}) == "No slots here."
+    assert compiled.static_tokens(WordEncoder()) == 6
@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from core import token_counter
+from core.chunking import WordEncoder
+from core.concurrency import (
+    RateLimitScheduler,
+    SingleFlight,
+    TokenBucket,
+    stream_bounded,
+)
+from core.token_counter import TokenCounter
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(capacity=60, rate=1, clock=clock)
+
+    bucket.consume(60)
+    assert bucket.time_until(10) == pytest.approx(10)
+
+    clock.now = 10
+    assert bucket.time_until(10) == 0
+
+
+def test_token_bucket_clamps_oversized_requests(clock):
+    bucket = TokenBucket(capacity=100, rate=10, clock=clock)
+
+    assert bucket.time_until(1000) == 0
+
+
+@pytest.mark.anyio
+async def test_scheduler_limits_concurrency():
+    scheduler = RateLimitScheduler(max_concurrent_requests=2)
+    in_flight = 0
+    peak = 0
+
+    async def work():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    await asyncio.gather(*(scheduler.call_function(work) for _ in range(6)))
+
+    assert peak == 2
+
+
+@pytest.mark.anyio
+async def test_scheduler_refunds_unused_tokens():
+    scheduler = RateLimitScheduler(tokens_per_minute=1000)
+
+    async with scheduler.reserve(600) as reservation:
+        reservation.used_tokens = 100
+
+    assert scheduler.token_bucket.tokens == pytest.approx(900, abs=1)
+
+
+def test_scheduler_estimates_with_the_requested_models_encoding(monkeypatch):
+    monkeypatch.setitem(
+        token_counter._shared_counters,
+        "gpt-3.5-turbo",
+        TokenCounter(encoder=WordEncoder()),
+    )
+    scheduler = RateLimitScheduler(tokens_per_minute=1000)
+    messages = [{"role": "user", "content": "one two three"}]
+
+    assert (
+        scheduler.estimate_tokens(messages, 10, model="gpt-3.5-turbo")
+        == 3 + 1 + 3 + 3 + 10
+    )
+
+
+@pytest.mark.anyio
+async def test_single_flight_shares_in_flight_calls():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def work(value):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        single_flight.call_function("a", work, 1),
+        single_flight.call_function("a", work, 1),
+        single_flight.call_function("b", work, 2),
+    )
+
+    assert results == [1, 1, 2]
+    assert calls == 2
+    assert single_flight.shared == 1
+
+
+@pytest.mark.anyio
+async def test_stream_bounded_yields_every_result_with_bounded_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def work(index, item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001 * (5 - index % 5))
+        in_flight -= 1
+        return item * 2
+
+    results = {}
+    async for index, result in stream_bounded(work, iter(range(20)), max_concurrency=3):
+        results[index] = result
+
+    assert results == {i: i * 2 for i in range(20)}
+    assert peak == 3
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("max_concurrency", [0, -1])
+async def test_stream_bounded_rejects_a_limit_below_one(max_concurrency):
+    async def work(index, item):
+        return item
+
+    with pytest.raises(ValueError):
+        async for _ in stream_bounded(work, [1, 2], max_concurrency=max_concurrency):
+            pass
+
+
+@pytest.mark.anyio
+async def test_stream_bounded_reads_items_lazily():
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    async def work(index, item):
+        return item
+
+    stream = stream_bounded(work, items(), max_concurrency=2)
+    async for index, result in stream:
+        break
+    await stream.aclose()
+
+    assert len(consumed) <= 3
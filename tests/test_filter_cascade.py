@@ -0,0 +1,85 @@
+import json
+import pytest
+from core.filter_cascade import FilterCascade, RuleStage, SimilarityStage
+from core.filter_list_agent import FilterListAgent, FilterListInput
+
+
+def snack_cascade():
+    return FilterCascade(
+        [
+            RuleStage(keep=["Apple"], remove=["chips"], remove_patterns=[r"\bcandy\b"]),
+            SimilarityStage(
+                keep_exemplars=["fresh carrot sticks"],
+                remove_exemplars=["chocolate bar"],
+            ),
+        ]
+    )
+
+
+def test_rule_stage_matches_exact_items_and_patterns():
+    stage = RuleStage(keep=["Apple"], remove=["Chips"], remove_patterns=[r"\bcandy\b"])
+
+    assert stage.decide(" apple ")["remove_item"] is False
+    assert stage.decide("CHIPS")["remove_item"] is True
+    assert stage.decide("Cotton candy")["remove_item"] is True
+    assert stage.decide("Orange") is None
+
+
+def test_similarity_stage_leaves_ambiguous_items_undecided():
+    stage = SimilarityStage(
+        keep_exemplars=["fresh carrot sticks"], remove_exemplars=["chocolate bar"]
+    )
+
+    assert stage.decide("carrot sticks")["remove_item"] is False
+    assert stage.decide("dark chocolate bar")["remove_item"] is True
+    assert stage.decide("granola") is None
+
+
+def test_similarity_stage_accepts_an_embedding_function():
+    def embed(texts):
+        return [[1.0, 0.0] if "sweet" in text else [0.0, 1.0] for text in texts]
+
+    stage = SimilarityStage(
+        keep_exemplars=["crunchy"], remove_exemplars=["sweet"], embed=embed
+    )
+
+    assert stage.decide("very sweet")["remove_item"] is True
+    assert stage.decide("salty")["remove_item"] is False
+
+
+def test_cascade_partitions_items_and_counts_per_stage():
+    cascade = snack_cascade()
+    decided, undecided = cascade.partition(
+        ["Apple", "Chips", "carrot sticks", "Granola", "Orange"]
+    )
+
+    assert sorted(decided) == [0, 1, 2]
+    assert decided[2]["stage"] == "similarity"
+    assert undecided == [3, 4]
+    assert cascade.stats() == {"rules": 2, "similarity": 1, "undecided": 2}
+
+
+class KeepEverythingClient:
+    def __init__(self):
+        self.prompts = []
+
+    async def complete_chat(
+        self, messages, max_tokens=None, temperature=None, response_format=None
+    ):
+        self.prompts.append(messages[-1]["content"])
+        return json.dumps({"explanation": "Looks fine.", "remove_item": False})
+
+
+@pytest.mark.anyio
+async def test_filter_list_sends_only_undecided_items_to_the_llm():
+    client = KeepEverythingClient()
+    data = FilterListInput(
+        goal="Remove unhealthy snacks.", items_to_filter=["Apple", "Chips", "Granola"]
+    )
+    agent = FilterListAgent(data, openai_client=client, prefilter=snack_cascade())
+
+    results = await agent.filter()
+
+    assert [result["remove_item"] for result in results] == [False, True, False]
+    assert len(client.prompts) == 1
+    assert client.prompts[0].startswith("Item 3: Granola.")
@@ -0,0 +1,68 @@
+import json
+import pytest
+from core.backends import MockBackend
+from core.generate_object_agent import GenerateObjectAgent, ObjectGenerationInput
+from core.openai_api import OpenAIClient
+
+
+def grows(previous, current):
+    if isinstance(previous, dict):
+        return isinstance(current, dict) and all(
+            key in current and grows(value, current[key])
+            for key, value in previous.items()
+        )
+    if isinstance(previous, list):
+        return (isinstance(current, list) and len(current) >= len(previous)
+                and all(grows(a, b) for a, b in zip(previous, current)))
+    if isinstance(previous, str):
+        return isinstance(current, str) and current.startswith(previous)
+    return previous == current
+
+
+def make_agent(settings_path, reply):
+    client = OpenAIClient(settings_path, backend=MockBackend(script=[reply]))
+    data = ObjectGenerationInput(
+        object_description="A user with a name and tags", goal="Generate a user"
+    )
+    return GenerateObjectAgent(data, openai_client=client)
+
+
+@pytest.mark.anyio
+async def test_generate_object_stream_yields_the_reply_in_order(settings_path):
+    agent = make_agent(settings_path, '{"name": "Ada Lovelace"}')
+
+    deltas = [delta async for delta in agent.generate_object_stream()]
+
+    assert deltas == ['{"name":', ' "Ada', ' Lovelace"}']
+
+
+@pytest.mark.anyio
+async def test_generate_object_partials_grow_to_the_full_object(settings_path):
+    reply = '{"name": "Ada Lovelace", "tags": ["math", "engines"], "born": 1815}'
+    agent = make_agent(settings_path, reply)
+
+    partials = [partial async for partial in agent.generate_object_partials()]
+
+    assert len(partials) > 2
+    assert all(
+        grows(previous, current) for previous, current in zip(partials, partials[1:])
+    )
+    assert all(previous != current for previous, current in zip(partials, partials[1:]))
+    assert partials[-1] == json.loads(reply)
+
+
+@pytest.mark.anyio
+async def test_generate_object_partials_repair_a_truncated_object(settings_path):
+    client = OpenAIClient(
+        settings_path,
+        backend=MockBackend(script=['{"name": "Ada', '{"name": "Ada Lovelace"}']),
+    )
+    data = ObjectGenerationInput(
+        object_description="A user with a name", goal="Generate a user"
+    )
+    agent = GenerateObjectAgent(data, openai_client=client)
+
+    partials = [partial async for partial in agent.generate_object_partials()]
+
+    assert partials[-2:] == [{"name": "Ada"}, {"name": "Ada Lovelace"}]
+    assert agent.output_policy.stats() == {"calls": 1, "retries": 0, "failures": 0}
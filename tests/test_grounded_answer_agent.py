@@ -0,0 +1,102 @@
+import json
+import re
+import pytest
+from core.chunking import WordEncoder
+from core.grounded_answer_agent import GroundedAnswerAgent, GroundedAnswerInput
+from core.retrieval import BM25Index
+
+
+class NotesClient:
+    def __init__(self):
+        self.requests = []
+
+    async def complete_chat(
+        self, messages, max_tokens=None, temperature=None, response_format=None
+    ):
+        self.requests.append(response_format["json_schema"]["name"])
+        system_prompt = messages[0]["content"]
+        if response_format["json_schema"]["name"] == "chunk_notes":
+            relevant = "Paris" in system_prompt
+            return json.dumps(
+                {
+                    "relevant": relevant,
+                    "notes": "The capital is Paris." if relevant else "",
+                }
+            )
+        cited = [int(number) for number in re.findall(r"\[(\d+)\]", system_prompt)]
+        return json.dumps(
+            {
+                "explanation": "From the notes.",
+                "answer": "Paris",
+                "citations": cited + [99],
+            }
+        )
+
+
+@pytest.mark.anyio
+async def test_long_context_mode_maps_chunks_and_cites_offsets():
+    context = (
+        " ".join(["filler"] * 20)
+        + " The capital of France is Paris. "
+        + " ".join(["filler"] * 20)
+    )
+    data = GroundedAnswerInput(
+        question="What is the capital of France?", context=context,
+        long_context_mode=True, chunk_tokens=10, chunk_overlap=2,
+    )
+    client = NotesClient()
+    agent = GroundedAnswerAgent(data, openai_client=client)
+    agent.chunker.encoder = WordEncoder()
+    chunks = agent.chunker.split(context)
+
+    result = await agent.answer()
+
+    assert result["answer"] == "Paris"
+    assert client.requests.count("chunk_notes") == len(chunks)
+    assert client.requests[-1] == "cited_answer"
+    assert result["citations"]
+    for citation in result["citations"]:
+        assert "Paris" in context[citation["start"]:citation["end"]]
+
+
+def test_chunk_settings_are_only_checked_in_long_context_mode():
+    data = GroundedAnswerInput(question="Why?", context="Because.", chunk_tokens=150)
+
+    assert GroundedAnswerAgent(data, openai_client=object()).chunker is None
+    with pytest.raises(ValueError):
+        GroundedAnswerAgent(
+            data.model_copy(update={"long_context_mode": True}), openai_client=object()
+        )
+
+
+class EchoContextClient:
+    def __init__(self):
+        self.system_prompts = []
+
+    async def complete_chat(
+        self, messages, max_tokens=None, temperature=None, response_format=None
+    ):
+        self.system_prompts.append(messages[0]["content"])
+        return json.dumps({"explanation": "From the context.", "answer": "Two"})
+
+
+@pytest.mark.anyio
+async def test_retrieval_sends_only_the_best_passages():
+    documents = [
+        (f"doc{i}", f"Document {i} talks about topic number {i}.") for i in range(50)
+    ]
+    documents.append(("mars", "Mars has two moons, Phobos and Deimos."))
+    index = BM25Index.build(documents)
+    client = EchoContextClient()
+    data = GroundedAnswerInput(
+        question="How many moons does Mars have?", retrieval_top_k=2
+    )
+    agent = GroundedAnswerAgent(data, openai_client=client, index=index)
+
+    result = await agent.answer()
+
+    assert result["answer"] == "Two"
+    assert result["passages"][0]["doc_id"] == "mars"
+    assert len(result["passages"]) <= 2
+    assert "Phobos" in client.system_prompts[0]
+    assert "Document 7" not in client.system_prompts[0]
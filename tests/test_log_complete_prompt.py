@@ -1,26 +1,60 @@
 import pytest
-import shutil
-import os
 from core.log_complete_prompt import LogCompletePrompt
+from core.logging import Logger
 
 
 @pytest.mark.anyio
-async def test_logging():
-    # Ensure the config folder exists in the test environment
-    if not os.path.exists("../config"):
-        os.makedirs("../config")
-
-    # Copy the settings.json file if it doesn't exist in the test environment
-    if not os.path.exists("../config/settings.json"):
-        shutil.copyfile("./config/settings.json", "../config/settings.json")
+@pytest.mark.parametrize("anyio_backend", ["asyncio", "trio"])
+async def test_logging(settings_path):
+    # The settings fixture logs to a temporary folder, so the test leaves the tree
+    # untouched
 
     # Define a mock completion function
     async def mock_complete_prompt(*args, **kwargs):
         return {"completed": True, "value": "Success"}
 
     # Initialize LogCompletePrompt
-    log_prompt = LogCompletePrompt(mock_complete_prompt)
+    log_prompt = LogCompletePrompt(mock_complete_prompt, settings_path)
     result = await log_prompt.complete_prompt()
 
     # Assert the completion result
     assert result["completed"] is True
+
+
+def test_logger_writes_in_the_background_and_skips_disabled_levels(
+    tmp_path, write_settings, capsys
+):
+    log_path = tmp_path / "logs" / "agent.log"
+    logger = Logger(write_settings(log_path=str(log_path), log_level="INFO"))
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError("a disabled record was formatted")
+
+    logger.debug("Never formatted: %s", Expensive())
+    for index in range(250):
+        logger.info("Item %d done", index)
+    logger.error("Failed: %s", "boom")
+    logger.flush()
+
+    lines = log_path.read_text().splitlines()
+    assert len(lines) == 251
+    assert lines[0].endswith("INFO - Item 0 done")
+    assert lines[-1].endswith("ERROR - Failed: boom")
+    assert capsys.readouterr().out == ""
+
+
+def test_logger_formats_arguments_when_the_record_is_queued(tmp_path, write_settings):
+    log_path = tmp_path / "logs" / "mutable.log"
+    logger = Logger(write_settings(log_path=str(log_path), log_level="INFO"))
+
+    decisions = {"0": "BEFORE"}
+    logger.info("Decisions: %s", decisions)
+    decisions["0"] = "AFTER"
+    logger.flush()
+
+    assert (
+        log_path.read_text()
+        .splitlines()[-1]
+        .endswith("INFO - Decisions: {'0': 'BEFORE'}")
+    )
@@ -0,0 +1,97 @@
+import urllib.request
+import pytest
+from core.backends import Latency, MockBackend
+from core.map_list_agent import MapListAgent, MapListInput
+from core.metrics import Histogram, MetricsRegistry, start_prometheus_server
+from core.openai_api import OpenAIClient, track_usage
+from core.token_counter import TokenCounter
+
+
+def test_histogram_quantiles_are_close():
+    histogram = Histogram()
+    for millisecond in range(1, 1001):
+        histogram.observe(millisecond / 1000)
+
+    assert histogram.quantile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.quantile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.quantile(1.0) == 1.0
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_snapshot_and_prometheus_text():
+    registry = MetricsRegistry()
+    registry.inc("agentm_completions_total", agent="A", model="m")
+    registry.inc("agentm_completions_total", 2, agent="A", model="m")
+    registry.add("agentm_completions_in_flight", 1, model="m")
+    registry.observe("agentm_completion_latency_seconds", 0.2, agent="A", model="m")
+
+    snapshot = registry.snapshot()
+    text = registry.to_prometheus()
+
+    assert snapshot["counters"]['agentm_completions_total{agent="A",model="m"}'] == 3
+    assert snapshot["gauges"]['agentm_completions_in_flight{model="m"}'] == 1
+    assert (
+        snapshot["histograms"][
+            'agentm_completion_latency_seconds{agent="A",model="m"}'
+        ]["p99"]
+        == 0.2
+    )
+    assert "# TYPE agentm_completions_total counter" in text
+    assert (
+        'agentm_completion_latency_seconds_bucket{agent="A",model="m",le="+Inf"} 1'
+        in text
+    )
+    assert 'agentm_completion_latency_seconds_count{agent="A",model="m"} 1' in text
+
+
+def bad_item(messages, match):
+    raise ValueError("bad item")
+
+
+@pytest.mark.anyio
+async def test_client_and_agents_record_metrics(settings_path):
+    registry = MetricsRegistry()
+    backend = MockBackend(
+        rules=[("fail", bad_item), (".", "done")], latency=Latency.fixed(0.01)
+    )
+    client = OpenAIClient(settings_path, metrics=registry, backend=backend)
+    agent = MapListAgent(
+        MapListInput(list_to_map=["a", "b", "fail"], transformation="Uppercase"),
+        openai_client=client,
+    )
+
+    with track_usage() as usage, pytest.raises(ValueError):
+        await agent.map_list()
+
+    snapshot = registry.snapshot()
+    counters = snapshot["counters"]
+    labels = '{agent="MapListAgent",model="gpt-4o-mini"}'
+    assert counters[f"agentm_completions_total{labels}"] == 3
+    assert counters[f"agentm_prompt_tokens_total{labels}"] == usage["prompt_tokens"] > 0
+    done_tokens = TokenCounter(approximate=True).count_text("done")
+    assert counters[f"agentm_completion_tokens_total{labels}"] == 2 * done_tokens
+    error_labels = '{agent="MapListAgent",error="ValueError",model="gpt-4o-mini"}'
+    assert counters[f"agentm_completion_errors_total{error_labels}"] == 1
+    latency = snapshot["histograms"][f"agentm_completion_latency_seconds{labels}"]
+    assert latency["p50"] >= 0.01
+    method_labels = '{agent="MapListAgent",method="apply_transformation"}'
+    assert counters[f"agentm_agent_calls_total{method_labels}"] == 3
+    method_labels = '{agent="MapListAgent",error="ValueError",method="map_list"}'
+    assert counters[f"agentm_agent_errors_total{method_labels}"] == 1
+    assert snapshot["gauges"]['agentm_completions_in_flight{model="gpt-4o-mini"}'] == 0
+    assert snapshot["gauges"]['agentm_agent_calls_in_flight{agent="MapListAgent"}'] == 0
+
+
+def test_prometheus_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.inc("agentm_completions_total", model="m")
+    server = start_prometheus_server(registry, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'agentm_completions_total{model="m"} 1' in body
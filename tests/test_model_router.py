@@ -0,0 +1,165 @@
+import json
+import pytest
+from core.backends import ChatBackend, MockBackend
+from core.filter_list_agent import FilterListAgent, FilterListInput
+from core.map_list_agent import MapListAgent, MapListInput
+from core.model_router import ModelRoute, ModelRouter, json_acceptor
+from core.openai_api import OpenAIClient
+from core import token_counter
+from core.token_counter import TokenCounter
+
+
+QUESTION = [{"role": "user", "content": "Q"}]
+QUESTION_TOKENS = TokenCounter(approximate=True).count_tokens(QUESTION)
+
+
+@pytest.fixture
+def openai_client(write_settings):
+    return OpenAIClient(
+        write_settings(
+            model_routes=[
+                {"model": "small", "prompt_price": 1.0},
+                {"model": "large", "prompt_price": 10.0},
+            ]
+        )
+    )
+
+
+class ModelBackends(ChatBackend):
+    """
+    Answers each model from its own MockBackend, recording the models asked.
+    """
+
+    def __init__(self, replies):
+        self.backends = {
+            model: MockBackend(
+                rules=[
+                    ("", self._raise(reply) if isinstance(reply, Exception) else reply)
+                ]
+            )
+            for model, reply in replies.items()
+        }
+        self.models = []
+
+    @staticmethod
+    def _raise(error):
+        def reply(messages, match):
+            raise error
+        return reply
+
+    async def create(self, model, messages, max_tokens, **params):
+        self.models.append(model)
+        return await self.backends[model].create(model, messages, max_tokens, **params)
+
+
+def install_backends(openai_client, replies):
+    openai_client.backend = ModelBackends(replies)
+    return openai_client.backend
+
+
+def test_json_acceptor_checks_schema_and_confidence():
+    accept = json_acceptor(
+        {"type": "object", "required": ["answer"]},
+        confidence_key="confidence",
+        min_confidence=0.7,
+    )
+
+    assert accept('{"answer": "yes", "confidence": 0.9}')
+    assert not accept('{"answer": "yes", "confidence": 0.4}')
+    assert not accept('{"confidence": 0.9}')
+    assert not accept("not json")
+
+
+@pytest.mark.anyio
+async def test_router_returns_the_first_accepted_response(openai_client):
+    backend = install_backends(
+        openai_client, {"small": '{"answer": "yes"}', "large": '{"answer": "no"}'}
+    )
+    router = ModelRouter.from_settings(
+        openai_client, accept=json_acceptor({"required": ["answer"]})
+    )
+
+    assert await router.complete_chat(QUESTION) == '{"answer": "yes"}'
+    assert backend.models == ["small"]
+    assert router.stats()["small"]["accepted"] == 1
+    assert router.stats()["small"]["cost"] == pytest.approx(QUESTION_TOKENS / 1_000_000)
+
+
+@pytest.mark.anyio
+async def test_router_escalates_on_rejected_responses_and_errors(openai_client):
+    backend = install_backends(
+        openai_client,
+        {"cheap": ValueError("down"), "small": "oops", "large": '{"answer": "no"}'},
+    )
+    router = ModelRouter(
+        openai_client,
+        ["cheap", "small", ModelRoute("large", prompt_price=10.0)],
+        accept=json_acceptor(),
+    )
+
+    assert await router.complete_chat(QUESTION) == '{"answer": "no"}'
+    assert backend.models == ["cheap", "small", "large"]
+    stats = router.stats()
+    assert stats["cheap"]["errors"] == 1
+    assert stats["small"]["escalated"] == 1
+    assert stats["small"]["prompt_tokens"] == QUESTION_TOKENS
+    assert stats["large"]["accepted"] == 1
+    assert stats["large"]["cost"] == pytest.approx(10 * QUESTION_TOKENS / 1_000_000)
+
+
+@pytest.mark.anyio
+async def test_batch_mode_agents_run_through_a_router(openai_client, monkeypatch):
+    monkeypatch.setitem(
+        token_counter._shared_counters, "gpt-4o-mini", TokenCounter(approximate=True)
+    )
+
+    def batch_reply(messages, match):
+        items = json.loads(messages[-1]["content"])
+        return json.dumps(
+            {
+                index: (
+                    {"explanation": "Checked.", "remove_item": item == "Chips"}
+                    if "filtering" in messages[0]["content"]
+                    else item.upper()
+                )
+                for index, item in items.items()
+            }
+        )
+
+    openai_client.backend = MockBackend(rules=[(r"^\{", batch_reply)])
+    router = ModelRouter.from_settings(openai_client)
+    snacks = ["Apple", "Chips", "Carrot"]
+
+    filtered = await FilterListAgent(
+        FilterListInput(
+            goal="Remove unhealthy snacks.", items_to_filter=snacks, batch_mode=True
+        ),
+        openai_client=router,
+    ).filter()
+    mapped = await MapListAgent(
+        MapListInput(
+            list_to_map=snacks, transformation="Uppercase the item", batch_mode=True
+        ),
+        openai_client=router,
+    ).map_list()
+
+    assert [result["remove_item"] for result in filtered] == [False, True, False]
+    assert mapped == ["APPLE", "CHIPS", "CARROT"]
+    assert router.stats()["small"]["requests"] == 2
+
+
+@pytest.mark.anyio
+async def test_filter_agent_escalates_responses_that_fail_its_schema(openai_client):
+    backend = install_backends(openai_client, {
+        "small": '{"remove_item": true}',
+        "large": '{"explanation": "Fried.", "remove_item": true}',
+    })
+    router = ModelRouter.from_settings(openai_client)
+    agent = FilterListAgent(
+        FilterListInput(goal="Remove unhealthy snacks.", items_to_filter=["Chips"]),
+        openai_client=router,
+    )
+
+    assert await agent.filter() == [{"explanation": "Fried.", "remove_item": True}]
+    assert backend.models == ["small", "large"]
+    assert router.stats()["small"]["escalated"] == 1
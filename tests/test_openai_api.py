@@ -0,0 +1,152 @@
+import asyncio
+import contextlib
+import json
+import pytest
+from core.backends import Latency, MockBackend
+from core.concurrency import RateLimitScheduler
+from core.metrics import MetricsRegistry
+from core.openai_api import OpenAIClient, track_usage
+from core.response_cache import ResponseCache
+from core.token_counter import TokenCounter
+from core.tracing import TraceSink
+
+
+@pytest.fixture
+def settings_path(write_settings):
+    return write_settings(max_connections=8, max_keepalive_connections=4)
+
+
+def test_shared_client_is_reused(settings_path):
+    OpenAIClient.clear_shared()
+
+    client = OpenAIClient.shared(settings_path)
+
+    assert OpenAIClient.shared(settings_path) is client
+    assert client.limits.max_connections == 8
+    assert client.limits.max_keepalive_connections == 4
+
+
+def test_explicit_zero_disables_keepalive(settings_path):
+    client = OpenAIClient(
+        settings_path, max_keepalive_connections=0, keepalive_expiry=0
+    )
+
+    assert client.limits.max_keepalive_connections == 0
+    assert client.limits.keepalive_expiry == 0
+
+
+@pytest.mark.anyio
+async def test_sdk_client_is_reused_within_event_loop(settings_path):
+    client = OpenAIClient(settings_path)
+
+    assert client.client is client.client
+
+
+@pytest.mark.anyio
+async def test_identical_concurrent_requests_share_one_call(settings_path):
+    client = OpenAIClient(settings_path)
+    calls = 0
+
+    async def send_chat(messages, model, max_tokens, temperature, response_format=None):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    client._send_chat = send_chat
+    messages = [{"role": "user", "content": "Apple"}]
+
+    results = await asyncio.gather(*(client.complete_chat(messages) for _ in range(5)))
+
+    assert results == ["answer"] * 5
+    assert calls == 1
+
+
+class RecordingScheduler(RateLimitScheduler):
+    def __init__(self):
+        super().__init__(
+            tokens_per_minute=100000, token_counter=TokenCounter(approximate=True)
+        )
+        self.reservations = []
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, tokens=0):
+        async with super().reserve(tokens) as reservation:
+            self.reservations.append(reservation)
+            yield reservation
+
+
+@pytest.mark.anyio
+async def test_stream_chat_yields_deltas_records_usage_and_caches(settings_path):
+    backend = MockBackend(script=["Step one, then step two."])
+    scheduler = RecordingScheduler()
+    client = OpenAIClient(
+        settings_path,
+        scheduler=scheduler,
+        cache=ResponseCache(path=None),
+        backend=backend,
+    )
+    messages = [{"role": "user", "content": "Solve it."}]
+
+    with track_usage() as usage:
+        deltas = [delta async for delta in client.stream_chat(messages, max_tokens=100)]
+
+    assert deltas == ["Step", " one,", " then", " step", " two."]
+    assert usage["requests"] == 1 and usage["completion_tokens"] > 0
+    reservation, = scheduler.reservations
+    assert (
+        reservation.used_tokens == usage["prompt_tokens"] + usage["completion_tokens"]
+    )
+
+    replayed = [delta async for delta in client.stream_chat(messages, max_tokens=100)]
+
+    assert replayed == ["Step one, then step two."]
+    assert backend.requests == 1
+    assert (
+        await client.complete_chat(messages, max_tokens=100)
+        == "Step one, then step two."
+    )
+
+
+@pytest.mark.anyio
+async def test_streams_are_coalesced_measured_and_traced(settings_path, tmp_path):
+    backend = MockBackend(script=['{"name": "Ada"}'], latency=Latency.fixed(0.01))
+    registry = MetricsRegistry()
+    tracer = TraceSink(str(tmp_path / "trace.jsonl"))
+    client = OpenAIClient(
+        settings_path,
+        scheduler=RecordingScheduler(),
+        metrics=registry,
+        tracer=tracer,
+        backend=backend,
+    )
+    messages = [{"role": "user", "content": "A user."}]
+
+    async def collect():
+        return [
+            delta
+            async for delta in client.stream_chat(
+                messages, response_format={"type": "json_object"}
+            )
+        ]
+
+    leader, follower = await asyncio.gather(collect(), collect())
+    tracer.close()
+
+    assert leader == ['{"name":', ' "Ada"}']
+    assert follower == ['{"name": "Ada"}']
+    assert backend.requests == 1
+    labels = '{agent="",model="gpt-4o-mini"}'
+    counters = registry.snapshot()["counters"]
+    assert counters[f"agentm_completions_total{labels}"] == 2
+    assert counters[f"agentm_completion_tokens_total{labels}"] > 0
+    records = [
+        json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()
+    ]
+    assert sorted(record["coalesced"] for record in records) == [False, True]
+    assert (
+        records[0]["prompt_hash"]
+        == ResponseCache.make_key(
+            "gpt-4o-mini", messages, 1500, None, response_format={"type": "json_object"}
+        )[:16]
+    )
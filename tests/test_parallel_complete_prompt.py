@@ -3,6 +3,7 @@ from core.parallel_complete_prompt import ParallelCompletePrompt
 
 
 @pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio", "trio"])
 async def test_parallel_completion():
     async def mock_complete_prompt(*args, **kwargs):
         return {"completed": True, "value": "Success"}
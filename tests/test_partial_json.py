@@ -0,0 +1,38 @@
+import pytest
+from core.partial_json import PartialJSONParser, parse_partial_json
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"name": "Apple", "color": "red"}', {"name": "Apple", "color": "red"}),
+        ('{"name": "App', {"name": "App"}),
+        ('{"name": "Apple", "col', {"name": "Apple"}),
+        ('{"name": "Apple", "color": ', {"name": "Apple"}),
+        ('{"tags": ["a", "b', {"tags": ["a", "b"]}),
+        ('{"ok": tr', {}),
+        ('```json\n{"size": 3', {"size": 3}),
+        ("", None),
+    ],
+)
+def test_parse_partial_json(text, expected):
+    assert parse_partial_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"name": "Ada \\"Countess\\" Lovelace", "tags": ["math", {"era": "1840s"}], '
+        '"born": 1815}',
+        '```json\n[1, 2, {"ok": true, "none": null}]\n```',
+        '{"nested": {"deep": [[], {}, ""]}, "after": 1}',
+        '[1, 2,]',
+        '{"a": 1 "b": 2}',
+    ],
+)
+def test_parser_fed_delta_by_delta_matches_a_full_parse_of_each_prefix(text):
+    parser = PartialJSONParser()
+
+    for end in range(1, len(text) + 1):
+        assert parser.feed(text[end - 1:end]) == parse_partial_json(text[:end])
+    assert parser.complete
@@ -0,0 +1,78 @@
+import threading
+import pytest
+from core.response_cache import ResponseCache
+
+
+def test_key_depends_on_request_parameters():
+    messages = [{"role": "user", "content": "Hello!"}]
+
+    key = ResponseCache.make_key("gpt-4o-mini", messages, 100, 0.0)
+
+    assert key == ResponseCache.make_key("gpt-4o-mini", list(messages), 100, 0.0)
+    assert key != ResponseCache.make_key("gpt-4o-mini", messages, 100, 0.5)
+    assert key != ResponseCache.make_key("gpt-4o", messages, 100, 0.0)
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), memory_entries=1)
+
+    cache.set("a", "first")
+    cache.set("b", "second")
+
+    assert cache.get("a") == "first"
+    assert cache.get("missing") is None
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    reopened = ResponseCache(path=str(tmp_path / "cache.db"))
+    assert reopened.get("b") == "second"
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), ttl=60, clock=clock)
+
+    cache.set("a", "value")
+    clock.now += 61
+
+    assert cache.get("a") is None
+
+
+def test_prune_keeps_most_recently_used(tmp_path, clock):
+    cache = ResponseCache(
+        path=str(tmp_path / "cache.db"), memory_entries=0, max_entries=2, clock=clock
+    )
+
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.set(key, key)
+    clock.now += 1
+    cache.get("a")
+    cache.prune()
+
+    assert cache.get("a") == "a"
+    assert cache.get("b") is None
+    assert cache.get("c") == "c"
+
+
+@pytest.mark.anyio
+async def test_async_access_keeps_the_database_off_the_event_loop(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"), memory_entries=1)
+    loop_thread = threading.get_ident()
+    db_threads = set()
+    execute = cache._db.execute
+
+    class RecordingConnection:
+        def execute(self, *args):
+            db_threads.add(threading.get_ident())
+            return execute(*args)
+
+    cache._db = RecordingConnection()
+    await cache.aset("a", "first")
+    await cache.aset("b", "second")
+    cache.flush()
+
+    assert await cache.aget("b") == "second"
+    assert await cache.aget("a") == "first"
+    assert await cache.aget("missing") is None
+    assert cache.stats()["disk_hits"] == 1
+    assert db_threads and loop_thread not in db_threads
@@ -0,0 +1,68 @@
+import pytest
+from core.chunking import TextChunker, WordEncoder
+from core.retrieval import BM25Index, load_corpus, tokenize
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    (tmp_path / "fruit").mkdir()
+    (tmp_path / "fruit" / "apple.txt").write_text(
+        "Apples grow on trees. An apple a day keeps the doctor away."
+    )
+    (tmp_path / "fruit" / "banana.md").write_text(
+        "Bananas are rich in potassium and grow in bunches."
+    )
+    (tmp_path / "space.txt").write_text(
+        "The Moon orbits the Earth. Mars has two moons, Phobos and Deimos."
+    )
+    (tmp_path / "notes.csv").write_text("ignored")
+    return tmp_path
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Mars, has TWO moons!") == ["mars", "has", "two", "moons"]
+
+
+def test_load_corpus_reads_text_files_recursively(corpus_dir):
+    documents = load_corpus(str(corpus_dir))
+
+    assert [doc_id for doc_id, _ in documents] == [
+        "space.txt",
+        "fruit/apple.txt",
+        "fruit/banana.md",
+    ]
+
+
+def test_search_ranks_matching_passages_first(corpus_dir):
+    index = BM25Index.build(load_corpus(str(corpus_dir)))
+
+    score, passage = index.search("How many moons does Mars have?", k=1)[0]
+
+    assert passage.doc_id == "space.txt"
+    assert "Phobos" in passage.text
+    assert score > 0
+    assert index.search("zebra") == []
+
+
+def test_passages_keep_document_offsets():
+    text = "alpha beta gamma delta epsilon zeta eta theta"
+    index = BM25Index.build(
+        [("greek", text)], chunker=TextChunker(3, 1, encoder=WordEncoder())
+    )
+
+    for _, passage in index.search("alpha delta zeta theta", k=10):
+        assert text[passage.start:passage.end] == passage.text
+
+
+def test_saved_index_is_memory_mapped_and_matches(corpus_dir, tmp_path):
+    index = BM25Index.build(load_corpus(str(corpus_dir)))
+    index.save(str(tmp_path / "index"))
+
+    loaded = BM25Index.load(str(tmp_path / "index"))
+    try:
+        assert isinstance(loaded._postings, memoryview)
+        assert len(loaded) == len(index)
+        for query in ("apple doctor", "potassium", "moons of mars"):
+            assert loaded.search(query) == index.search(query)
+    finally:
+        loaded.close()
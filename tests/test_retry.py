@@ -0,0 +1,100 @@
+import httpx
+import pytest
+from openai import BadRequestError, RateLimitError
+from core.retry import RetryBudget, RetryPolicy
+
+
+def api_error(error_class, status_code, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_class("error", response=response, body=None)
+
+
+def make_policy(**kwargs):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    return RetryPolicy(sleep=sleep, **kwargs), delays
+
+
+@pytest.mark.anyio
+async def test_retries_rate_limit_and_honors_retry_after():
+    policy, delays = make_policy(max_attempts=3)
+    errors = [api_error(RateLimitError, 429, {"retry-after": "2"})]
+
+    async def complete():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert await policy.call(complete) == "ok"
+    assert delays == [2.0]
+    assert policy.retries == 1
+
+
+@pytest.mark.anyio
+async def test_retry_after_is_capped_at_max_delay():
+    policy, delays = make_policy(max_attempts=3, max_delay=5.0)
+    errors = [api_error(RateLimitError, 429, {"retry-after": "3600"})]
+
+    async def complete():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert await policy.call(complete) == "ok"
+    assert delays == [5.0]
+
+
+@pytest.mark.anyio
+async def test_fails_fast_when_retry_after_outlasts_the_deadline(clock):
+    policy, delays = make_policy(max_attempts=3, deadline=10.0, clock=clock)
+    attempts = []
+
+    async def complete():
+        attempts.append(clock())
+        raise api_error(RateLimitError, 429, {"retry-after": "20"})
+
+    with pytest.raises(RateLimitError):
+        await policy.call(complete)
+    assert attempts == [0.0]
+    assert delays == []
+
+
+@pytest.mark.anyio
+async def test_does_not_retry_bad_request():
+    policy, delays = make_policy()
+
+    async def complete():
+        raise api_error(BadRequestError, 400)
+
+    with pytest.raises(BadRequestError):
+        await policy.call(complete)
+    assert delays == []
+
+
+@pytest.mark.anyio
+async def test_gives_up_after_max_attempts():
+    policy, delays = make_policy(max_attempts=3, base_delay=0.1)
+
+    async def complete():
+        raise api_error(RateLimitError, 429)
+
+    with pytest.raises(RateLimitError):
+        await policy.call(complete)
+    assert len(delays) == 2
+    assert all(0 <= delay <= 0.2 for delay in delays)
+
+
+@pytest.mark.anyio
+async def test_retry_budget_stops_retries():
+    policy, delays = make_policy(max_attempts=5, budget=RetryBudget(ratio=0, initial=1))
+
+    async def complete():
+        raise api_error(RateLimitError, 503)
+
+    with pytest.raises(RateLimitError):
+        await policy.call(complete)
+    assert len(delays) == 1
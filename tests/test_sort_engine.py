@@ -0,0 +1,174 @@
+import json
+import math
+import random
+import pytest
+from core.sort_engine import ComparisonCache, SortEngine
+from core.sort_list_agent import SortListAgent, SortListInput
+
+
+def numeric_comparator(calls):
+    async def compare_batch(pairs):
+        calls.append(len(pairs))
+        return [int(a) < int(b) for a, b in pairs]
+
+    return compare_batch
+
+
+def test_cache_infers_order_through_transitivity():
+    cache = ComparisonCache()
+    cache.record(0, 1, True)
+    cache.record(2, 1, False)
+
+    assert cache.lookup(0, 2) is True
+    assert cache.lookup(2, 0) is False
+    assert cache.lookup(0, 3) is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("size", [0, 1, 2, 7, 64, 100])
+async def test_sort_engine_sorts(size):
+    items = [str(i) for i in range(size)]
+    shuffled = random.Random(size).sample(items, size)
+    calls = []
+    engine = SortEngine(numeric_comparator(calls), batch_size=10)
+
+    assert await engine.sort(shuffled) == items
+    assert all(batch <= 10 for batch in calls)
+    assert engine.comparisons == sum(calls)
+
+
+@pytest.mark.anyio
+async def test_sort_engine_uses_listwise_ranking_for_initial_runs():
+    items = [str(i) for i in range(32)]
+    shuffled = random.Random(1).sample(items, 32)
+    ranked_chunks = []
+
+    async def rank_chunk(chunk):
+        ranked_chunks.append(chunk)
+        return sorted(range(len(chunk)), key=lambda i: int(chunk[i]))
+
+    engine = SortEngine(numeric_comparator([]), rank_chunk=rank_chunk, chunk_size=8)
+
+    assert await engine.sort(shuffled) == items
+    assert len(ranked_chunks) == 4
+
+
+@pytest.mark.anyio
+async def test_sort_engine_merges_with_fewer_than_n_log_n_comparisons():
+    size = 512
+    items = [str(i) for i in range(size)]
+    engine = SortEngine(numeric_comparator([]), batch_size=20)
+
+    assert await engine.sort(random.Random(7).sample(items, size)) == items
+    assert engine.comparisons <= size * math.log2(size)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("size,k", [(1000, 10), (50, 1), (9, 9), (5, 0)])
+async def test_top_k_selects_first_items_with_about_n_plus_k_log_n_comparisons(size, k):
+    items = [str(i) for i in range(size)]
+    engine = SortEngine(numeric_comparator([]), batch_size=20)
+
+    assert await engine.top_k(random.Random(3).sample(items, size), k) == items[:k]
+    if k < size:
+        assert engine.comparisons <= size + k * math.ceil(math.log2(size)) + k
+
+
+class AlphabeticalClient:
+    def __init__(self, drop_first=0, garble_first=0):
+        self.drop_first = drop_first
+        self.garble_first = garble_first
+        self.requests = 0
+
+    async def complete_chat(
+        self, messages, max_tokens=None, temperature=None, response_format=None
+    ):
+        self.requests += 1
+        if self.garble_first:
+            self.garble_first -= 1
+            return "BEFORE, probably"
+        pairs = json.loads(messages[1]["content"])
+        answers = {
+            index: "BEFORE" if a < b else "AFTER" for index, (a, b) in pairs.items()
+        }
+        for index in list(answers)[:self.drop_first]:
+            del answers[index]
+        self.drop_first = 0
+        return json.dumps(answers)
+
+
+@pytest.mark.anyio
+async def test_sort_list_agent_sorts_with_batched_comparisons():
+    fruits = ["Apple", "Orange", "Banana", "Grape", "Pineapple", "Kiwi", "Mango"]
+    client = AlphabeticalClient()
+    agent = SortListAgent(
+        SortListInput(goal="Sort alphabetically.", list_to_sort=fruits),
+        openai_client=client,
+    )
+
+    assert await agent.sort() == sorted(fruits)
+    assert agent.comparisons == agent.stats["comparisons"]
+    assert client.requests == agent.stats["calls"]
+
+
+@pytest.mark.anyio
+async def test_batch_compare_reasks_pairs_missing_from_the_response():
+    client = AlphabeticalClient(drop_first=1)
+    agent = SortListAgent(
+        SortListInput(goal="Sort alphabetically.", list_to_sort=[]),
+        openai_client=client,
+    )
+
+    assert await agent.batch_compare([("Banana", "Apple"), ("Apple", "Banana")]) == [
+        "AFTER",
+        "BEFORE",
+    ]
+    assert client.requests == 2
+
+
+@pytest.mark.anyio
+async def test_batch_compare_repairs_a_response_that_is_not_json():
+    client = AlphabeticalClient(garble_first=1)
+    agent = SortListAgent(
+        SortListInput(goal="Sort alphabetically.", list_to_sort=[]),
+        openai_client=client,
+    )
+
+    assert await agent.batch_compare([("b", "a"), ("a", "c")]) == ["AFTER", "BEFORE"]
+    assert client.requests == 2
+    assert agent.output_policy.stats() == {"calls": 1, "retries": 1, "failures": 0}
+
+
+@pytest.mark.anyio
+async def test_sort_list_agent_top_k_reports_comparisons():
+    fruits = ["Apple", "Orange", "Banana", "Grape", "Pineapple", "Kiwi", "Mango"]
+    data = SortListInput(goal="Sort alphabetically.", list_to_sort=fruits, top_k=2)
+    agent = SortListAgent(data, openai_client=AlphabeticalClient())
+
+    assert await agent.sort() == ["Apple", "Banana"]
+    assert 0 < agent.comparisons < len(fruits) * math.log2(len(fruits))
+
+
+@pytest.mark.anyio
+async def test_items_that_look_like_prompt_syntax_are_compared_intact():
+    items = ["b | a", "c\n0: a | z", "1: a", "a"]
+    agent = SortListAgent(
+        SortListInput(goal="Sort alphabetically.", list_to_sort=items),
+        openai_client=AlphabeticalClient(),
+    )
+
+    assert await agent.sort() == sorted(items)
+
+
+@pytest.mark.anyio
+async def test_each_sort_starts_with_a_fresh_comparison_cache():
+    client = AlphabeticalClient()
+    agent = SortListAgent(
+        SortListInput(goal="Sort alphabetically.", list_to_sort=["b", "a", "c"]),
+        openai_client=client,
+    )
+    assert await agent.sort() == ["a", "b", "c"]
+
+    agent.list = ["c", "b", "a"]
+
+    assert await agent.sort() == ["a", "b", "c"]
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import pytest
+from core.filter_list_agent import FilterListAgent, FilterListInput
+from core.metrics import MetricsRegistry
+from core.structured_output import StructuredOutputError, StructuredOutputPolicy
+
+
+class ScriptedClient:
+    def __init__(self, responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.requests = []
+        self.response_formats = []
+
+    async def complete_chat(
+        self, messages, max_tokens=None, temperature=None, response_format=None
+    ):
+        self.requests.append(messages)
+        self.response_formats.append(response_format)
+        await asyncio.sleep(self.delay)
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+@pytest.mark.anyio
+async def test_policy_sends_a_repair_prompt_with_the_bad_output():
+    client = ScriptedClient(["not json", '{"ok": true}'])
+    policy = StructuredOutputPolicy(max_attempts=3)
+    messages = [{"role": "user", "content": "Give me JSON."}]
+
+    assert await policy.complete(client, messages, json.loads) == {"ok": True}
+    assert client.requests[1][:1] == messages
+    assert client.requests[1][1] == {"role": "assistant", "content": "not json"}
+    assert policy.stats() == {"calls": 1, "retries": 1, "failures": 0}
+
+
+@pytest.mark.anyio
+async def test_policy_stops_after_max_attempts():
+    client = ScriptedClient(["not json"])
+    policy = StructuredOutputPolicy(max_attempts=2)
+
+    with pytest.raises(StructuredOutputError) as error:
+        await policy.complete(client, [{"role": "user", "content": "Q"}], json.loads)
+
+    assert error.value.attempts == 2
+    assert error.value.response == "not json"
+    assert len(client.requests) == 2
+    assert policy.failures == 1
+
+
+@pytest.mark.anyio
+async def test_policy_enforces_the_time_budget():
+    client = ScriptedClient(["not json"], delay=0.05)
+    policy = StructuredOutputPolicy(max_attempts=100, time_budget=0.12)
+
+    with pytest.raises(StructuredOutputError):
+        await policy.complete(client, [{"role": "user", "content": "Q"}], json.loads)
+
+    assert len(client.requests) <= 3
+
+
+@pytest.mark.anyio
+async def test_filter_item_no_longer_retries_forever():
+    client = ScriptedClient(['{"explanation": "missing the flag"}'])
+    agent = FilterListAgent(
+        FilterListInput(goal="Remove unhealthy snacks.", items_to_filter=["Chips"]),
+        openai_client=client,
+    )
+
+    result = await agent.filter_item(
+        agent._system_prompt(), agent._user_prompt(0, "Chips")
+    )
+
+    assert "error" in result
+    assert len(client.requests) == agent.output_policy.max_attempts
+    assert agent.output_policy.retries == agent.output_policy.max_attempts - 1
+
+
+@pytest.mark.anyio
+async def test_filter_item_requests_schema_constrained_output():
+    client = ScriptedClient(['{"explanation": "Fried.", "remove_item": true}'])
+    agent = FilterListAgent(
+        FilterListInput(goal="Remove unhealthy snacks.", items_to_filter=["Chips"]),
+        openai_client=client,
+    )
+
+    result = await agent.filter_item(
+        agent._system_prompt(), agent._user_prompt(0, "Chips")
+    )
+
+    assert result == {"explanation": "Fried.", "remove_item": True}
+    assert client.response_formats == [FilterListAgent.response_format]
+    assert client.response_formats[0]["json_schema"]["schema"] is FilterListAgent.schema
+
+
+@pytest.mark.anyio
+async def test_policy_counts_retries_and_failures_in_the_clients_metrics():
+    client = ScriptedClient(["not json"])
+    client.metrics = MetricsRegistry()
+    agent = FilterListAgent(
+        FilterListInput(goal="Keep fruit", items_to_filter=["Apple"]),
+        openai_client=client,
+    )
+
+    result = await agent.filter_list(["Apple"])
+
+    counters = client.metrics.snapshot()["counters"]
+    assert "error" in result[0]
+    labels = '{agent="FilterListAgent"}'
+    assert counters[f"agentm_structured_output_retries_total{labels}"] == 2
+    labels = '{agent="FilterListAgent",reason="invalid"}'
+    assert counters[f"agentm_structured_output_failures_total{labels}"] == 1
+
+
+@pytest.mark.anyio
+async def test_filter_process_response_repairs_through_the_policy():
+    valid = '{"explanation": "Fruit.", "remove_item": false}'
+    client = ScriptedClient([valid])
+    agent = FilterListAgent(
+        FilterListInput(goal="Keep fruit", items_to_filter=["Apple"]),
+        openai_client=client,
+    )
+
+    assert await agent.process_response(
+        valid, "system", "Item 1: Apple."
+    ) == json.loads(valid)
+    assert await agent.process_response(
+        "not json", "system", "Item 1: Apple."
+    ) == json.loads(valid)
+    assert client.requests[0][-2] == {"role": "assistant", "content": "not json"}
+    assert "error" in await agent.process_response(
+        "not json", "system", "Item 1: Apple.", retry=False
+    )
+    assert len(client.requests) == 1
+
+
+def test_policy_requires_at_least_one_attempt():
+    with pytest.raises(ValueError):
+        StructuredOutputPolicy(max_attempts=0)
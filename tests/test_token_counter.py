@@ -1,4 +1,7 @@
-from core.token_counter import TokenCounter
+from core.chunking import WordEncoder
+from core.token_counter import (
+    MESSAGE_OVERHEAD_TOKENS, REPLY_PRIMING_TOKENS, TokenCounter, encoding_name_for_model
+)
 
 
 def test_token_counting():
@@ -8,3 +11,60 @@ def test_token_counting():
     token_count = counter.count_tokens(messages)
 
     assert token_count > 0
+
+
+def test_models_use_their_own_encoding():
+    assert TokenCounter("gpt-4o-mini").encoding_name == "o200k_base"
+    assert TokenCounter("gpt-3.5-turbo").encoding_name == "cl100k_base"
+    assert encoding_name_for_model("some-future-model") == "o200k_base"
+
+
+class CountingEncoder(WordEncoder):
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return super().encode(text)
+
+
+def test_counts_are_cached_by_content():
+    encoder = CountingEncoder()
+    counter = TokenCounter(encoder=encoder, cache_size=2)
+
+    assert counter.count_batch(["one two", "three", "one two"]) == [2, 1, 2]
+    assert counter.count_text("one two") == 2
+
+    assert encoder.encoded == ["one two", "three"]
+    assert (counter.hits, counter.misses) == (2, 2)
+
+    counter.count_text("four five six")
+    counter.count_text("three")
+    counter.count_text("one two")
+    assert encoder.encoded[-1] == "one two"
+
+
+def test_count_tokens_includes_chat_overhead():
+    counter = TokenCounter(encoder=WordEncoder())
+    messages = [
+        {"role": "system", "content": "Be brief."},
+        {"role": "user", "content": "Hello there!"},
+    ]
+
+    assert (
+        counter.count_tokens(messages)
+        == 4 + 2 + 2 * MESSAGE_OVERHEAD_TOKENS + REPLY_PRIMING_TOKENS
+    )
+    assert counter.count_tokens([]) == 0
+
+
+def test_approximate_mode_needs_no_encoder():
+    counter = TokenCounter(approximate=True)
+
+    assert counter.count_text("x" * 40) == 10
+    assert counter.count_tokens([{"role": "user", "content": ""}]) > 0
+    assert counter._encoder is None
+
+
+def test_shared_counter_is_reused():
+    assert TokenCounter.shared("gpt-4o-mini") is TokenCounter.shared("gpt-4o-mini")
@@ -0,0 +1,149 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import pytest
+from core.backends import Latency, MockBackend
+from core.openai_api import OpenAIClient
+from core.summarize_list_agent import SummarizeListAgent, SummarizeListInput
+from core.token_counter import TokenCounter
+from core.tracing import TraceSink
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def shout(messages, match):
+    return messages[-1]["content"].upper()
+
+
+@pytest.mark.anyio
+async def test_completions_are_traced_with_agent_usage_and_cache_hits(
+    tmp_path, write_settings
+):
+    settings_path = write_settings(
+        cache_enabled=True,
+        cache_path=None,
+        trace_path=str(tmp_path / "traces" / "completions.jsonl"),
+    )
+    client = OpenAIClient(
+        settings_path,
+        backend=MockBackend(rules=[(".", shout)], latency=Latency.fixed(0.01)),
+    )
+    agent = SummarizeListAgent(
+        SummarizeListInput(list_to_summarize=["Apple", "Apple"]), openai_client=client
+    )
+    messages = [
+        {
+            "role": "system",
+            "content": "You are an assistant tasked with summarizing items.",
+        },
+        {"role": "user", "content": "Summarize the following: Apple."},
+    ]
+
+    await agent.summarize_list()
+    await client.complete_chat(messages, max_tokens=1000)
+    client.tracer.flush()
+
+    records = read_records(tmp_path / "traces" / "completions.jsonl")
+    assert len(records) == 3
+    first, second, third = records
+    assert first["agent"] == second["agent"] == "SummarizeListAgent"
+    counter = TokenCounter(approximate=True)
+    assert (first["prompt_tokens"], first["completion_tokens"], first["coalesced"]) == (
+        counter.count_tokens(messages), counter.count_text(shout(messages, None)), False
+    )
+    assert second["coalesced"] and second["prompt_tokens"] == 0
+    assert third["agent"] is None and third["cache_hit"]
+    assert first["prompt_hash"] == third["prompt_hash"]
+    assert first["latency_ms"] >= 10 and first["retries"] == 0
+    client.tracer.close()
+
+
+def test_sink_rotates_and_compresses(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    sink = TraceSink(str(path), max_bytes=200, backup_count=2, compress=True)
+
+    for index in range(20):
+        sink.record({"index": index, "padding": "x" * 40})
+    sink.close()
+
+    backups = sorted(tmp_path.glob("trace.jsonl.*.gz"))
+    assert [backup.name for backup in backups] == [
+        "trace.jsonl.1.gz",
+        "trace.jsonl.2.gz",
+    ]
+    last_backup = [
+        json.loads(line)
+        for line in gzip.decompress(backups[0].read_bytes()).splitlines()
+    ]
+    current = read_records(path)
+    assert last_backup[-1]["index"] + 1 == current[0]["index"]
+    assert current[-1]["index"] == 19
+
+
+def test_tail_sampling_keeps_errors_retries_and_slow_calls(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    sink = TraceSink(str(path), sample_rate=0.0, sampling="tail", slow_ms=500)
+
+    assert sink.sample()
+    for record in ({"latency_ms": 10}, {"latency_ms": 10, "error": "APIError"},
+                   {"latency_ms": 10, "retries": 2}, {"latency_ms": 900}):
+        sink.record(record)
+    sink.close()
+
+    assert len(read_records(path)) == 3
+    assert (sink.written, sink.dropped) == (3, 1)
+
+
+def test_head_sampling_decides_before_the_request(tmp_path):
+    draws = iter([0.1, 0.9])
+    sink = TraceSink(
+        str(tmp_path / "trace.jsonl"),
+        sample_rate=0.5,
+        random_source=lambda: next(draws),
+    )
+
+    assert [sink.sample(), sink.sample()] == [True, False]
+    sink.close()
+
+
+def test_sinks_share_a_writer_and_flush_at_exit(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    script = (
+        "from core.tracing import TraceSink\n"
+        f"first, second = TraceSink({str(path)!r}), TraceSink({str(path)!r})\n"
+        "assert first._listener is second._listener\n"
+        "for index in range(20000):\n"
+        "    (first if index % 2 else second).record({'index': index})\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        env={
+            **os.environ,
+            "PYTHONPATH": os.path.join(os.path.dirname(__file__), "..", "src"),
+        },
+    )
+
+    assert [record["index"] for record in read_records(path)] == list(range(20000))
+
+
+def test_closing_one_sink_keeps_the_shared_writer_open(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    first = TraceSink(str(path))
+    second = TraceSink(str(path))
+
+    first.record({"index": 0})
+    first.close()
+    first.close()
+    second.record({"index": 1})
+    second.flush()
+
+    assert [record["index"] for record in read_records(path)] == [0, 1]
+    second.close()
+    reopened = TraceSink(str(path))
+    assert reopened._listener is not second._listener
+    reopened.close()